@@ -9,3 +9,43 @@ LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "google/flan-t5-base")
 
 # Other Configurations
 # Add any other configuration settings here
+
+# Graph Service Configuration
+# Blocking buckets with more users than this are skipped during candidate pair
+# generation (e.g. a shared free-mail domain). 0 disables the cap.
+GRAPH_BLOCKING_MAX_BUCKET_SIZE = int(os.environ.get("GRAPH_BLOCKING_MAX_BUCKET_SIZE", "1000"))
+# Exact-match groups (users sharing a zip code, or the value of an "equal"
+# rule) larger than this are too unselective to link pairwise. 0 disables the cap.
+GRAPH_LINK_MAX_EXACT_GROUP = int(os.environ.get("GRAPH_LINK_MAX_EXACT_GROUP", "20"))
+# Users sharing a phone number in groups larger than this are only connected
+# through the phone's entity node, not pairwise links. 0 disables the cap.
+GRAPH_ENTITY_LINK_MAX_GROUP = int(os.environ.get("GRAPH_ENTITY_LINK_MAX_GROUP", "50"))
+# Minimum Jaccard similarity of normalized name/address shingles for a fuzzy link
+GRAPH_LINK_NAME_SIMILARITY = float(os.environ.get("GRAPH_LINK_NAME_SIMILARITY", "0.7"))
+GRAPH_LINK_ADDRESS_SIMILARITY = float(os.environ.get("GRAPH_LINK_ADDRESS_SIMILARITY", "0.6"))
+# In-memory graph backend: "networkx" (default) or "compact" (NumPy CSR arrays, see graph_service.algorithms.csr)
+GRAPH_BACKEND = os.environ.get("GRAPH_BACKEND", "networkx")
+# Directory for memory-mapped graph snapshots (compact backend only); empty disables snapshots
+GRAPH_SNAPSHOT_DIR = os.environ.get("GRAPH_SNAPSHOT_DIR", "")
+# Seconds between periodic graph snapshots; 0 disables the background writer
+GRAPH_SNAPSHOT_INTERVAL = int(os.environ.get("GRAPH_SNAPSHOT_INTERVAL", "600"))
+# Role of this process when several workers share the graph through GRAPH_SNAPSHOT_DIR
+# (put it on /dev/shm so snapshots live in shared memory): "standalone" (default),
+# "writer" (tails the changelog and publishes snapshots), "reader" (maps the latest
+# snapshot) or "auto" (the first worker to take the directory lock becomes the writer)
+GRAPH_WORKER_ROLE = os.environ.get("GRAPH_WORKER_ROLE", "standalone")
+# Seconds between shared-graph workers tailing the changelog and readers checking for a
+# newly published snapshot; the writer publishes one every GRAPH_SNAPSHOT_INTERVAL
+GRAPH_SYNC_INTERVAL = float(os.environ.get("GRAPH_SYNC_INTERVAL", "5"))
+# Cursor batch size used when streaming users and links into the graph at startup
+GRAPH_LOAD_BATCH_SIZE = int(os.environ.get("GRAPH_LOAD_BATCH_SIZE", "10000"))
+# Random-walk fraud contact probability: chance the walk restarts at each step,
+# and how often (seconds) the background job checks for seed/link changes
+GRAPH_CONTACT_RESTART_PROBABILITY = float(os.environ.get("GRAPH_CONTACT_RESTART_PROBABILITY", "0.15"))
+GRAPH_CONTACT_REFRESH_INTERVAL = int(os.environ.get("GRAPH_CONTACT_REFRESH_INTERVAL", "30"))
+# Worker processes for community detection clustering; 0 uses one per CPU
+GRAPH_COMMUNITY_WORKERS = int(os.environ.get("GRAPH_COMMUNITY_WORKERS", "0"))
+# Secret key card numbers are HMAC'd with before they are stored as entity keys.
+# Every worker must use the same key; changing it orphans the stored card entities.
+# Empty leaves card keys open to enumeration (card numbers have little entropy).
+GRAPH_CARD_HASH_KEY = os.environ.get("GRAPH_CARD_HASH_KEY", "")
@@ -0,0 +1,22 @@
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
+
+
+def update_one_and_fetch(collection, query: Dict[str, Any], fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Sets `fields` on the document matching `query` and returns the updated document
+    in a single round trip. Returns None if no document matches.
+    """
+    return collection.find_one_and_update(
+        query,
+        {"$set": fields},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def delete_one_and_fetch(collection, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Deletes the document matching `query` and returns it in a single round trip.
+    Returns None if no document matches.
+    """
+    return collection.find_one_and_delete(query)
@@ -1,7 +1,14 @@
-mport networkx as nx
+import networkx as nx
 import json
 from pymongo import MongoClient
 
+from graph_service.algorithms.neighborhood import bounded_neighborhood
+
+# Fan-out caps for neighborhood queries
+MAX_NODES_PER_LEVEL = 1000
+MAX_NEIGHBORHOOD_NODES = 5000
+MAX_EXPANDED_DEGREE = 1000
+
 class GraphFraudDetector:
     def __init__(self, mongo_uri, db_name, node_collection, link_collection):
         try:
@@ -40,17 +47,27 @@ class GraphFraudDetector:
 
         print("Nodes in the graph:", self.graph.nodes())
 
+    def _neighborhood(self, user_id, distance, stop_at=None):
+        """Bounded BFS from a user; see bounded_neighborhood for the caps."""
+        if self.graph is None:
+            self.load_graph()
+        return bounded_neighborhood(
+            self.graph,
+            user_id,
+            distance,
+            max_per_level=MAX_NODES_PER_LEVEL,
+            max_nodes=MAX_NEIGHBORHOOD_NODES,
+            max_degree=MAX_EXPANDED_DEGREE,
+            stop_at=stop_at,
+        )
+
     def get_neighbors(self, user_id, distance=3):
         """
         Finds all neighbors within a specified distance from a given user.
         Returns a set of user IDs.
         """
-        if self.graph is None:
-            self.load_graph()
-
-        neighbors = set()
-        for node in nx.descendants_at_distance(self.graph, user_id, distance):
-            neighbors.add(node)
+        neighbors = set(self._neighborhood(user_id, distance)["distances"])
+        neighbors.discard(user_id)
         return neighbors
 
     def calculate_proximity_score(self, user_id, fraud_user_ids):
@@ -78,11 +95,9 @@ class GraphFraudDetector:
         Checks if a user is within a specified distance of any known fraudulent users.
         Returns True if the user is close to fraud, False otherwise.
         """
-        if self.graph is None:
-            self.load_graph()
-
-        neighbors = self.get_neighbors(user_id, distance)
-        return any(fraud_user in neighbors for fraud_user in fraud_user_ids)
+        # Stops at the first fraudulent user reached instead of collecting the whole neighborhood
+        stop_at = set(fraud_user_ids) - {user_id}
+        return self._neighborhood(user_id, distance, stop_at=stop_at)["found"] is not None
 
 # Sample Usage (replace with your MongoDB credentials and data)
 if __name__ == '__main__':
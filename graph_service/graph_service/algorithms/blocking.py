@@ -0,0 +1,67 @@
+import re
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_key(value: Any) -> Optional[str]:
+    """
+    Normalizes an attribute value into a blocking key: string form, trimmed,
+    lowercased, with runs of whitespace collapsed. Values that compare equal
+    as strings always share a key, so blocking never drops an exact match.
+    """
+    if value is None:
+        return None
+    key = _WHITESPACE.sub(" ", str(value).strip().lower())
+    return key or None
+
+
+class BlockingIndex:
+    """
+    Hash buckets of items keyed by a normalized attribute value.
+    Only items that share a bucket need to be compared, which turns quadratic
+    candidate generation into roughly linear work. Buckets larger than
+    `max_bucket_size` (e.g. everyone on example.com) are treated as
+    uninformative and skipped by `buckets()`; 0 or None disables the cap.
+    """
+
+    def __init__(self, max_bucket_size: Optional[int] = None):
+        self.max_bucket_size = max_bucket_size or None
+        self._buckets: Dict[str, List[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(self, item: Hashable, value: Any) -> Optional[str]:
+        """Adds `item` under the key of `value` and returns that key (None if the value is empty)."""
+        key = normalize_key(value)
+        if key is not None:
+            self._buckets.setdefault(key, []).append(item)
+        return key
+
+    def remove(self, item: Hashable, value: Any) -> None:
+        key = normalize_key(value)
+        members = self._buckets.get(key)
+        if members and item in members:
+            members.remove(item)
+            if not members:
+                del self._buckets[key]
+
+    def is_oversized(self, key: str) -> bool:
+        return self.max_bucket_size is not None and len(self._buckets.get(key, ())) > self.max_bucket_size
+
+    def bucket(self, value: Any) -> List[Hashable]:
+        """Returns the items sharing the key of `value` (empty if the bucket is oversized)."""
+        key = normalize_key(value)
+        if key is None or self.is_oversized(key):
+            return []
+        return self._buckets.get(key, [])
+
+    def buckets(self) -> Iterator[Tuple[str, List[Hashable]]]:
+        """Yields (key, items) for every bucket within the size cap."""
+        for key, members in self._buckets.items():
+            if not self.is_oversized(key):
+                yield key, members
+
+    def oversized_keys(self) -> Set[str]:
+        return {key for key in self._buckets if self.is_oversized(key)}
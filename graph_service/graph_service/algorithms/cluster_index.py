@@ -0,0 +1,159 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# Precomputed per-cluster fields stored on cluster documents
+CLUSTER_STAT_FIELDS = ("size", "fraud_count", "fraud_ratio", "total_link_weight")
+# Clusters written by the rule-based transitive closure carry no "method" field
+RULES_METHOD = "rules"
+CLUSTER_PROJECTION = {"members": 1, "method": 1, **{field: 1 for field in CLUSTER_STAT_FIELDS}}
+# Arrays a graph snapshot stores the index in (see ClusterIndex.to_arrays)
+CLUSTER_SNAPSHOT_ARRAYS = ("cluster_ids", "cluster_method", "cluster_stats", "cluster_indptr", "cluster_members")
+
+
+def cluster_stats(graph, members: List[str], fraud_user_ids: Set[str]) -> Dict[str, Any]:
+    """
+    Size, number and share of fraudulent members, and the total weight of the
+    links between members of one cluster. The graph only needs `neighbors`,
+    `get_edge_data` and `in` support, so both graph backends work.
+    """
+    member_set = set(members)
+    fraud_count = len(member_set & fraud_user_ids)
+    total_link_weight = 0.0
+    for member in member_set:
+        if member not in graph:
+            continue
+        for neighbor in graph.neighbors(member):
+            # Count every internal link once, from its smaller endpoint
+            if neighbor in member_set and member < neighbor:
+                total_link_weight += graph.get_edge_data(member, neighbor).get('weight', 1.0)
+    return {
+        "size": len(member_set),
+        "fraud_count": fraud_count,
+        "fraud_ratio": fraud_count / len(member_set) if member_set else 0.0,
+        "total_link_weight": total_link_weight,
+    }
+
+
+def clusters_method(clusters: Iterable[Dict[str, Any]]) -> str:
+    """
+    How a set of cluster documents was built. Clusters from more than one
+    method (e.g. a rule pass that was interrupted by a detection job) count
+    as the most common community method, so no rule-based incremental update
+    rewrites community clusters until the next full rebuild.
+    """
+    counts: Dict[str, int] = {}
+    for cluster in clusters:
+        method = cluster.get('method', RULES_METHOD)
+        counts[method] = counts.get(method, 0) + 1
+    communities = {method: count for method, count in counts.items() if method != RULES_METHOD}
+    return max(communities, key=communities.get) if communities else RULES_METHOD
+
+
+class ClusterIndex:
+    """
+    Member-to-cluster index holding each cluster's precomputed stats, so the
+    cluster risk of a user is two dict lookups instead of a scan of
+    `db.clusters`. A user belongs to at most one cluster. `method` is how
+    the current clusters were built.
+
+    Workers sharing a graph keep their indexes in step through the graph
+    changelog: every cluster write logs change(cluster_id), which apply()
+    replays elsewhere.
+    """
+
+    def __init__(self):
+        self.cluster_of: Dict[str, str] = {}
+        self.members: Dict[str, List[str]] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.method = RULES_METHOD
+
+    def clear(self, method: str = RULES_METHOD) -> None:
+        self.cluster_of.clear()
+        self.members.clear()
+        self.stats.clear()
+        self.method = method
+
+    def set_cluster(self, cluster_id: str, members: List[str], stats: Dict[str, Any]) -> None:
+        """Adds or replaces a cluster and points its members at it."""
+        self.remove_cluster(cluster_id)
+        for member in members:
+            self.cluster_of[member] = cluster_id
+        self.members[cluster_id] = list(members)
+        self.stats[cluster_id] = {field: stats[field] for field in CLUSTER_STAT_FIELDS}
+
+    def remove_cluster(self, cluster_id: str) -> None:
+        for member in self.members.pop(cluster_id, []):
+            if self.cluster_of.get(member) == cluster_id:
+                del self.cluster_of[member]
+        self.stats.pop(cluster_id, None)
+
+    def load(self, clusters: Iterable[Dict[str, Any]], graph, fraud_user_ids: Set[str]) -> List[Dict[str, Any]]:
+        """
+        Replaces the index with cluster documents. Stats missing from older
+        documents are computed from the graph; returns those documents, with
+        the computed stats, so the caller can store them.
+        """
+        clusters = list(clusters)
+        self.clear(clusters_method(clusters))
+        backfilled = []
+        for cluster in clusters:
+            stats = {field: cluster[field] for field in CLUSTER_STAT_FIELDS if field in cluster}
+            if len(stats) < len(CLUSTER_STAT_FIELDS):
+                stats = cluster_stats(graph, cluster['members'], fraud_user_ids)
+                backfilled.append(dict(cluster, **stats))
+            self.set_cluster(str(cluster['_id']), cluster['members'], stats)
+        return backfilled
+
+    def change(self, cluster_id: str) -> Dict[str, Any]:
+        """Changelog entry that sets a cluster to its current state here, or removes it."""
+        if cluster_id not in self.members:
+            return {"op": "remove_cluster", "cluster_id": cluster_id}
+        return {"op": "set_cluster", "cluster_id": cluster_id, "members": self.members[cluster_id], "stats": self.stats[cluster_id]}
+
+    def apply(self, change: Dict[str, Any]) -> None:
+        if change['op'] == "set_cluster":
+            self.set_cluster(change['cluster_id'], change['members'], change['stats'])
+        elif change['op'] == "remove_cluster":
+            self.remove_cluster(change['cluster_id'])
+
+    def to_arrays(self, position: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """
+        The index as arrays for a graph snapshot: cluster IDs, the method, a
+        stats matrix (one row per cluster, CLUSTER_STAT_FIELDS order) and the
+        members as CSR over the snapshot's node positions.
+        """
+        cluster_ids = list(self.members)
+        members = [[position[member] for member in self.members[cluster_id] if member in position] for cluster_id in cluster_ids]
+        stats = np.array([[self.stats[cluster_id][field] for field in CLUSTER_STAT_FIELDS] for cluster_id in cluster_ids], dtype=np.float64)
+        return {
+            "cluster_ids": np.array(cluster_ids, dtype=str) if cluster_ids else np.empty(0, dtype="<U1"),
+            "cluster_method": np.array(self.method),
+            "cluster_stats": stats.reshape(len(cluster_ids), len(CLUSTER_STAT_FIELDS)),
+            "cluster_indptr": np.concatenate(([0], np.cumsum([len(group) for group in members]))).astype(np.int64),
+            "cluster_members": np.array([member for group in members for member in group], dtype=np.int32),
+        }
+
+    def load_arrays(self, ids: List[str], arrays: Dict[str, np.ndarray]) -> None:
+        """Replaces the index with one stored by to_arrays; `ids` are the snapshot's node IDs."""
+        self.clear(str(arrays["cluster_method"]))
+        indptr = arrays["cluster_indptr"].tolist()
+        members = arrays["cluster_members"].tolist()
+        for row, (cluster_id, values) in enumerate(zip(arrays["cluster_ids"].tolist(), arrays["cluster_stats"].tolist())):
+            stats = dict(zip(CLUSTER_STAT_FIELDS, values))
+            stats["size"], stats["fraud_count"] = int(stats["size"]), int(stats["fraud_count"])
+            self.set_cluster(cluster_id, [ids[i] for i in members[indptr[row]:indptr[row + 1]]], stats)
+
+    def clusters_of(self, user_ids: Iterable[str]) -> Set[str]:
+        return {self.cluster_of[user_id] for user_id in user_ids if user_id in self.cluster_of}
+
+    def same_cluster(self, user1_id: str, user2_id: str) -> bool:
+        cluster_id = self.cluster_of.get(user1_id)
+        return cluster_id is not None and cluster_id == self.cluster_of.get(user2_id)
+
+    def lookup(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the ID and stats of the user's cluster, or None if it is in none."""
+        cluster_id = self.cluster_of.get(user_id)
+        if cluster_id is None:
+            return None
+        return dict(self.stats[cluster_id], cluster_id=cluster_id)
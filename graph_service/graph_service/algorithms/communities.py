@@ -0,0 +1,163 @@
+from typing import List, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Community detection methods accepted by detect_communities
+COMMUNITY_METHODS = ("label_propagation", "louvain")
+
+
+def filter_edges(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, min_weight: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Drops the links lighter than `min_weight` from CSR arrays."""
+    keep = np.asarray(weights) >= min_weight
+    if keep.all():
+        return indptr, indices, weights
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    counts = np.bincount(rows[keep], minlength=len(indptr) - 1)
+    return np.concatenate(([0], np.cumsum(counts))).astype(np.int64), indices[keep], weights[keep]
+
+
+def connected_components(indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Component label (the smallest node index in the component) of every node,
+    by hooking each node onto its smallest neighbor label and pointer jumping
+    until nothing changes. Every pass is a few vectorized operations over the
+    edge arrays.
+    """
+    size = len(indptr) - 1
+    labels = np.arange(size, dtype=np.int64)
+    rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(indptr))
+    columns = np.asarray(indices, dtype=np.int64)
+    while True:
+        hooked = labels.copy()
+        np.minimum.at(hooked, labels[rows], labels[columns])
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def component_groups(labels: np.ndarray, min_size: int = 2) -> List[np.ndarray]:
+    """Node indexes of every component with at least `min_size` nodes, largest first."""
+    order = np.argsort(labels, kind="stable")
+    starts = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1]])
+    groups = [group for group in np.split(order, starts[1:]) if len(group) >= min_size]
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+def induced_subgraph(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    CSR arrays of the subgraph on `nodes`, renumbered 0..len(nodes) - 1 in
+    the given order. `nodes` must be a union of whole components, so no edge
+    leaves it.
+    """
+    local = np.full(len(indptr) - 1, -1, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes))
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    sub_indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    positions = np.repeat(starts - sub_indptr[:-1], counts) + np.arange(sub_indptr[-1])
+    return sub_indptr, local[indices[positions]], weights[positions]
+
+
+def _heaviest_labels(rows: np.ndarray, neighbor_labels: np.ndarray, weights: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    For every node, the neighbor label with the largest total link weight.
+    Ties keep the node's current label, then go to the smallest label.
+    """
+    size = len(labels)
+    keys = rows * size + neighbor_labels
+    order = np.argsort(keys)
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    totals = np.add.reduceat(weights[order], starts)
+    nodes, candidates = np.divmod(keys[starts], size)
+    is_current = candidates == labels[nodes]
+    ranked = np.lexsort((candidates, ~is_current, -totals, nodes))
+    first = ranked[np.r_[True, nodes[ranked][1:] != nodes[ranked][:-1]]]
+    best = labels.copy()
+    best[nodes[first]] = candidates[first]
+    return best
+
+
+def label_propagation(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, max_iterations: int = 30, seed: int = 0) -> np.ndarray:
+    """
+    Weighted label propagation: every node repeatedly adopts the label
+    carrying the most link weight among its neighbors, so a single weak link
+    cannot pull a node into another community. Updates are semi-synchronous
+    (a random half of the nodes per step), which keeps two neighbors from
+    swapping labels forever. Returns dense community labels 0..k - 1.
+    """
+    size = len(indptr) - 1
+    labels = np.arange(size, dtype=np.int64)
+    if size == 0 or len(indices) == 0:
+        return labels
+    rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(indptr))
+    columns = np.asarray(indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    for _ in range(max_iterations):
+        active = rng.random(size) < 0.5
+        changed = 0
+        for step in (active, ~active):
+            best = _heaviest_labels(rows, labels[columns], weights, labels)
+            update = step & (best != labels)
+            labels[update] = best[update]
+            changed += int(update.sum())
+        if not changed:
+            break
+    return np.unique(labels, return_inverse=True)[1].astype(np.int64)
+
+
+def louvain(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, seed: int = 0) -> np.ndarray:
+    """Weighted Louvain modularity communities of one connected component, as dense labels."""
+    size = len(indptr) - 1
+    rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(indptr))
+    graph = nx.Graph()
+    graph.add_nodes_from(range(size))
+    graph.add_weighted_edges_from((int(u), int(v), float(w)) for u, v, w in zip(rows, indices, weights) if u < v)
+    labels = np.zeros(size, dtype=np.int64)
+    for label, members in enumerate(nx.community.louvain_communities(graph, weight="weight", seed=seed)):
+        labels[list(members)] = label
+    return labels
+
+
+def detect_communities(method: str, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, offsets: np.ndarray, seed: int = 0) -> np.ndarray:
+    """
+    Community labels for a chunk of whole connected components laid out
+    consecutively (component k holds nodes offsets[k]..offsets[k + 1] - 1).
+    Runs in worker processes, so it only takes and returns arrays.
+    Labels are dense over the chunk and never shared between components.
+    """
+    if method == "label_propagation":
+        # Labels cannot cross components, so the whole chunk runs at once
+        return label_propagation(indptr, indices, weights, seed=seed)
+    labels = np.empty(len(indptr) - 1, dtype=np.int64)
+    next_label = 0
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        component = np.arange(start, end)
+        sub_indptr, sub_indices, sub_weights = induced_subgraph(indptr, indices, weights, component)
+        component_labels = louvain(sub_indptr, sub_indices, sub_weights, seed=seed)
+        labels[start:end] = component_labels + next_label
+        next_label += int(component_labels.max()) + 1
+    return labels
+
+
+def community_stats(labels: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, fraud: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Size, number of fraudulent members and total internal link weight of every
+    community, indexed by label; nodes labeled -1 belong to none.
+    """
+    count = int(labels.max()) + 1 if len(labels) and labels.max() >= 0 else 0
+    member = labels >= 0
+    sizes = np.bincount(labels[member], minlength=count)
+    fraud_counts = np.bincount(labels[member & fraud], minlength=count)
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    internal = (rows < indices) & (labels[rows] >= 0) & (labels[rows] == labels[indices])
+    link_weights = np.bincount(labels[rows[internal]], weights=np.asarray(weights, dtype=np.float64)[internal], minlength=count)
+    return sizes, fraud_counts, link_weights
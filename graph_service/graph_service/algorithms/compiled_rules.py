@@ -0,0 +1,148 @@
+import math
+import operator as operators
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .blocking import normalize_key
+
+# Operators comparing parsed numbers; anything non-numeric never matches
+NUMERIC_OPERATORS: Dict[str, Callable] = {"greater_than": operators.gt, "lower_than": operators.lt}
+
+
+def parse_number(value: Any) -> float:
+    """Parses a rule operand as a float, or NaN (which fails every comparison) if it is not numeric."""
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class AttributeColumns:
+    """
+    Per-user attribute columns, normalized once instead of on every comparison:
+    `text` holds blocking-normalized strings (trimmed, lowercased, whitespace
+    collapsed; None when missing) and `number` holds float64 arrays with NaN
+    for missing or non-numeric values. Columns are built on first use and
+    extended by append(); number columns are views of buffers whose capacity
+    doubles when full, so appending stays amortized O(1).
+    """
+
+    def __init__(self, users: List[Dict[str, Any]]):
+        self.users = list(users)
+        self._text: Dict[str, List[Optional[str]]] = {}
+        # Number column buffers; rows past len(users) are unused capacity
+        self._number: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def text(self, field: str) -> List[Optional[str]]:
+        if field not in self._text:
+            self._text[field] = [normalize_key(user.get(field)) for user in self.users]
+        return self._text[field]
+
+    def number(self, field: str) -> np.ndarray:
+        if field not in self._number:
+            self._number[field] = np.fromiter((parse_number(user.get(field)) for user in self.users), dtype=np.float64, count=len(self.users))
+        return self._number[field][:len(self.users)]
+
+    def append(self, user: Dict[str, Any]) -> int:
+        """Adds a user to every built column and returns its row."""
+        row = len(self.users)
+        self.users.append(user)
+        for field, column in self._text.items():
+            column.append(normalize_key(user.get(field)))
+        for field, buffer in self._number.items():
+            if row == len(buffer):
+                buffer = np.resize(buffer, max(2 * len(buffer), 16))
+                self._number[field] = buffer
+            buffer[row] = parse_number(user.get(field))
+        return row
+
+    def set(self, row: int, user: Dict[str, Any]) -> None:
+        """Replaces the user in `row` in every built column."""
+        self.users[row] = user
+        for field, column in self._text.items():
+            column[row] = normalize_key(user.get(field))
+        for field, column in self._number.items():
+            column[row] = parse_number(user.get(field))
+
+
+class CompiledRule:
+    """
+    A graph rule with its operator resolved and its fixed value normalized
+    once, evaluated against AttributeColumns. Two-field rules compare
+    users[i][field1] with users[j][field2]; fixed-value rules only look at
+    users[i][field1]. apply_graph_rule delegates here. Unlike the original
+    raw string comparison, "equal" and "contains" compare blocking-normalized
+    text: case-insensitive, trimmed and with inner whitespace collapsed.
+    """
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.rule = rule
+        self.field1 = rule.get('field1')
+        self.field2 = rule.get('field2')
+        self.operator = rule.get('operator')
+        self.value = rule.get('value')
+        self.text_value = normalize_key(self.value)
+        self.number_value = parse_number(self.value)
+
+    @property
+    def pairwise(self) -> bool:
+        return bool(self.field2)
+
+    def match(self, columns: AttributeColumns, i: int, j: int) -> bool:
+        """Whether the rule holds between rows i and j (or for row i, if it has a fixed value)."""
+        if self.pairwise:
+            if self.operator in NUMERIC_OPERATORS:
+                return bool(NUMERIC_OPERATORS[self.operator](columns.number(self.field1)[i], columns.number(self.field2)[j]))
+            return self._match_text(columns.text(self.field1)[i], columns.text(self.field2)[j])
+        if self.value is None:
+            return False
+        if self.operator in NUMERIC_OPERATORS:
+            return bool(NUMERIC_OPERATORS[self.operator](columns.number(self.field1)[i], self.number_value))
+        return self._match_text(columns.text(self.field1)[i], self.text_value)
+
+    def match_values(self, left: Any, right: Any) -> bool:
+        """Evaluates the rule on two raw operands; for fixed-value rules `right` is the value."""
+        if self.operator in NUMERIC_OPERATORS:
+            return bool(NUMERIC_OPERATORS[self.operator](parse_number(left), parse_number(right)))
+        return self._match_text(normalize_key(left), normalize_key(right))
+
+    def value_mask(self, columns: AttributeColumns) -> np.ndarray:
+        """Boolean mask of the rows satisfying a fixed-value rule, vectorized for numeric operators."""
+        if self.value is None or not self.field1:
+            return np.zeros(len(columns), dtype=bool)
+        if self.operator in NUMERIC_OPERATORS:
+            return NUMERIC_OPERATORS[self.operator](columns.number(self.field1), self.number_value)
+        return np.fromiter((self._match_text(value, self.text_value) for value in columns.text(self.field1)), dtype=bool, count=len(columns))
+
+    def later_matches(self, columns: AttributeColumns, i: int) -> np.ndarray:
+        """Rows j > i for which a two-field rule holds between rows i and j, vectorized for numeric operators."""
+        if self.operator in NUMERIC_OPERATORS:
+            right = columns.number(self.field2)[i + 1:]
+            return np.flatnonzero(NUMERIC_OPERATORS[self.operator](columns.number(self.field1)[i], right)) + i + 1
+        left = columns.text(self.field1)[i]
+        right = columns.text(self.field2)
+        return np.array([j for j in range(i + 1, len(columns)) if self._match_text(left, right[j])], dtype=np.int64)
+
+    def earlier_matches(self, columns: AttributeColumns, j: int) -> np.ndarray:
+        """Rows i < j for which a two-field rule holds between rows i and j, vectorized for numeric operators."""
+        if self.operator in NUMERIC_OPERATORS:
+            left = columns.number(self.field1)[:j]
+            return np.flatnonzero(NUMERIC_OPERATORS[self.operator](left, columns.number(self.field2)[j]))
+        left = columns.text(self.field1)
+        right = columns.text(self.field2)[j]
+        return np.array([i for i in range(j) if self._match_text(left[i], right)], dtype=np.int64)
+
+    def _match_text(self, left: Optional[str], right: Optional[str]) -> bool:
+        if left is None or right is None:
+            return False
+        if self.operator == "equal":
+            return left == right
+        if self.operator == "contains":
+            return right in left
+        return False
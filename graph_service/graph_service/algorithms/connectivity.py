@@ -0,0 +1,36 @@
+from collections import deque
+from typing import Hashable, Optional, Set, Tuple
+
+
+def bidirectional_split_check(graph, source: Hashable, target: Hashable, max_visits: Optional[int] = None) -> Tuple[Optional[bool], Optional[Hashable], Set[Hashable]]:
+    """
+    Decides whether `source` and `target` are still connected, e.g. after the
+    edge between them was removed, with a BFS from both ends that always
+    expands the smaller frontier. The work is bounded by the smaller side.
+
+    Returns (True, None, set()) when the searches meet, (False, endpoint,
+    component) when one search ran out (`component` is then the whole
+    connected component of `endpoint`), or (None, None, set()) when
+    `max_visits` nodes were visited without a decision.
+    """
+    if source not in graph or target not in graph:
+        return False, None, set()
+    if source == target:
+        return True, None, set()
+    sides = [(source, {source}, deque([source])), (target, {target}, deque([target]))]
+    visits = 2
+    while True:
+        side, other = (sides[0], sides[1]) if len(sides[0][2]) <= len(sides[1][2]) else (sides[1], sides[0])
+        endpoint, visited, queue = side
+        if not queue:
+            return False, endpoint, visited
+        node = queue.popleft()
+        for neighbor in graph.neighbors(node):
+            if neighbor in other[1]:
+                return True, None, set()
+            if neighbor not in visited:
+                visited.add(neighbor)
+                queue.append(neighbor)
+                visits += 1
+        if max_visits is not None and visits > max_visits:
+            return None, None, set()
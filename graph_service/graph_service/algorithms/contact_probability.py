@@ -0,0 +1,80 @@
+from typing import Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+
+class FraudContactIndex:
+    """
+    Random walk with restart (personalized PageRank) contact with fraud: for
+    every node v, the stationary probability that a walk starting at v, which
+    follows links in proportion to their weight and jumps back to v with
+    probability `restart` at every step, is standing on a fraudster. That is
+    the total personalized PageRank of v's walk over the fraud seeds, and it
+    grows with the number and weight of short paths to fraud:
+
+        h[v] = restart * [v is a seed] + (1 - restart) * sum_u w(v, u) / w(v) * h[u]
+
+    A walk at a node without links stays there. Solving this one system
+    scores every node at once, instead of running a PageRank per node.
+    Solved by power iteration over CSR arrays. The iteration is a contraction,
+    so it converges from any start; recomputing after the seed set changes
+    starts from the previous vector, which is usually close.
+    """
+
+    def __init__(self, restart: float = 0.15, tolerance: float = 1e-6, max_iterations: int = 200):
+        self.restart = restart
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.index: Dict[Hashable, int] = {}
+        self.scores = np.empty(0, dtype=np.float64)
+        self.iterations = 0
+        # Seed or link changes not yet reflected in the scores
+        self.pending_changes = 1
+
+    def mark_changed(self) -> None:
+        self.pending_changes += 1
+
+    def lookup(self, node: Hashable) -> Optional[float]:
+        """Returns the node's probability of contact with fraud, or None if it was not scored."""
+        position = self.index.get(node)
+        return float(self.scores[position]) if position is not None else None
+
+    def compute(self, ids: List[Hashable], indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, seeds: Iterable[Hashable]) -> int:
+        """Recomputes every score for the given CSR graph and returns the number of iterations."""
+        size = len(ids)
+        index = {node: i for i, node in enumerate(ids)}
+        seed_positions = np.array([index[seed] for seed in seeds if seed in index], dtype=np.int64)
+
+        # Warm start from the previous scores of nodes that still exist
+        if self.index and ids == list(self.index):
+            scores = self.scores.copy()
+        else:
+            scores = np.zeros(size, dtype=np.float64)
+            for node, position in index.items():
+                previous = self.index.get(node)
+                if previous is not None:
+                    scores[position] = self.scores[previous]
+        is_seed = np.zeros(size, dtype=np.float64)
+        is_seed[seed_positions] = 1.0
+
+        rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(indptr))
+        weights = np.asarray(weights, dtype=np.float64)
+        degree = np.bincount(rows, weights=weights, minlength=size)
+        step = np.divide(1.0 - self.restart, degree, out=np.zeros(size), where=degree > 0)
+        # A walk stuck on a node without links is on a fraudster exactly when that node is one
+        dangling = degree <= 0
+        scores[dangling] = is_seed[dangling]
+
+        iterations = 0
+        for iterations in range(1, self.max_iterations + 1):
+            updated = self.restart * is_seed + step * np.bincount(rows, weights=weights * scores[indices], minlength=size)
+            updated[dangling] = is_seed[dangling]
+            delta = np.abs(updated - scores).max() if size else 0.0
+            scores = updated
+            if delta < self.tolerance:
+                break
+
+        self.index = index
+        self.scores = scores
+        self.iterations = iterations
+        return iterations
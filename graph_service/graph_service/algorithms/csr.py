@@ -0,0 +1,352 @@
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class _NodeView:
+    """
+    Read-only stand-in for networkx's `graph.nodes`. Node attributes are not
+    kept in a CompactGraph (they are fetched from MongoDB on demand), so item
+    access returns a fresh empty dict and writes to it are discarded.
+    """
+
+    def __init__(self, graph: "CompactGraph"):
+        self._graph = graph
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._graph._index)
+
+    def __len__(self) -> int:
+        return len(self._graph._index)
+
+    def __contains__(self, node: Hashable) -> bool:
+        return node in self._graph._index
+
+    def __getitem__(self, node: Hashable) -> Dict[str, Any]:
+        if node not in self._graph._index:
+            raise KeyError(node)
+        return {}
+
+
+class CompactGraph:
+    """
+    Undirected weighted graph stored as integer-indexed CSR arrays.
+
+    String node IDs are mapped to int32 indexes; adjacency lives in NumPy
+    arrays (int64 row pointers, int32 column indexes sorted within each row,
+    float32 weights). Edge attributes other than the weight and all node
+    attributes are dropped. Mutations go to a small overlay: added edges are
+    kept in dicts and removed base edges are masked out, and the arrays are
+    rebuilt once the overlay exceeds `compact_ratio` of the edge count.
+
+    Implements the subset of the networkx.Graph API the services use, so it
+    can be swapped in via GRAPH_BACKEND=compact.
+    """
+
+    def __init__(self, compact_ratio: float = 0.1, min_overlay: int = 1024):
+        self.compact_ratio = compact_ratio
+        self.min_overlay = min_overlay
+        self.clear()
+
+    def clear(self) -> None:
+        self._index: Dict[Hashable, int] = {}
+        self._ids: List[Optional[Hashable]] = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._weights = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._added: Dict[int, Dict[int, float]] = {}
+        self._overlay_size = 0
+        self._edge_count = 0
+
+    # Nodes
+
+    @property
+    def nodes(self) -> _NodeView:
+        return _NodeView(self)
+
+    def __contains__(self, node: Hashable) -> bool:
+        return node in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._index)
+
+    def number_of_nodes(self) -> int:
+        return len(self._index)
+
+    def add_node(self, node: Hashable, **attributes) -> None:
+        """Adds `node` if missing; attributes are ignored."""
+        if node not in self._index:
+            self._index[node] = len(self._ids)
+            self._ids.append(node)
+
+    def add_nodes_from(self, nodes: Iterable) -> None:
+        for node in nodes:
+            # Accept networkx-style (node, attributes) tuples
+            self.add_node(node[0] if isinstance(node, tuple) else node)
+
+    def remove_node(self, node: Hashable) -> None:
+        if node not in self._index:
+            raise KeyError(node)
+        for neighbor in list(self.neighbors(node)):
+            self.remove_edge(node, neighbor)
+        self._ids[self._index.pop(node)] = None
+
+    # Edges
+
+    def number_of_edges(self) -> int:
+        return self._edge_count
+
+    def _base_position(self, i: int, j: int) -> Optional[int]:
+        if i >= len(self._indptr) - 1:
+            return None
+        start, end = self._indptr[i], self._indptr[i + 1]
+        pos = start + int(np.searchsorted(self._indices[start:end], j))
+        if pos < end and self._indices[pos] == j and self._alive[pos]:
+            return pos
+        return None
+
+    def _edge_weight(self, i: int, j: int) -> Optional[float]:
+        added = self._added.get(i)
+        if added is not None and j in added:
+            return added[j]
+        pos = self._base_position(i, j)
+        return float(self._weights[pos]) if pos is not None else None
+
+    def has_edge(self, u: Hashable, v: Hashable) -> bool:
+        i, j = self._index.get(u), self._index.get(v)
+        return i is not None and j is not None and self._edge_weight(i, j) is not None
+
+    def get_edge_data(self, u: Hashable, v: Hashable, default: Any = None) -> Any:
+        i, j = self._index.get(u), self._index.get(v)
+        weight = self._edge_weight(i, j) if i is not None and j is not None else None
+        return default if weight is None else {"weight": weight}
+
+    def add_edge(self, u: Hashable, v: Hashable, weight: float = 1.0, **attributes) -> None:
+        """Adds or reweights the edge u-v; attributes other than `weight` are ignored."""
+        self.add_node(u)
+        self.add_node(v)
+        i, j = self._index[u], self._index[v]
+        pos = self._base_position(i, j)
+        if pos is not None:
+            self._weights[pos] = weight
+            self._weights[self._base_position(j, i)] = weight
+            return
+        if j not in self._added.get(i, ()):
+            self._edge_count += 1
+            self._overlay_size += 1
+        self._added.setdefault(i, {})[j] = weight
+        self._added.setdefault(j, {})[i] = weight
+        self._maybe_compact()
+
+    def add_edges_from(self, edges: Iterable[Tuple]) -> None:
+        for edge in edges:
+            attributes = edge[2] if len(edge) > 2 else {}
+            self.add_edge(edge[0], edge[1], weight=attributes.get("weight", 1.0))
+
+    def remove_edge(self, u: Hashable, v: Hashable) -> None:
+        i, j = self._index.get(u), self._index.get(v)
+        if i is None or j is None:
+            raise KeyError((u, v))
+        added = self._added.get(i)
+        if added is not None and j in added:
+            del added[j]
+            self._added[j].pop(i, None)
+            self._overlay_size -= 1
+        else:
+            pos = self._base_position(i, j)
+            if pos is None:
+                raise KeyError((u, v))
+            self._alive[pos] = False
+            self._alive[self._base_position(j, i)] = False
+            self._overlay_size += 1
+        self._edge_count -= 1
+        self._maybe_compact()
+
+    # Queries
+
+    def _neighbor_indexes(self, i: int) -> np.ndarray:
+        if i < len(self._indptr) - 1:
+            start, end = self._indptr[i], self._indptr[i + 1]
+            base = self._indices[start:end][self._alive[start:end]]
+        else:
+            base = np.empty(0, dtype=np.int32)
+        added = self._added.get(i)
+        if added:
+            return np.concatenate([base, np.fromiter(added, dtype=np.int32, count=len(added))])
+        return base
+
+    def neighbors(self, node: Hashable) -> Iterator[Hashable]:
+        if node not in self._index:
+            raise KeyError(node)
+        ids = self._ids
+        return (ids[j] for j in self._neighbor_indexes(self._index[node]).tolist())
+
+    def edges(self, data: bool = False) -> Iterator[Tuple]:
+        """Yields every edge once as (u, v) or, with data=True, (u, v, {"weight": w})."""
+        ids = self._ids
+        for u, i in self._index.items():
+            for j in self._neighbor_indexes(i).tolist():
+                if i < j:
+                    yield (u, ids[j], {"weight": self._edge_weight(i, j)}) if data else (u, ids[j])
+
+    def degree(self, node: Hashable) -> int:
+        return len(self._neighbor_indexes(self._index[node]))
+
+    def _expand(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (neighbor, parent) index arrays for every live edge leaving `frontier`."""
+        base_rows = len(self._indptr) - 1
+        in_base = frontier[frontier < base_rows]
+        starts = self._indptr[in_base]
+        counts = self._indptr[in_base + 1] - starts
+        total = int(counts.sum())
+        # Positions of every edge in the frontier rows, without a Python loop
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        parents = np.repeat(in_base, counts)
+        mask = self._alive[positions]
+        neighbors, parents = self._indices[positions][mask], parents[mask]
+        if self._added:
+            extra = [(j, i) for i in frontier.tolist() for j in self._added.get(i, ())]
+            if extra:
+                extra = np.array(extra, dtype=np.int64)
+                neighbors = np.concatenate([neighbors, extra[:, 0]])
+                parents = np.concatenate([parents, extra[:, 1]])
+        return neighbors.astype(np.int64), parents.astype(np.int64)
+
+    def multi_source_bfs(self, sources: Iterable[Hashable], max_depth: Optional[int] = None) -> Tuple[Dict[Hashable, int], Dict[Hashable, Hashable]]:
+        """
+        Level-synchronous BFS from every source at once, run on the arrays.
+        Returns ({node: hops to nearest source}, {node: that source}).
+        """
+        size = len(self._ids)
+        distance = np.full(size, -1, dtype=np.int64)
+        label = np.full(size, -1, dtype=np.int64)
+        frontier = np.array(sorted({self._index[s] for s in sources if s in self._index}), dtype=np.int64)
+        distance[frontier] = 0
+        label[frontier] = frontier
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            depth += 1
+            neighbors, parents = self._expand(frontier)
+            fresh = distance[neighbors] < 0
+            neighbors, parents = neighbors[fresh], parents[fresh]
+            # Keep the first parent reaching each node
+            frontier, first = np.unique(neighbors, return_index=True)
+            distance[frontier] = depth
+            label[frontier] = label[parents[first]]
+        reached = np.nonzero(distance >= 0)[0].tolist()
+        ids = self._ids
+        return ({ids[i]: int(distance[i]) for i in reached}, {ids[i]: ids[int(label[i])] for i in reached})
+
+    # Maintenance
+
+    def _maybe_compact(self) -> None:
+        if self._overlay_size > max(self.min_overlay, self.compact_ratio * self._edge_count):
+            self.compact()
+
+    def compact(self) -> None:
+        """Folds the overlay into fresh CSR arrays and renumbers away deleted nodes."""
+        rows = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+        rows, cols, weights = rows[self._alive], self._indices[self._alive].astype(np.int64), self._weights[self._alive]
+        if self._added:
+            extra = [(i, j, w) for i, row in self._added.items() for j, w in row.items()]
+            if extra:
+                extra_rows, extra_cols, extra_weights = zip(*extra)
+                rows = np.concatenate([rows, np.array(extra_rows, dtype=np.int64)])
+                cols = np.concatenate([cols, np.array(extra_cols, dtype=np.int64)])
+                weights = np.concatenate([weights, np.array(extra_weights, dtype=np.float32)])
+
+        live = [node for node in self._ids if node is not None]
+        remap = np.full(len(self._ids), -1, dtype=np.int64)
+        remap[[self._index[node] for node in live]] = np.arange(len(live))
+        rows, cols = remap[rows], remap[cols]
+
+        order = np.lexsort((cols, rows))
+        self._ids = live
+        self._index = {node: i for i, node in enumerate(live)}
+        self._indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(live)))]).astype(np.int64)
+        self._indices = cols[order].astype(np.int32)
+        self._weights = weights[order].astype(np.float32)
+        self._alive = np.ones(len(order), dtype=bool)
+        self._added = {}
+        self._overlay_size = 0
+
+    def copy(self) -> "CompactGraph":
+        """
+        Returns an independent copy that can be read or compacted in another
+        thread. The row pointers and column indexes are never written in place,
+        so they are shared; the weights, the deletion mask, the node maps and
+        the overlay are copied (flat copies, no per-edge Python work).
+        """
+        other = CompactGraph(self.compact_ratio, self.min_overlay)
+        other._index = dict(self._index)
+        other._ids = list(self._ids)
+        other._indptr = self._indptr
+        other._indices = self._indices
+        other._weights = self._weights.copy()
+        other._alive = self._alive.copy()
+        other._added = {i: dict(row) for i, row in self._added.items()}
+        other._overlay_size = self._overlay_size
+        other._edge_count = self._edge_count
+        return other
+
+    def to_arrays(self) -> Tuple[List[Hashable], np.ndarray, np.ndarray, np.ndarray]:
+        """Compacts the graph and returns (node IDs, indptr, indices, weights)."""
+        self.compact()
+        return list(self._ids), self._indptr, self._indices, self._weights
+
+    def load_edges(self, nodes: Iterable[Hashable], edges: Iterable[Tuple[Hashable, Hashable, float]]) -> None:
+        """
+        Replaces the graph with `nodes` and weighted `edges` in one vectorized
+        CSR build. Duplicate edges (in either direction) keep the last weight.
+        """
+        self.clear()
+        for node in nodes:
+            self.add_node(node)
+        index = self._index
+        rows, cols, weights = [], [], []
+        for u, v, weight in edges:
+            self.add_node(u)
+            self.add_node(v)
+            rows.append(index[u])
+            cols.append(index[v])
+            weights.append(weight)
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        weights = np.array(weights, dtype=np.float32)
+
+        # Store both directions next to each other, then keep the last occurrence of each (row, col)
+        rows, cols = np.column_stack([rows, cols]).ravel(), np.column_stack([cols, rows]).ravel()
+        weights = np.repeat(weights, 2)
+        size = len(self._ids)
+        keys = rows * size + cols
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last
+        rows, cols, weights = rows[keep], cols[keep], weights[keep]
+
+        order = np.lexsort((cols, rows))
+        self._indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=size))]).astype(np.int64)
+        self._indices = cols[order].astype(np.int32)
+        self._weights = weights[order]
+        self._alive = np.ones(len(order), dtype=bool)
+        self._edge_count = (len(order) + int(np.count_nonzero(rows == cols))) // 2
+
+    def load_arrays(self, ids: List[Hashable], indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> None:
+        """
+        Replaces the graph with prebuilt CSR arrays, e.g. memory-mapped from a
+        snapshot. The arrays are used as-is; with copy-on-write maps, pages are
+        only copied if a reweight writes to them.
+        """
+        self.clear()
+        self._ids = list(ids)
+        self._index = {node: i for i, node in enumerate(self._ids)}
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+        self._alive = np.ones(len(indices), dtype=bool)
+        self._edge_count = len(indices) // 2
+
+    def nbytes(self) -> int:
+        """Bytes used by the adjacency arrays (excluding the ID mapping and overlay)."""
+        return self._indptr.nbytes + self._indices.nbytes + self._weights.nbytes + self._alive.nbytes
@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from common.config import GRAPH_CARD_HASH_KEY
+from .blocking import normalize_key
+from .text import normalize_address
+
+_NON_DIGITS = re.compile(r"\D+")
+
+# Entity types and the dotted paths they are read from; the first present path wins
+USER_ENTITY_FIELDS = {
+    "phone": ["phone_number"],
+    "email_domain": ["domain_email"],
+    "address": ["address"],
+}
+TRANSACTION_ENTITY_FIELDS = {
+    "card": ["payment.number", "number"],
+    "shipzip": ["shipzip"],
+    "device": ["device_id", "device"],
+}
+# Evidence weight of sharing one entity of each type with exactly one other user
+ENTITY_WEIGHTS = {"phone": 0.9, "card": 0.9, "device": 0.8, "address": 0.6, "shipzip": 0.2, "email_domain": 0.1}
+
+
+def _digits(value: Any) -> Optional[str]:
+    digits = _NON_DIGITS.sub("", str(value))
+    return digits or None
+
+
+def _address_hash(value: Any) -> Optional[str]:
+    address = normalize_address(value)
+    return hashlib.blake2b(address.encode(), digest_size=8).hexdigest() if address else None
+
+
+def _card_hash(value: Any) -> Optional[str]:
+    """
+    Card numbers are stored as an HMAC of their digits under
+    GRAPH_CARD_HASH_KEY: a plain hash could be reversed by enumerating the few
+    valid numbers behind a known BIN. It is truncated to 20 hex characters,
+    longer than any card number, so a hashed key never looks like a raw one.
+    """
+    digits = _digits(value)
+    return hmac.new(GRAPH_CARD_HASH_KEY.encode(), digits.encode(), "blake2b").hexdigest()[:20] if digits else None
+
+
+ENTITY_NORMALIZERS = {"phone": _digits, "card": _card_hash, "address": _address_hash}
+# Card entity keys written before card numbers were hashed
+RAW_CARD_KEY_PATTERN = "^card:[0-9]{1,19}$"
+# Arrays a graph snapshot stores the entity graph in (see EntityGraph.to_arrays)
+ENTITY_SNAPSHOT_ARRAYS = ("entity_keys", "entity_indptr", "entity_indices")
+
+
+def entity_key(kind: str, value: Any) -> Optional[str]:
+    """Typed entity node ID such as "phone:0826804294", or None for an empty value."""
+    if value is None:
+        return None
+    normalized = ENTITY_NORMALIZERS.get(kind, normalize_key)(value)
+    return f"{kind}:{normalized}" if normalized else None
+
+
+def entity_kind(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def extract_entities(document: Dict[str, Any], fields: Dict[str, List[str]]) -> Set[str]:
+    """Entity keys of a user or transaction document for the given type-to-paths mapping."""
+    keys = set()
+    for kind, paths in fields.items():
+        for path in paths:
+            value = document
+            for part in path.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is not None:
+                key = entity_key(kind, value)
+                if key:
+                    keys.add(key)
+                break
+    return keys
+
+
+class EntityGraph:
+    """
+    Bipartite graph between users and the typed entities they use (phones,
+    cards, ship zips, devices, address hashes). A group of n users sharing one
+    entity costs n edges here instead of n * (n - 1) / 2 user-to-user links,
+    and "who shares an entity with X" is a walk over X's entities, O(degree).
+    The weighted user-to-user projection is only computed per query.
+
+    Workers sharing a graph keep their entity graphs in step through the
+    graph changelog ("add_entities" and "set_entities" entries, applied with
+    apply()) and graph snapshots (to_arrays/load_arrays).
+    """
+
+    def __init__(self):
+        self.users_of: Dict[str, Set[str]] = {}
+        self.entities_of: Dict[str, Set[str]] = {}
+
+    def clear(self) -> None:
+        self.users_of.clear()
+        self.entities_of.clear()
+
+    def add(self, user_id: str, keys: Iterable[str]) -> List[str]:
+        """Connects a user to entities and returns the keys that were new for the user."""
+        entities = self.entities_of.setdefault(user_id, set())
+        added = [key for key in keys if key not in entities]
+        for key in added:
+            entities.add(key)
+            self.users_of.setdefault(key, set()).add(user_id)
+        return added
+
+    def replace(self, user_id: str, keys: Iterable[str], kinds: Iterable[str]) -> None:
+        """Replaces the user's entities of the given types, e.g. after the user document changed."""
+        kinds = set(kinds)
+        keys = set(keys)
+        for key in [key for key in self.entities_of.get(user_id, ()) if entity_kind(key) in kinds and key not in keys]:
+            self._disconnect(user_id, key)
+        self.add(user_id, keys)
+
+    def remove_user(self, user_id: str) -> None:
+        for key in list(self.entities_of.get(user_id, ())):
+            self._disconnect(user_id, key)
+        self.entities_of.pop(user_id, None)
+
+    def _disconnect(self, user_id: str, key: str) -> None:
+        self.entities_of[user_id].discard(key)
+        users = self.users_of.get(key)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.users_of[key]
+
+    def apply(self, change: Dict[str, Any]) -> None:
+        if change['op'] == "add_entities":
+            self.add(change['node'], change['entities'])
+        elif change['op'] == "set_entities":
+            self.replace(change['node'], change['entities'], change['kinds'])
+        elif change['op'] == "remove_node":
+            self.remove_user(change['node'])
+
+    def to_arrays(self, position: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """
+        The graph as arrays for a graph snapshot: the entity keys and each
+        user's entities as CSR over the snapshot's node positions. Users
+        that are not nodes of the snapshot are left out.
+        """
+        keys = list(self.users_of)
+        key_position = {key: i for i, key in enumerate(keys)}
+        entities = [[] for _ in range(len(position))]
+        for user_id, user_keys in self.entities_of.items():
+            if user_id in position:
+                entities[position[user_id]] = [key_position[key] for key in user_keys]
+        return {
+            "entity_keys": np.array(keys, dtype=str) if keys else np.empty(0, dtype="<U1"),
+            "entity_indptr": np.concatenate(([0], np.cumsum([len(user_keys) for user_keys in entities]))).astype(np.int64),
+            "entity_indices": np.array([key for user_keys in entities for key in user_keys], dtype=np.int32),
+        }
+
+    def load_arrays(self, ids: List[str], arrays: Dict[str, np.ndarray]) -> None:
+        """Replaces the graph with one stored by to_arrays; `ids` are the snapshot's node IDs."""
+        self.clear()
+        keys = arrays["entity_keys"].tolist()
+        indptr = arrays["entity_indptr"].tolist()
+        indices = arrays["entity_indices"].tolist()
+        for position, user_id in enumerate(ids):
+            if indptr[position] < indptr[position + 1]:
+                self.add(user_id, [keys[i] for i in indices[indptr[position]:indptr[position + 1]]])
+
+    def degree(self, key: str) -> int:
+        return len(self.users_of.get(key, ()))
+
+    def shared_with(self, user_id: str, max_degree: Optional[int] = None) -> Dict[str, Any]:
+        """
+        The user's entities and the other users sharing them, with a lazily
+        projected weight per user: a noisy-or over the shared entities, each
+        contributing its type weight damped by how many users share it.
+        Entities with more than `max_degree` users (e.g. a webmail domain)
+        are listed but not expanded.
+        """
+        entities = []
+        evidence: Dict[str, List[str]] = {}
+        remaining: Dict[str, float] = {}
+        for key in sorted(self.entities_of.get(user_id, ())):
+            users = self.users_of.get(key, set())
+            expanded = max_degree is None or len(users) <= max_degree
+            entities.append({"entity": key, "type": entity_kind(key), "degree": len(users), "expanded": expanded})
+            if not expanded or len(users) < 2:
+                continue
+            weight = ENTITY_WEIGHTS.get(entity_kind(key), 0.5) / max(1.0, math.log2(len(users)))
+            for other in users:
+                if other != user_id:
+                    evidence.setdefault(other, []).append(key)
+                    remaining[other] = remaining.get(other, 1.0) * (1.0 - weight)
+        users = [
+            {"id_user": other, "weight": round(1.0 - remaining[other], 4), "entities": keys}
+            for other, keys in evidence.items()
+        ]
+        users.sort(key=lambda user: (-user["weight"], user["id_user"]))
+        return {"entities": entities, "users": users}
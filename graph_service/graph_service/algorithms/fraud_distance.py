@@ -0,0 +1,166 @@
+import heapq
+from collections import deque
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .connectivity import bidirectional_split_check
+
+
+class FraudDistanceIndex:
+    """
+    Hop distance from every node to its nearest fraudulent user, plus that fraudster's ID.
+
+    Built with one multi-source BFS seeded by all fraud users, then kept up to date
+    incrementally as edges, nodes and seeds are added or removed, so lookups are O(1).
+    The graph argument only needs `neighbors(node)` and `in` support (e.g. a networkx Graph).
+    Nodes that cannot reach any fraudster have no entry.
+    """
+
+    def __init__(self, split_check_max_visits: Optional[int] = 10000):
+        # Bound on the BFS that checks whether a removed edge split a component
+        self.split_check_max_visits = split_check_max_visits
+        self.distance: Dict[str, int] = {}
+        self.nearest: Dict[str, str] = {}
+        self.seeds: Set[str] = set()
+
+    def lookup(self, node: str) -> Tuple[Optional[int], Optional[str]]:
+        """Returns (hops to nearest fraudster, nearest fraudster ID), or (None, None) if unreachable."""
+        return self.distance.get(node), self.nearest.get(node)
+
+    def rebuild(self, graph, seeds: Iterable[str]) -> None:
+        """Recomputes every distance with a single multi-source BFS."""
+        self.distance = {}
+        self.nearest = {}
+        self.seeds = set(seeds)
+        sources = [seed for seed in self.seeds if seed in graph]
+        if hasattr(graph, "multi_source_bfs"):
+            # Compact graphs run the BFS on their arrays
+            self.distance, self.nearest = graph.multi_source_bfs(sources)
+            return
+        for seed in sources:
+            self.distance[seed] = 0
+            self.nearest[seed] = seed
+        self._relax(graph, sources)
+
+    def add_seed(self, graph, seed: str) -> None:
+        """Marks a user as fraudulent and propagates the shorter distances it creates."""
+        self.seeds.add(seed)
+        if seed in graph:
+            self.distance[seed] = 0
+            self.nearest[seed] = seed
+            self._relax(graph, [seed])
+
+    def remove_seed(self, graph, seed: str) -> None:
+        """Unmarks a fraudulent user and repairs the distances that depended on it."""
+        self.seeds.discard(seed)
+        if seed in self.distance and seed in graph:
+            self._repair(graph, [seed])
+
+    def add_edge(self, graph, source: str, target: str) -> None:
+        """Call after an edge was added to the graph."""
+        self._relax(graph, [node for node in (source, target) if node in self.distance])
+
+    def remove_edge(self, graph, source: str, target: str) -> None:
+        """Call after an edge was removed from the graph."""
+        self.remove_edges(graph, [(source, target)])
+
+    def remove_edges(self, graph, edges: Iterable[Tuple[str, str]]) -> None:
+        """
+        Call after a batch of edges was removed from the graph; the distances
+        are repaired in one pass. When a removed edge split off a component
+        without any fraudster, its nodes are simply dropped from the index.
+        """
+        candidates = []
+        unreachable = set()
+        for source, target in edges:
+            source_distance = self.distance.get(source)
+            target_distance = self.distance.get(target)
+            if source_distance is None or target_distance is None or source_distance == target_distance:
+                continue # The edge was not on any shortest path
+            child = target if target_distance > source_distance else source
+            if child in unreachable:
+                continue
+            connected, endpoint, component = bidirectional_split_check(graph, source, target, self.split_check_max_visits)
+            if connected is False and endpoint == child and not component & self.seeds:
+                unreachable |= component
+            else:
+                candidates.append(child)
+        # Drop only after every edge was classified against the old distances
+        for node in unreachable:
+            self.distance.pop(node, None)
+            self.nearest.pop(node, None)
+        if candidates:
+            self._repair(graph, candidates)
+
+    def remove_node(self, graph, node: str, neighbors: Iterable[str]) -> None:
+        """Call after a node (with its edges) was removed; `neighbors` are its former neighbors."""
+        self.seeds.discard(node)
+        node_distance = self.distance.pop(node, None)
+        self.nearest.pop(node, None)
+        if node_distance is None:
+            return
+        self._repair(graph, [n for n in neighbors if self.distance.get(n) == node_distance + 1])
+
+    def _relax(self, graph, sources: Iterable[str]) -> None:
+        """BFS from nodes with known distances, lowering any neighbor distance it can improve."""
+        queue = deque(sources)
+        while queue:
+            node = queue.popleft()
+            next_distance = self.distance[node] + 1
+            for neighbor in graph.neighbors(node):
+                if next_distance < self.distance.get(neighbor, next_distance + 1):
+                    self.distance[neighbor] = next_distance
+                    self.nearest[neighbor] = self.nearest[node]
+                    queue.append(neighbor)
+
+    def _repair(self, graph, candidates: Iterable[str]) -> None:
+        """
+        Recomputes distances for the nodes that lost their shortest path.
+        A node is affected if it is not a seed and has no unaffected neighbor one hop
+        closer to fraud with the same nearest fraudster. Candidates are processed in increasing distance order, so each
+        node's parents are decided before the node itself. Affected nodes are then
+        re-labelled from the unaffected boundary with a Dijkstra pass restricted to them.
+        """
+        heap = [(self.distance[node], node) for node in candidates if node in self.distance]
+        heapq.heapify(heap)
+        affected = set()
+        while heap:
+            node_distance, node = heapq.heappop(heap)
+            if node in affected or node in self.seeds and node_distance == 0 and node in graph:
+                continue
+            # The parent must also carry the same nearest fraudster, otherwise the
+            # node's label could still point at a removed seed
+            supported = any(
+                neighbor not in affected
+                and self.distance.get(neighbor) == node_distance - 1
+                and self.nearest[neighbor] == self.nearest[node]
+                for neighbor in graph.neighbors(node)
+            )
+            if supported:
+                continue
+            affected.add(node)
+            for neighbor in graph.neighbors(node):
+                if self.distance.get(neighbor) == node_distance + 1:
+                    heapq.heappush(heap, (node_distance + 1, neighbor))
+
+        if not affected:
+            return
+
+        for node in affected:
+            del self.distance[node]
+            del self.nearest[node]
+
+        heap = []
+        for node in affected:
+            for neighbor in graph.neighbors(node):
+                if neighbor in self.distance:
+                    heap.append((self.distance[neighbor] + 1, node, self.nearest[neighbor]))
+        heapq.heapify(heap)
+        while heap:
+            node_distance, node, nearest = heapq.heappop(heap)
+            if node in self.distance:
+                continue
+            self.distance[node] = node_distance
+            self.nearest[node] = nearest
+            for neighbor in graph.neighbors(node):
+                if neighbor in affected and neighbor not in self.distance:
+                    heapq.heappush(heap, (node_distance + 1, neighbor, nearest))
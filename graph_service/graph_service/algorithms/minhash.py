@@ -0,0 +1,80 @@
+import hashlib
+import random
+from itertools import combinations
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+# Largest Mersenne prime below 2**64, the modulus of the permutation hashes
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Character shingles of `text`; strings shorter than `size` become a single shingle."""
+    if not text:
+        return set()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+    """
+    MinHash signatures over shingle sets. Two signatures agree on any position
+    with probability equal to the Jaccard similarity of the underlying sets.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._permutations = [(rng.randint(1, _PRIME - 1), rng.randint(0, _PRIME - 1)) for _ in range(num_perm)]
+
+    @staticmethod
+    def _hash(shingle: str) -> int:
+        return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+
+    def signature(self, items: Set[str]) -> Tuple[int, ...]:
+        if not items:
+            return ()
+        hashes = [self._hash(item) for item in items]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self._permutations)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+    Signatures are split into `bands` bands of `rows` values; items sharing any
+    band land in the same bucket and become candidate pairs, so pairs with a
+    Jaccard similarity above roughly (1 / bands) ** (1 / rows) are found
+    without comparing every pair. Buckets larger than `max_bucket_size` are skipped.
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 4, max_bucket_size: Optional[int] = None):
+        self.bands = bands
+        self.rows = rows
+        self.max_bucket_size = max_bucket_size or None
+        self._buckets: List[Dict[Tuple[int, ...], List[Hashable]]] = [{} for _ in range(bands)]
+
+    def add(self, item: Hashable, signature: Tuple[int, ...]) -> None:
+        if len(signature) < self.bands * self.rows:
+            return
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows]
+            buckets.setdefault(key, []).append(item)
+
+    def candidate_pairs(self) -> Iterator[Tuple[Hashable, Hashable]]:
+        """Yields every pair of items that share at least one band, once."""
+        seen = set()
+        for buckets in self._buckets:
+            for members in buckets.values():
+                if len(members) < 2 or (self.max_bucket_size and len(members) > self.max_bucket_size):
+                    continue
+                for pair in combinations(members, 2):
+                    if pair not in seen:
+                        seen.add(pair)
+                        yield pair
@@ -0,0 +1,54 @@
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+
+def bounded_neighborhood(
+    graph,
+    source: Hashable,
+    depth: int,
+    max_per_level: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    max_degree: Optional[int] = None,
+    stop_at: Optional[Iterable[Hashable]] = None,
+) -> Dict[str, Any]:
+    """
+    Breadth-first search from `source` up to `depth` hops, with guards for
+    dense graphs:
+    - at most `max_per_level` new nodes are taken per hop and `max_nodes` in total;
+    - nodes (other than the source) with more than `max_degree` links are
+      reported but not expanded, so one hub cannot pull in half the graph;
+    - the search stops as soon as it reaches a node in `stop_at`.
+
+    The graph only needs `neighbors(node)` and `degree(node)`. Returns a dict
+    with "distances" ({node: hops}, source included), "found" ((node, hops)
+    of the first `stop_at` node or None), "truncated" (a cap was hit) and
+    "skipped_supernodes".
+    """
+    stop_at = set(stop_at or ())
+    distances = {source: 0}
+    result = {"distances": distances, "found": None, "truncated": False, "skipped_supernodes": []}
+    if source in stop_at:
+        result["found"] = (source, 0)
+        return result
+
+    frontier = [source]
+    for hops in range(1, depth + 1):
+        next_frontier = []
+        for node in frontier:
+            if node != source and max_degree is not None and graph.degree(node) > max_degree:
+                result["skipped_supernodes"].append(node)
+                continue
+            for neighbor in graph.neighbors(node):
+                if neighbor in distances:
+                    continue
+                if (max_per_level is not None and len(next_frontier) >= max_per_level) or (max_nodes is not None and len(distances) >= max_nodes):
+                    result["truncated"] = True
+                    break
+                distances[neighbor] = hops
+                next_frontier.append(neighbor)
+                if neighbor in stop_at:
+                    result["found"] = (neighbor, hops)
+                    return result
+        if not next_frontier:
+            break
+        frontier = next_frontier
+    return result
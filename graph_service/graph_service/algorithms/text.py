@@ -0,0 +1,42 @@
+import re
+from typing import Any, Dict
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Common abbreviations in Indonesian addresses, mapped to their full form
+ADDRESS_ABBREVIATIONS: Dict[str, str] = {
+    "jl": "jalan", "jln": "jalan",
+    "gg": "gang",
+    "no": "nomor", "nmr": "nomor",
+    "blk": "blok",
+    "kav": "kavling",
+    "komp": "kompleks", "komplek": "kompleks",
+    "perum": "perumahan",
+    "kel": "kelurahan", "kec": "kecamatan",
+    "kab": "kabupaten",
+    "prov": "provinsi",
+    "ds": "desa", "dsn": "dusun",
+    "kp": "kampung", "kamp": "kampung",
+}
+
+# Honorifics that carry no identity information in a full name
+NAME_STOPWORDS = {"bapak", "bpk", "pak", "ibu", "bu", "sdr", "sdri", "h", "hj", "dr", "ir"}
+
+
+def _tokens(value: Any):
+    if value is None:
+        return []
+    return _NON_ALNUM.sub(" ", str(value).lower()).split()
+
+
+def normalize_address(value: Any) -> str:
+    """
+    Lowercases an address, strips punctuation and expands abbreviations, so
+    "Jl. Melati Gg.3 No.12" and "jalan melati gang 3 nomor 12" compare equal.
+    """
+    return " ".join(ADDRESS_ABBREVIATIONS.get(token, token) for token in _tokens(value))
+
+
+def normalize_name(value: Any) -> str:
+    """Lowercases a name, strips punctuation and drops honorifics."""
+    return " ".join(token for token in _tokens(value) if token not in NAME_STOPWORDS)
@@ -0,0 +1,74 @@
+from typing import Dict, Hashable, Iterable, List
+
+
+class DisjointSet:
+    """
+    Union-find over hashable items, with path compression and union by rank.
+    find/union run in amortized near-constant time.
+    """
+
+    def __init__(self, items: Iterable[Hashable] = ()):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.rank: Dict[Hashable, int] = {}
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.parent
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self, item: Hashable) -> None:
+        """Adds `item` as a singleton set (no-op if already present)."""
+        if item not in self.parent:
+            self.parent[item] = item
+            self.rank[item] = 0
+
+    def reset(self, items: Iterable[Hashable]) -> None:
+        """
+        Makes every item a singleton again. `items` must be whole sets: no other
+        item may point into them, or its set would be corrupted.
+        """
+        for item in items:
+            self.parent[item] = item
+            self.rank[item] = 0
+
+    def discard(self, item: Hashable) -> None:
+        """Removes a singleton item (see reset())."""
+        self.parent.pop(item, None)
+        self.rank.pop(item, None)
+
+    def find(self, item: Hashable) -> Hashable:
+        """Returns the representative of the set containing `item`."""
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Path compression: point every node on the path directly at the root
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first: Hashable, second: Hashable) -> Hashable:
+        """Merges the sets containing `first` and `second` and returns the new representative."""
+        first_root = self.find(first)
+        second_root = self.find(second)
+        if first_root == second_root:
+            return first_root
+        # Union by rank: attach the shallower tree under the deeper one
+        if self.rank[first_root] < self.rank[second_root]:
+            first_root, second_root = second_root, first_root
+        self.parent[second_root] = first_root
+        if self.rank[first_root] == self.rank[second_root]:
+            self.rank[first_root] += 1
+        return first_root
+
+    def connected(self, first: Hashable, second: Hashable) -> bool:
+        return self.find(first) == self.find(second)
+
+    def groups(self) -> Dict[Hashable, List[Hashable]]:
+        """Returns every set as {representative: members}."""
+        groups: Dict[Hashable, List[Hashable]] = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return groups
@@ -1,10 +1,12 @@
+import asyncio
 import logging
 
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List, Optional
 from .models import UserNode, GraphRule, Link, Cluster
 from .services.user_service import (
@@ -12,12 +14,23 @@ from .services.user_service import (
     read_user_service,
     update_user_service,
     delete_user_service,
+    get_user_neighborhood_service,
+    NEIGHBORHOOD_MAX_DEPTH,
+    NEIGHBORHOOD_MAX_PER_LEVEL,
+    NEIGHBORHOOD_MAX_NODES,
+    NEIGHBORHOOD_MAX_DEGREE,
 )
 from .services.link_service import (
     create_link_service,
+    bulk_upsert_links_service,
     read_link_service,
     delete_link_service,
+    generate_links_service,
+    get_all_links_service,
+    get_links_by_cluster_service,
 )
+from .services.export_service import export_subgraph_service
+from .services.entity_service import get_shared_entities_service, record_transaction_entities_service, ENTITY_MAX_DEGREE, ENTITY_MAX_USERS
 from .services.graph_rule_service import (
     create_graph_rule_service,
     read_graph_rule_service,
@@ -26,12 +39,26 @@ from .services.graph_rule_service import (
 )
 from .services.transaction_service import (
     analyze_transaction_service,
+    analyze_transactions_batch_service,
 )
 from .services.cluster_service import (
     cluster_nodes_service,
     get_all_clusters_service,
     get_cluster_by_id_service,
 )
+from .services.community_service import (
+    start_community_job_service,
+    get_community_job_service,
+)
+from .services.snapshot_service import (
+    write_graph_snapshot_service,
+    run_periodic_snapshots,
+    resolve_worker_role,
+    run_shared_graph,
+)
+from .services.contact_service import run_periodic_contact_refresh
+from common.config import GRAPH_SNAPSHOT_INTERVAL, GRAPH_CONTACT_REFRESH_INTERVAL, GRAPH_WORKER_ROLE, GRAPH_SYNC_INTERVAL
+from . import services
 from .services import initialize_graph_db
 
 app = FastAPI()
@@ -42,6 +69,24 @@ async def startup_event():
     Initializes the graph and database connection on startup.
     """
     await initialize_graph_db()
+    app.state.worker_role = resolve_worker_role(GRAPH_WORKER_ROLE)
+    if app.state.worker_role != "standalone":
+        # One writer publishes snapshots; every worker maps them and tails the changelog
+        app.state.shared_graph_task = asyncio.create_task(run_shared_graph(app.state.worker_role, GRAPH_SYNC_INTERVAL))
+    elif services.graph_changelog.enabled and GRAPH_SNAPSHOT_INTERVAL > 0:
+        app.state.snapshot_task = asyncio.create_task(run_periodic_snapshots(GRAPH_SNAPSHOT_INTERVAL))
+    if GRAPH_CONTACT_REFRESH_INTERVAL > 0:
+        app.state.contact_task = asyncio.create_task(run_periodic_contact_refresh(GRAPH_CONTACT_REFRESH_INTERVAL))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Stops the periodic graph snapshot writer, shared-graph sync and contact probability job.
+    """
+    for name in ("snapshot_task", "shared_graph_task", "contact_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
 
 # CRUD operations for User Nodes
 @app.post("/users/", response_model=Dict[str, Any])
@@ -49,9 +94,8 @@ async def create_user(user: UserNode):
     """
     Creates a new user node in the graph and MongoDB.
     """
-    global db
     try:
-        return await create_user_service(user, db)
+        return await create_user_service(user, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -63,24 +107,58 @@ async def read_user(user_id: str):
     """
     Reads a user node by ID from MongoDB.
     """
-    global db
     try:
-        return await read_user_service(user_id, db)
+        return await read_user_service(user_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
         logger.exception(f"Error in read_user_service: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/users/{user_id}/neighborhood", response_model=Dict[str, Any])
+async def get_user_neighborhood(
+    user_id: str,
+    depth: int = Query(2, ge=1, le=NEIGHBORHOOD_MAX_DEPTH),
+    max_per_level: int = Query(NEIGHBORHOOD_MAX_PER_LEVEL, ge=1, le=NEIGHBORHOOD_MAX_PER_LEVEL),
+    max_nodes: int = Query(NEIGHBORHOOD_MAX_NODES, ge=1, le=NEIGHBORHOOD_MAX_NODES),
+    max_degree: int = Query(NEIGHBORHOOD_MAX_DEGREE, ge=1),
+    stop_at_fraud: bool = False,
+):
+    """
+    Returns the users within `depth` hops with their hop distance, using a bounded BFS.
+    """
+    try:
+        return await get_user_neighborhood_service(user_id, depth, max_per_level, max_nodes, max_degree, stop_at_fraud)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error in get_user_neighborhood_service: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/users/{user_id}/shared_entities", response_model=Dict[str, Any])
+async def get_shared_entities(
+    user_id: str,
+    max_degree: int = Query(ENTITY_MAX_DEGREE, ge=1),
+    limit: int = Query(ENTITY_MAX_USERS, ge=1, le=ENTITY_MAX_USERS),
+):
+    """
+    Returns the phones, cards, devices, ship zips and addresses a user is connected to and the users sharing them.
+    """
+    try:
+        return await get_shared_entities_service(user_id, max_degree, limit)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.exception(f"Error in get_shared_entities_service: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.put("/users/{user_id}", response_model=Dict[str, Any])
 async def update_user(user_id: str, user: UserNode):
     """
     Updates a user node by ID in MongoDB.
     """
-    global db
     try:
-        user_data = user.model_dump(exclude={"id"})
-        return await update_user_service(user_id, user_data, db)
+        return await update_user_service(user_id, user, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -92,9 +170,8 @@ async def delete_user(user_id: str):
     """
     Deletes a user node by ID from MongoDB and the graph.
     """
-    global db
     try:
-        return await delete_user_service(user_id, db)
+        return await delete_user_service(user_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -106,9 +183,21 @@ async def create_link(link: Link):
     """
     Creates a new link in the graph and MongoDB.
     """
-    global db
     try:
-        return await create_link_service(link, db)
+        return await create_link_service(link, services.db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/links/bulk", response_model=Dict[str, Any])
+async def bulk_upsert_links(links: List[Link]):
+    """
+    Creates or updates many links at once; a link between the same users in
+    either direction is updated in place.
+    """
+    try:
+        return await bulk_upsert_links_service(links, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -117,11 +206,10 @@ async def create_link(link: Link):
 @app.get("/links/{source_id}/{target_id}", response_model=Dict[str, Any])
 async def read_link(source_id: str, target_id: str):
     """
-    Reads a link by source and target ID from MongoDB.
+    Reads a link by source and target ID from MongoDB, in either direction.
     """
-    global db
     try:
-        return await read_link_service(source_id, target_id, db)
+        return await read_link_service(source_id, target_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -132,9 +220,8 @@ async def delete_link(source_id: str, target_id: str):
     """
     Deletes a link by source and target ID from MongoDB and the graph.
     """
-    global db
     try:
-        return await delete_link_service(source_id, target_id, db)
+        return await delete_link_service(source_id, target_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -158,9 +245,8 @@ async def create_graph_rule(rule: GraphRule):
     """
     Creates a new graph rule in MongoDB.
     """
-    global db
     try:
-        return await create_graph_rule_service(rule, db)
+        return await create_graph_rule_service(rule, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -171,9 +257,8 @@ async def read_graph_rule(rule_id: str):
     """
     Reads a graph rule by ID from MongoDB.
     """
-    global db
     try:
-        return await read_graph_rule_service(rule_id, db)
+        return await read_graph_rule_service(rule_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -185,8 +270,7 @@ async def update_graph_rule(rule_id: str, rule: GraphRule):
     Updates a graph rule by ID in MongoDB.
     """
     try:
-        rule_data = rule.model_dump(exclude={"id"})
-        return await update_graph_rule_service(rule_id, rule_data)
+        return await update_graph_rule_service(rule_id, rule, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -199,7 +283,7 @@ async def delete_graph_rule(rule_id: str):
     Deletes a graph rule by ID from MongoDB.
     """
     try:
-        return await delete_graph_rule_service(rule_id)
+        return await delete_graph_rule_service(rule_id, services.db)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -217,6 +301,30 @@ async def analyze_transaction(transaction_data: Dict[str, Any]) -> Dict[str, Any
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/batch")
+async def analyze_transactions_batch(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Analyzes many transactions in one request, sharing rule and user lookups across the batch.
+    """
+    try:
+        return await analyze_transactions_batch_service(transactions)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/transactions/entities", response_model=Dict[str, Any])
+async def record_transaction_entities(transactions: List[Dict[str, Any]]):
+    """
+    Connects the users of stored transactions to their cards, ship zips and devices.
+    """
+    try:
+        return await record_transaction_entities_service(transactions)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/cluster_nodes/", response_model=Dict[str, Any])
 async def cluster_nodes():
     """
@@ -229,6 +337,44 @@ async def cluster_nodes():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cluster_nodes/communities", response_model=Dict[str, Any], status_code=202)
+async def start_community_job(method: str = "label_propagation", min_weight: float = Query(0.0, ge=0.0)):
+    """
+    Starts rebuilding the clusters from weighted communities of the link graph
+    ("label_propagation" or "louvain") as a background job; poll its progress
+    with GET /cluster_nodes/jobs/{job_id}.
+    """
+    try:
+        return await start_community_job_service(method, min_weight)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/cluster_nodes/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_community_job(job_id: str):
+    """
+    Returns the status, stage and progress of a community detection job.
+    """
+    try:
+        return await get_community_job_service(job_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/graph/snapshot", response_model=Dict[str, Any])
+async def write_graph_snapshot():
+    """
+    Writes a memory-mapped graph snapshot now instead of waiting for the periodic writer.
+    """
+    try:
+        return await write_graph_snapshot_service()
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # New endpoints for dashboard visualization
 @app.get("/clusters/", response_model=List[Cluster])
 async def get_all_clusters():
@@ -254,6 +400,52 @@ async def get_cluster_by_id(cluster_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/clusters/{cluster_id}/links", response_model=List[Link])
+async def get_links_by_cluster(cluster_id: str):
+    """
+    Retrieves the links between members of a cluster.
+    """
+    try:
+        return await get_links_by_cluster_service(cluster_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/graph/export")
+async def export_subgraph(
+    cluster_id: Optional[str] = None,
+    center: Optional[str] = None,
+    depth: int = Query(1, ge=1),
+    node_ids: Optional[str] = None,
+    format: str = "ndjson",
+    top_k: Optional[int] = Query(None, ge=1),
+    max_degree: Optional[int] = Query(None, ge=1),
+    min_weight: Optional[float] = None,
+    max_bytes: Optional[int] = Query(None, ge=1),
+):
+    """
+    Streams a sampled subgraph (a cluster, an ego network around `center`, or
+    the comma-separated `node_ids` in view) as NDJSON or Arrow for visualization.
+    """
+    try:
+        stream, media_type = await export_subgraph_service(
+            cluster_id=cluster_id,
+            center=center,
+            depth=depth,
+            node_ids=node_ids.split(",") if node_ids is not None else None,
+            output_format=format,
+            top_k=top_k,
+            max_degree=max_degree,
+            min_weight=min_weight,
+            max_bytes=max_bytes,
+        )
+        return StreamingResponse(stream, media_type=media_type)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/links/", response_model=List[Link])
 async def get_all_links(cluster_id: Optional[str] = None):
     """
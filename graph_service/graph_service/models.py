@@ -36,4 +36,11 @@ class Link(BaseModel):
 class Cluster(BaseModel):
     cluster_id: str
     members: List[str]
+    # "label_propagation" or "louvain" for community detection clusters; unset for rule-based ones
+    method: Optional[str] = None
+    # Precomputed when the cluster is written; see graph_service.algorithms.cluster_index
+    size: Optional[int] = None
+    fraud_count: Optional[int] = None
+    fraud_ratio: Optional[float] = None
+    total_link_weight: Optional[float] = None
     id: Optional[str] = Field(None, alias="_id")
\ No newline at end of file
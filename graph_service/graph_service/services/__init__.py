@@ -1,24 +1,135 @@
+import asyncio
+import logging
+import os
+import time
 from fastapi import HTTPException
 from typing import Dict, Any, List, Optional
 import networkx as nx
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from bson.objectid import ObjectId
-from common.config import MONGODB_URI, MONGODB_DB_NAME
+from common.config import MONGODB_URI, MONGODB_DB_NAME, GRAPH_BACKEND, GRAPH_SNAPSHOT_DIR, GRAPH_LOAD_BATCH_SIZE, GRAPH_CONTACT_RESTART_PROBABILITY, GRAPH_CARD_HASH_KEY
 from common.mongodb_utils import get_mongodb_client, get_mongodb_database
 from ..models import UserNode, GraphRule, Link # Import models from the same package
+from ..algorithms.cluster_index import CLUSTER_PROJECTION, CLUSTER_SNAPSHOT_ARRAYS, CLUSTER_STAT_FIELDS, RULES_METHOD, ClusterIndex
+from ..algorithms.contact_probability import FraudContactIndex
+from ..algorithms.entity_graph import ENTITY_SNAPSHOT_ARRAYS, EntityGraph, RAW_CARD_KEY_PATTERN, USER_ENTITY_FIELDS, entity_key, extract_entities
+from ..algorithms.fraud_distance import FraudDistanceIndex
+from ..snapshot import load_snapshot, load_snapshot_arrays
+from .changelog import GraphChangelog
+
+logger = logging.getLogger(__name__)
+
+# Log loader progress every this many documents
+LOAD_PROGRESS_INTERVAL = 100000
+USER_PROJECTION = {"_id": 0, "id_user": 1, "is_fraud": 1, **{paths[0]: 1 for paths in USER_ENTITY_FIELDS.values()}}
+USER_ENTITY_PROJECTION = {"_id": 0, "id_user": 1, "entity": 1}
+
+def _create_graph():
+    """
+    Returns the in-memory graph for GRAPH_BACKEND: a networkx Graph keeping
+    edge attributes, or a CompactGraph keeping only integer-indexed CSR
+    adjacency and weights. Node attributes are read from MongoDB on demand.
+    """
+    if GRAPH_BACKEND == "compact":
+        from ..algorithms.csr import CompactGraph
+        return CompactGraph()
+    return nx.Graph()
 
 # Global graph and database objects
-graph = nx.Graph()
+graph = _create_graph()
 db = None
+# IDs of users flagged is_fraud, kept in sync by the user services
+fraud_user_ids = set()
+# Distance from every node to its nearest fraudster, maintained alongside the graph
+fraud_distance = FraudDistanceIndex()
+# Random-walk probability of reaching a fraudster, recomputed by a background job
+contact_probability = FraudContactIndex(restart=GRAPH_CONTACT_RESTART_PROBABILITY)
+# Member-to-cluster index with each cluster's precomputed fraud density
+cluster_index = ClusterIndex()
+# Users connected to the phones, cards, devices and addresses they share
+entity_graph = EntityGraph()
+# Log of graph mutations replayed on top of snapshots; only needed when snapshots are enabled
+graph_changelog = GraphChangelog()
+graph_changelog.enabled = bool(GRAPH_SNAPSHOT_DIR) and GRAPH_BACKEND == "compact"
 
 import sys
 
+def _fetch_documents(collection, projection: Dict[str, int], label: str) -> List[Dict[str, Any]]:
+    """Reads a whole collection with a projection and a large cursor batch, logging progress."""
+    documents = []
+    started = time.perf_counter()
+    for document in collection.find({}, projection, batch_size=GRAPH_LOAD_BATCH_SIZE):
+        documents.append(document)
+        if len(documents) % LOAD_PROGRESS_INTERVAL == 0:
+            logger.info(f"Loading {label}: {len(documents)} documents ({time.perf_counter() - started:.1f}s)")
+    logger.info(f"Fetched {len(documents)} {label} in {time.perf_counter() - started:.2f}s")
+    return documents
+
+def _ensure_link_keys(db) -> None:
+    """
+    Backfills the canonical node_a/node_b key on links written before it existed
+    and enforces one link per user pair, whichever direction it was created in.
+    """
+    backfilled = 0
+    for link in db.links.find({"node_a": {"$exists": False}}, {"source": 1, "target": 1}):
+        node_a, node_b = sorted((link['source'], link['target']))
+        db.links.update_one({"_id": link['_id']}, {"$set": {"node_a": node_a, "node_b": node_b}})
+        backfilled += 1
+    if backfilled:
+        logger.info(f"Backfilled canonical keys on {backfilled} links")
+    try:
+        db.links.create_index([("node_a", 1), ("node_b", 1)], unique=True, name="link_pair_unique")
+    except PyMongoError as e:
+        # Pairs linked in both directions must be merged by hand before the index can be built
+        logger.warning(f"Could not create unique link index: {e}")
+
+def _ensure_entity_index(db) -> None:
+    try:
+        db.user_entities.create_index([("id_user", 1), ("entity", 1)], unique=True, name="user_entity_unique")
+    except PyMongoError as e:
+        logger.warning(f"Could not create unique user entity index: {e}")
+
+def _hash_card_entities(db) -> None:
+    """Replaces card numbers recorded before card entities were hashed with their hashed keys."""
+    hashed = 0
+    for pair in db.user_entities.find({"entity": {"$regex": RAW_CARD_KEY_PATTERN}}, {"id_user": 1, "entity": 1}):
+        key = entity_key("card", pair['entity'].split(":", 1)[1])
+        db.user_entities.update_one({"id_user": pair['id_user'], "entity": key}, {"$setOnInsert": {"id_user": pair['id_user'], "entity": key}}, upsert=True)
+        db.user_entities.delete_one({"_id": pair['_id']})
+        hashed += 1
+    if hashed:
+        logger.info(f"Hashed {hashed} stored card numbers")
+
+def _load_entity_graph(users: List[Dict[str, Any]], user_entities: List[Dict[str, Any]]) -> None:
+    """Connects users to the entities of their documents and to those recorded from transactions."""
+    entity_graph.clear()
+    for user in users:
+        entity_graph.add(user['id_user'], extract_entities(user, USER_ENTITY_FIELDS))
+    for pair in user_entities:
+        entity_graph.add(pair['id_user'], [pair['entity']])
+    logger.info(f"Connected {len(entity_graph.entities_of)} users to {len(entity_graph.users_of)} entities")
+
+def _load_cluster_index(db, clusters: List[Dict[str, Any]]) -> None:
+    """
+    Fills the member-to-cluster index from the cluster documents, computing
+    and storing the stats of clusters written before they were precomputed.
+    """
+    methods = {cluster.get('method', RULES_METHOD) for cluster in clusters}
+    backfilled = cluster_index.load(clusters, graph, fraud_user_ids)
+    if len(methods) > 1:
+        logger.warning(f"Clusters were built by {sorted(methods)}; treating them as {cluster_index.method} until the next full rebuild")
+    for cluster in backfilled:
+        db.clusters.update_one({"_id": cluster['_id']}, {"$set": {field: cluster[field] for field in CLUSTER_STAT_FIELDS}})
+    if backfilled:
+        logger.info(f"Computed stats for {len(backfilled)} clusters")
+
 async def initialize_graph_db(db_instance=None):
     """
     Initializes the graph and database connection on startup.
     Accepts an optional db_instance for testing.
     """
-    global graph, db
+    global db
     if db_instance:
         db = db_instance
     elif os.environ.get("TESTING") == "True":
@@ -34,28 +145,87 @@ async def initialize_graph_db(db_instance=None):
         if db is None:
             raise HTTPException(status_code=500, detail="Failed to get MongoDB database")
 
-    graph = nx.Graph()
-
-    # Load nodes from MongoDB
-    if db and 'users' in db.list_collection_names():
-        for node_data in db.users.find():
-            node_id = node_data['id_user']
-            graph.add_node(node_id, **node_data)
-
-    # Load edges from MongoDB
-    if db and 'links' in db.list_collection_names():
-        for link_data in db.links.find():
-            source = link_data['source']
-            target = link_data['target']
-            weight = link_data['weight']
-            graph.add_edge(source, target, weight=weight, type=link_data['type'], reasons=link_data.get('reasons', []), rule_ids=link_data.get('rule_ids', []))
-
-    # Load cluster data from MongoDB
-    if db and 'clusters' in db.list_collection_names():
-        for cluster_data in db.clusters.find():
-            cluster_id = str(cluster_data['_id'])
-            members = cluster_data['members']
-            # Store cluster information in graph nodes or a separate structure
-            for member_id in members:
-                if member_id in graph:
-                    graph.nodes[member_id]['cluster_id'] = cluster_id
\ No newline at end of file
+    if db is not None:
+        _ensure_link_keys(db)
+        _ensure_entity_index(db)
+        _hash_card_entities(db)
+    if not GRAPH_CARD_HASH_KEY:
+        logger.warning("GRAPH_CARD_HASH_KEY is not set; stored card entity keys can be reversed by enumeration")
+
+    # Clear in place: service modules hold references to these objects
+    graph.clear()
+    fraud_user_ids.clear()
+    cluster_index.clear()
+    entity_graph.clear()
+    clusters = users = user_entities = None
+    # Derived indexes stored with the snapshot, if it has them
+    cluster_arrays = entity_arrays = None
+
+    compact = GRAPH_BACKEND == "compact"
+    started = time.perf_counter()
+
+    # Map the latest snapshot if there is one; otherwise stream the graph from MongoDB
+    snapshot = load_snapshot(GRAPH_SNAPSHOT_DIR) if graph_changelog.enabled else None
+    if snapshot is not None:
+        ids, indptr, indices, weights, graph_changelog.applied_seq = snapshot
+        graph_changelog.snapshot_seq = graph_changelog.applied_seq
+        graph.load_arrays(ids, indptr, indices, weights)
+        logger.info(f"Mapped graph snapshot with {len(ids)} nodes in {time.perf_counter() - started:.2f}s")
+        if db is not None:
+            fraud_user_ids.update(user['id_user'] for user in db.users.find({"is_fraud": True}, {"id_user": 1, "_id": 0}))
+        cluster_arrays = load_snapshot_arrays(GRAPH_SNAPSHOT_DIR, graph_changelog.applied_seq, CLUSTER_SNAPSHOT_ARRAYS)
+        entity_arrays = load_snapshot_arrays(GRAPH_SNAPSHOT_DIR, graph_changelog.applied_seq, ENTITY_SNAPSHOT_ARRAYS)
+    elif db is not None:
+        # Read the high-water mark first: changes made while streaming are replayed again, harmlessly
+        graph_changelog.applied_seq = graph_changelog.current_seq(db) if graph_changelog.enabled else 0
+        graph_changelog.snapshot_seq = 0
+
+        # Only fetch what the graph keeps: node attributes live in MongoDB, and
+        # the compact backend keeps nothing but the edge weight
+        link_projection = {"_id": 0, "source": 1, "target": 1, "weight": 1}
+        if not compact:
+            link_projection.update({"type": 1, "reasons": 1, "rule_ids": 1})
+        users, links, clusters, user_entities = await asyncio.gather(
+            asyncio.to_thread(_fetch_documents, db.users, USER_PROJECTION, "users"),
+            asyncio.to_thread(_fetch_documents, db.links, link_projection, "links"),
+            asyncio.to_thread(_fetch_documents, db.clusters, CLUSTER_PROJECTION, "clusters"),
+            asyncio.to_thread(_fetch_documents, db.user_entities, USER_ENTITY_PROJECTION, "user entities"),
+        )
+        fetched = time.perf_counter()
+
+        node_ids = [user['id_user'] for user in users]
+        fraud_user_ids.update(user['id_user'] for user in users if user.get('is_fraud'))
+        if compact:
+            graph.load_edges(node_ids, ((link['source'], link['target'], link['weight']) for link in links))
+        else:
+            graph.add_nodes_from(node_ids)
+            graph.add_edges_from(
+                (link['source'], link['target'], {"weight": link['weight'], "type": link['type'], "reasons": link.get('reasons', []), "rule_ids": link.get('rule_ids', [])})
+                for link in links
+            )
+        logger.info(f"Built graph with {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges in {time.perf_counter() - fetched:.2f}s")
+
+    indexed = time.perf_counter()
+    if cluster_arrays is not None:
+        cluster_index.load_arrays(ids, cluster_arrays)
+    elif db is not None:
+        # Snapshots written before they stored the indexes fall back to scanning the collections
+        _load_cluster_index(db, clusters if clusters is not None else _fetch_documents(db.clusters, CLUSTER_PROJECTION, "clusters"))
+    if entity_arrays is not None:
+        entity_graph.load_arrays(ids, entity_arrays)
+    elif db is not None:
+        if users is None:
+            users = _fetch_documents(db.users, USER_PROJECTION, "users")
+            user_entities = _fetch_documents(db.user_entities, USER_ENTITY_PROJECTION, "user entities")
+        _load_entity_graph(users, user_entities)
+
+    # Catch up with everything written since the snapshot (or since streaming started)
+    if db is not None and graph_changelog.enabled:
+        graph_changelog.replay(db, graph, fraud_user_ids, cluster_index=cluster_index, entity_graph=entity_graph)
+    fraud_distance.rebuild(graph, fraud_user_ids)
+    contact_probability.mark_changed()
+    logger.info(f"Indexed distance to {len(fraud_user_ids)} fraudsters, {len(cluster_index.stats)} clusters and {len(entity_graph.users_of)} entities in {time.perf_counter() - indexed:.2f}s; graph ready in {time.perf_counter() - started:.2f}s")
+
+    # Clustering state belongs to the previous database; rebuild it on the next insert
+    from .cluster_service import cluster_engine
+    cluster_engine.invalidate()
@@ -0,0 +1,137 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from ..algorithms.cluster_index import CLUSTER_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+CHANGELOG_COUNTER_ID = "graph_changelog"
+
+
+class GraphChangelog:
+    """
+    Append-only log of graph mutations in the `graph_changelog` collection,
+    ordered by a `seq` allocated from the `counters` collection.
+
+    Snapshots record the last `seq` they contain; on boot the service maps the
+    snapshot and replays only the entries after it. Every entry sets state
+    (node present/absent, edge present with a weight/absent, fraud flag,
+    cluster members and stats, entities connected to a user), so replaying
+    an entry that is already reflected in the graph is harmless. Full cluster
+    rebuilds log a single "load_clusters" entry instead of every cluster.
+
+    A writer reserves its seqs before inserting the entries, so a reader can
+    see seq n + 1 before seq n exists. Replay stops at the first missing seq
+    and waits for it; only a gap still open after `gap_timeout` seconds (a
+    writer that died between reserving and inserting) is skipped.
+    """
+
+    def __init__(self, gap_timeout: float = 30.0):
+        self.enabled = False
+        self.applied_seq = 0
+        # Seq of the snapshot the graph was last mapped from or published as
+        self.snapshot_seq = 0
+        self.gap_timeout = gap_timeout
+        # applied_seq at which replay is waiting for a missing seq, and since when
+        self._gap_after: Optional[int] = None
+        self._gap_since = 0.0
+
+    def current_seq(self, db) -> int:
+        counter = db.counters.find_one({"_id": CHANGELOG_COUNTER_ID})
+        return counter['seq'] if counter else 0
+
+    def record(self, db, changes: List[Dict[str, Any]]) -> None:
+        """Appends `changes` (dicts with an "op" and its operands) to the log."""
+        if not self.enabled or not changes:
+            return
+        counter = db.counters.find_one_and_update(
+            {"_id": CHANGELOG_COUNTER_ID},
+            {"$inc": {"seq": len(changes)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        first_seq = counter['seq'] - len(changes) + 1
+        db.graph_changelog.insert_many([dict(change, seq=first_seq + offset) for offset, change in enumerate(changes)])
+
+    def replay(self, db, graph, fraud_user_ids: set, fraud_distance=None, cluster_index=None, entity_graph=None) -> int:
+        """
+        Applies the consecutive entries after `applied_seq` to the graph and
+        returns how many were applied. A FraudDistanceIndex passed as
+        `fraud_distance` is updated change by change instead of being rebuilt;
+        cluster and entity entries are only applied if a `cluster_index` or
+        an `entity_graph` is passed.
+        """
+        applied = 0
+        for change in db.graph_changelog.find({"seq": {"$gt": self.applied_seq}}, {"_id": 0}).sort("seq", 1):
+            if change['seq'] > self.applied_seq + 1 and not self._skip_gap(change['seq']):
+                break
+            apply_change(graph, fraud_user_ids, change, fraud_distance, cluster_index, entity_graph, db)
+            self.applied_seq = change['seq']
+            applied += 1
+        if applied:
+            logger.info(f"Replayed {applied} graph changes up to seq {self.applied_seq}")
+        return applied
+
+    def _skip_gap(self, next_seq: int) -> bool:
+        """Whether to give up on the seqs between `applied_seq` and `next_seq`, which were reserved but never written."""
+        now = time.monotonic()
+        if self._gap_after != self.applied_seq:
+            self._gap_after, self._gap_since = self.applied_seq, now
+            return False
+        if now - self._gap_since < self.gap_timeout:
+            return False
+        logger.warning(f"Skipping graph changelog seqs {self.applied_seq + 1}-{next_seq - 1}, missing for {now - self._gap_since:.0f}s")
+        self._gap_after = None
+        return True
+
+    def truncate(self, db, up_to_seq: int) -> None:
+        """Drops entries no snapshot still needs."""
+        db.graph_changelog.delete_many({"seq": {"$lte": up_to_seq}})
+
+
+def apply_change(graph, fraud_user_ids: set, change: Dict[str, Any], fraud_distance=None, cluster_index=None, entity_graph=None, db=None) -> None:
+    """Applies one changelog entry, keeping `fraud_distance` (if given) up to date incrementally."""
+    op = change['op']
+    if op == "add_node":
+        graph.add_node(change['node'])
+    elif op == "remove_node":
+        node = change['node']
+        neighbors = list(graph.neighbors(node)) if node in graph else []
+        if node in graph:
+            graph.remove_node(node)
+        fraud_user_ids.discard(node)
+        if fraud_distance is not None:
+            fraud_distance.remove_node(graph, node, neighbors)
+        if entity_graph is not None:
+            entity_graph.apply(change)
+    elif op == "add_edge":
+        graph.add_edge(change['source'], change['target'], weight=change.get('weight', 1.0))
+        if fraud_distance is not None:
+            fraud_distance.add_edge(graph, change['source'], change['target'])
+    elif op == "remove_edge":
+        if graph.has_edge(change['source'], change['target']):
+            graph.remove_edge(change['source'], change['target'])
+            if fraud_distance is not None:
+                fraud_distance.remove_edge(graph, change['source'], change['target'])
+    elif op == "set_fraud":
+        node = change['node']
+        if change['is_fraud'] and node not in fraud_user_ids:
+            fraud_user_ids.add(node)
+            if fraud_distance is not None:
+                fraud_distance.add_seed(graph, node)
+        elif not change['is_fraud'] and node in fraud_user_ids:
+            fraud_user_ids.discard(node)
+            if fraud_distance is not None:
+                fraud_distance.remove_seed(graph, node)
+    elif op in ("set_cluster", "remove_cluster"):
+        if cluster_index is not None:
+            cluster_index.apply(change)
+    elif op == "load_clusters":
+        if cluster_index is not None and db is not None:
+            cluster_index.load(db.clusters.find({}, CLUSTER_PROJECTION), graph, fraud_user_ids)
+    elif op in ("add_entities", "set_entities"):
+        if entity_graph is not None:
+            entity_graph.apply(change)
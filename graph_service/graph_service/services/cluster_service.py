@@ -1,84 +1,554 @@
-from typing import List, Dict, Any
+import logging
+import math
+from fastapi import HTTPException
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from bson.objectid import ObjectId
+import numpy as np
 
-from ..services import db, graph
-from .graph_rule_service import apply_graph_rule
+from common.config import GRAPH_BLOCKING_MAX_BUCKET_SIZE
+from .. import services
+from ..services import graph, fraud_user_ids, cluster_index, graph_changelog
+from ..algorithms.blocking import BlockingIndex
+from ..algorithms.cluster_index import RULES_METHOD, cluster_stats
+from ..algorithms.compiled_rules import AttributeColumns, CompiledRule
+from ..algorithms.union_find import DisjointSet
+
+logger = logging.getLogger(__name__)
+
+def _matching_pairs(columns: AttributeColumns, rule: CompiledRule, max_bucket_size: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (i, j) row pairs, i < j, for which rule(users[i], users[j]) holds,
+    evaluated on precomputed columns. The pairs are not exhaustive but connect
+    exactly the rows all matching pairs connect, which is all union-find needs:
+    - "equal" rules match whole blocking buckets (the normalized values are the
+      keys), so each bucket is joined through its first left-hand row and its
+      last right-hand row;
+    - fixed-value rules only depend on users[i], so the first matching row is
+      paired with every later row, which yields the same clusters in O(n);
+    - rules with neither field2 nor value can never match;
+    - other operators compare each row with all later rows, vectorized for
+      numeric comparisons.
+    """
+    if not rule.pairwise:
+        if rule.value is None:
+            return
+        mask = rule.value_mask(columns)
+        if mask.any():
+            first_match = int(mask.argmax())
+            for j in range(first_match + 1, len(columns)):
+                yield first_match, j
+        return
+
+    if rule.operator == "equal":
+        left_index = BlockingIndex(max_bucket_size)
+        right_index = BlockingIndex(max_bucket_size)
+        for i, (left, right) in enumerate(zip(columns.text(rule.field1), columns.text(rule.field2))):
+            left_index.add(i, left)
+            right_index.add(i, right)
+        skipped = left_index.oversized_keys() | right_index.oversized_keys()
+        if skipped:
+            logger.info(f"Rule {rule.rule.get('name')}: skipping {len(skipped)} oversized blocking buckets")
+        for key, left_members in left_index.buckets():
+            right_members = right_index.bucket(key)
+            if key in skipped or not right_members:
+                continue
+            # Bucket members are in row order
+            first, last = left_members[0], right_members[-1]
+            if first >= last:
+                continue
+            for j in right_members:
+                if j > first:
+                    yield first, j
+            for i in left_members:
+                if first < i < last:
+                    yield i, last
+        return
+
+    for i in range(len(columns)):
+        for j in rule.later_matches(columns, i):
+            yield i, int(j)
+
+def _union_matches(clusters: DisjointSet, columns: AttributeColumns, rules: List[CompiledRule], max_bucket_size: Optional[int] = None) -> None:
+    for rule in rules:
+        for i, j in _matching_pairs(columns, rule, max_bucket_size):
+            clusters.union(columns.users[i]['id_user'], columns.users[j]['id_user'])
+
+def cluster_users(users: List[Dict[str, Any]], graph_rules: List[Dict[str, Any]], max_bucket_size: Optional[int] = None) -> DisjointSet:
+    """
+    Groups users into the transitive closure of the graph rules using union-find.
+    Attributes are normalized once into columns and the rules are compiled
+    against them, so no pair needs per-comparison string or float conversions.
+    """
+    clusters = DisjointSet(user['id_user'] for user in users)
+    _union_matches(clusters, AttributeColumns(users), [CompiledRule(rule) for rule in graph_rules], max_bucket_size)
+    return clusters
+
+def _rules_signature(graph_rules: List[Dict[str, Any]]) -> Tuple:
+    return tuple((str(rule.get('_id')), rule.get('field1'), rule.get('field2'), rule.get('operator'), rule.get('value')) for rule in graph_rules)
+
+class ClusterEngine:
+    """
+    Keeps the clustering state between calls so a new user can be clustered
+    without re-running the full pass: the union-find sets, the members of each
+    set, the normalized attribute columns and compiled rules, blocking indexes
+    for two-field "equal" rules and the first matching row of every
+    fixed-value rule.
+
+    The state is only valid for the rules it was built from; rule changes are
+    detected by comparing signatures and fall back to a full rebuild. User
+    updates and deletes are applied in place by update() and remove().
+    """
+
+    def __init__(self, max_bucket_size: Optional[int] = None):
+        self.max_bucket_size = max_bucket_size
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self.stale = True
+        self.rules: List[CompiledRule] = []
+        self.rules_signature: Tuple = ()
+        self.columns = AttributeColumns([])
+        self.rows: Dict[str, int] = {}
+        # Rows of deleted users, kept (with no attributes) so row numbers stay stable
+        self.removed_rows = 0
+        self.clusters = DisjointSet()
+        self.members: Dict[str, List[str]] = {}
+        self.indexes: Dict[int, Tuple[BlockingIndex, BlockingIndex]] = {}
+        self.first_match: Dict[int, Optional[int]] = {}
+
+    def is_current(self, graph_rules: List[Dict[str, Any]]) -> bool:
+        return not self.stale and self.rules_signature == _rules_signature(graph_rules)
+
+    def rebuild(self, users: List[Dict[str, Any]], graph_rules: List[Dict[str, Any]]) -> DisjointSet:
+        """Runs the full clustering pass and keeps its state for incremental inserts."""
+        self.invalidate()
+        self.rules = [CompiledRule(rule) for rule in graph_rules]
+        self.rules_signature = _rules_signature(graph_rules)
+        self.columns = AttributeColumns(users)
+        self.rows = {user['id_user']: row for row, user in enumerate(users)}
+        self.clusters = DisjointSet(user['id_user'] for user in users)
+        _union_matches(self.clusters, self.columns, self.rules, self.max_bucket_size)
+        self.members = self.clusters.groups()
+        for k, rule in enumerate(self.rules):
+            if rule.pairwise and rule.operator == "equal":
+                left_index = BlockingIndex(self.max_bucket_size)
+                right_index = BlockingIndex(self.max_bucket_size)
+                for user, left, right in zip(users, self.columns.text(rule.field1), self.columns.text(rule.field2)):
+                    left_index.add(user['id_user'], left)
+                    right_index.add(user['id_user'], right)
+                self.indexes[k] = (left_index, right_index)
+            elif not rule.pairwise and rule.value is not None:
+                mask = rule.value_mask(self.columns)
+                self.first_match[k] = int(mask.argmax()) if mask.any() else None
+        self.stale = False
+        return self.clusters
+
+    def _candidates(self, k: int, rule: CompiledRule, row: int) -> List[str]:
+        """IDs of the existing users the rule matches with the new user in `row`."""
+        user_id = self.columns.users[row]['id_user']
+        if not rule.pairwise:
+            if rule.value is None:
+                return []
+            first = self.first_match.get(k)
+            if first is None:
+                # The new user is appended last, so it can only ever be the first match itself
+                if rule.match(self.columns, row, row):
+                    self.first_match[k] = row
+                return []
+            return [self.columns.users[first]['id_user']]
+        if k in self.indexes:
+            left_index, right_index = self.indexes[k]
+            # Existing users are always the left-hand side of the rule
+            candidates = left_index.bucket(self.columns.text(rule.field2)[row])
+            key = right_index.add(user_id, self.columns.text(rule.field2)[row])
+            if key is not None and right_index.is_oversized(key):
+                candidates = []
+            left_index.add(user_id, self.columns.text(rule.field1)[row])
+            return [candidate_id for candidate_id in candidates if candidate_id != user_id]
+        return [self.columns.users[i]['id_user'] for i in rule.earlier_matches(self.columns, row)]
+
+    def add(self, user: Dict[str, Any]) -> Tuple[List[str], List[List[str]]]:
+        """
+        Clusters a newly inserted user against the existing ones.
+        Returns the members of the user's set and the member lists of the
+        existing sets that were merged into it.
+        """
+        user_id = user['id_user']
+        row = self.columns.append(user)
+        self.rows[user_id] = row
+        self.clusters.add(user_id)
+        self.members[user_id] = [user_id]
+        merged = self._merge(user_id, [candidate_id for k, rule in enumerate(self.rules) for candidate_id in self._candidates(k, rule, row)])
+        return self.members[self.clusters.find(user_id)], merged
+
+    def _merge(self, user_id: str, candidate_ids: Iterable[str]) -> List[List[str]]:
+        """Unions the user's set with the candidates' sets and returns the member lists it absorbed."""
+        merged = []
+        for candidate_id in candidate_ids:
+            candidate_root = self.clusters.find(candidate_id)
+            user_root = self.clusters.find(user_id)
+            if candidate_root == user_root:
+                continue
+            merged.append(list(self.members[candidate_root]))
+            root = self.clusters.union(candidate_root, user_root)
+            absorbed = user_root if root == candidate_root else candidate_root
+            self.members[root].extend(self.members.pop(absorbed))
+        return merged
+
+    def _rule_values(self, row: int) -> List[Tuple]:
+        values = []
+        for rule in self.rules:
+            for field in (rule.field1, rule.field2):
+                if field:
+                    number = float(self.columns.number(field)[row])
+                    values.append((self.columns.text(field)[row], None if math.isnan(number) else number))
+        return values
+
+    def _row_ids(self, rows: Iterable[int]) -> List[str]:
+        """IDs of the users in `rows`, skipping the rows of removed users."""
+        ids = []
+        for row in rows:
+            user_id = self.columns.users[row]['id_user']
+            if self.rows.get(user_id) == row:
+                ids.append(user_id)
+        return ids
+
+    def _groups(self, members: Iterable[str]) -> List[List[str]]:
+        roots = dict.fromkeys(self.clusters.find(member) for member in members)
+        return [self.members[root] for root in roots]
+
+    def _detach(self, user_id: str, row: int) -> List[str]:
+        """
+        Takes the user out of the blocking indexes and out of its set, which is
+        re-clustered on its own, and returns the set's former members. Taking
+        a user out can only split its set, so no other set is affected.
+        """
+        for k, (left_index, right_index) in self.indexes.items():
+            rule = self.rules[k]
+            left_index.remove(user_id, self.columns.text(rule.field1)[row])
+            right_index.remove(user_id, self.columns.text(rule.field2)[row])
+        members = self.members.pop(self.clusters.find(user_id))
+        self.clusters.reset(members)
+        rest = sorted((member for member in members if member != user_id), key=self.rows.__getitem__)
+        _union_matches(self.clusters, AttributeColumns([self.columns.users[self.rows[member]] for member in rest]), self.rules, self.max_bucket_size)
+        groups: Dict[str, List[str]] = {}
+        for member in members:
+            groups.setdefault(self.clusters.find(member), []).append(member)
+        self.members.update(groups)
+        return members
+
+    def _update_candidates(self, k: int, rule: CompiledRule, row: int, former_members: List[str]) -> List[str]:
+        """IDs of the users the rule matches with the updated user in `row`, in either position."""
+        user_id = self.columns.users[row]['id_user']
+        if not rule.pairwise:
+            if rule.value is None:
+                return []
+            # The first matching row is paired with every later row
+            first = self.first_match[k]
+            matches = rule.match(self.columns, row, row)
+            if first == row and not matches:
+                mask = rule.value_mask(self.columns)
+                self.first_match[k] = int(mask.argmax()) if mask.any() else None
+            elif matches and (first is None or row < first):
+                self.first_match[k] = row
+            new_first = self.first_match[k]
+            if new_first is None or new_first > row:
+                return []
+            if new_first < row:
+                return [self.columns.users[new_first]['id_user']]
+            if first == row:
+                # Every later row was in the user's former set
+                return [member for member in former_members if self.rows[member] > row]
+            # The user now precedes the previous first match
+            return self._row_ids(range(row + 1, first + 1 if first is not None else len(self.columns)))
+        if k in self.indexes:
+            left_index, right_index = self.indexes[k]
+            left_key = left_index.add(user_id, self.columns.text(rule.field1)[row])
+            right_key = right_index.add(user_id, self.columns.text(rule.field2)[row])
+            # rule(users[i], users[j]) is only evaluated for rows i < j
+            earlier = [] if right_key is None or right_index.is_oversized(right_key) else left_index.bucket(right_key)
+            later = [] if left_key is None or left_index.is_oversized(left_key) else right_index.bucket(left_key)
+            return [candidate_id for candidate_id in earlier if self.rows[candidate_id] < row] + [candidate_id for candidate_id in later if self.rows[candidate_id] > row]
+        return [self.columns.users[i]['id_user'] for i in np.concatenate((rule.earlier_matches(self.columns, row), rule.later_matches(self.columns, row)))]
+
+    def update(self, user: Dict[str, Any]) -> Tuple[List[str], List[List[str]]]:
+        """
+        Re-clusters a user whose attributes changed. The user keeps its row,
+        so the pair order asymmetric rules depend on matches a full rebuild.
+        Returns the members of every set involved before the update and the
+        sets they form now; both are empty if no rule field changed.
+        """
+        user_id = user['id_user']
+        row = self.rows.get(user_id)
+        if row is None:
+            members, merged = self.add(user)
+            return [member for group in merged for member in group] + [user_id], [members]
+        previous = self.columns.users[row]
+        before = self._rule_values(row)
+        self.columns.set(row, user)
+        if self._rule_values(row) == before:
+            return [], []
+
+        # The blocking indexes are keyed by the previous values
+        self.columns.set(row, previous)
+        former_members = self._detach(user_id, row)
+        self.columns.set(row, user)
+        candidates = [candidate_id for k, rule in enumerate(self.rules) for candidate_id in self._update_candidates(k, rule, row, former_members)]
+        merged = self._merge(user_id, candidates)
+        affected = list(dict.fromkeys(former_members + [member for group in merged for member in group]))
+        return affected, self._groups(affected)
+
+    def remove(self, user_id: str) -> Tuple[List[str], List[List[str]]]:
+        """
+        Removes a deleted user. Returns the members of its former set and the
+        sets the remaining ones form now; both are empty for unknown users.
+        """
+        row = self.rows.get(user_id)
+        if row is None:
+            return [], []
+        former_members = self._detach(user_id, row)
+        self.members.pop(user_id, None)
+        self.clusters.discard(user_id)
+        del self.rows[user_id]
+        # An empty row never matches; rebuild once they make up half the rows
+        self.columns.set(row, {"id_user": user_id})
+        for k, first in self.first_match.items():
+            if first == row:
+                mask = self.rules[k].value_mask(self.columns)
+                self.first_match[k] = int(mask.argmax()) if mask.any() else None
+        self.removed_rows += 1
+        if self.removed_rows * 2 > len(self.columns):
+            self.stale = True
+        return former_members, self._groups(member for member in former_members if member != user_id)
+
+cluster_engine = ClusterEngine(GRAPH_BLOCKING_MAX_BUCKET_SIZE)
+
+def _cluster_document(members: List[str]) -> Dict[str, Any]:
+    """A cluster document with its precomputed size, fraud density and internal link weight."""
+    return {"members": list(members), **cluster_stats(graph, members, fraud_user_ids)}
+
+def _cluster_query(cluster_id: str) -> Dict[str, Any]:
+    return {"_id": ObjectId(cluster_id) if ObjectId.is_valid(cluster_id) else cluster_id}
+
+def _publish_clusters(cluster_ids: Iterable[str]) -> None:
+    """Logs the current state of changed clusters so the indexes of other workers follow."""
+    graph_changelog.record(services.db, [cluster_index.change(cluster_id) for cluster_id in dict.fromkeys(cluster_ids)])
+
+def publish_cluster_reload() -> None:
+    """Logs a full replacement of the clusters; other workers reload them from MongoDB."""
+    graph_changelog.record(services.db, [{"op": "load_clusters"}])
+
+def _rewrite_clusters(affected: List[str], groups: List[List[str]]) -> None:
+    """
+    Replaces the stored clusters of the `affected` users with `groups`, the
+    sets they form now. Existing cluster IDs are reused, largest group first.
+    """
+    db = services.db
+    cluster_ids = sorted(cluster_index.clusters_of(affected), key=lambda cluster_id: -len(cluster_index.members[cluster_id]))
+    for cluster_id in cluster_ids:
+        cluster_index.remove_cluster(cluster_id)
+    # Stored clusters only exist for groups with more than one member
+    groups = sorted((members for members in groups if len(members) > 1), key=len, reverse=True)
+    written = []
+    for position, members in enumerate(groups):
+        cluster = _cluster_document(members)
+        if position < len(cluster_ids):
+            cluster_id = cluster_ids[position]
+            db.clusters.update_one(_cluster_query(cluster_id), {"$set": cluster}, upsert=True)
+        else:
+            cluster_id = str(db.clusters.insert_one(cluster).inserted_id)
+        cluster_index.set_cluster(cluster_id, members, cluster)
+        written.append(cluster_id)
+    for cluster_id in cluster_ids[len(groups):]:
+        db.clusters.delete_one(_cluster_query(cluster_id))
+    _publish_clusters(cluster_ids + written)
+
+def refresh_cluster_stats(user_ids: Iterable[str], removed_user_id: Optional[str] = None) -> None:
+    """
+    Recomputes the stats of the clusters containing `user_ids` after their
+    fraud flags or internal links changed. A `removed_user_id` (a deleted
+    user, passed in `user_ids` as well) is dropped from its cluster first.
+    """
+    db = services.db
+    cluster_ids = list(cluster_index.clusters_of(user_ids))
+    for cluster_id in cluster_ids:
+        members = [member for member in cluster_index.members[cluster_id] if member != removed_user_id]
+        cluster = _cluster_document(members)
+        query = _cluster_query(cluster_id)
+        if len(members) > 1:
+            db.clusters.update_one(query, {"$set": cluster})
+            cluster_index.set_cluster(cluster_id, members, cluster)
+        else:
+            # Stored clusters only exist for groups with more than one member
+            db.clusters.delete_one(query)
+            cluster_index.remove_cluster(cluster_id)
+    _publish_clusters(cluster_ids)
 
 async def cluster_nodes_service() -> Dict[str, Any]:
     """
     Clusters nodes based on graph rules and distance metrics.
+    This is the full rebuild; new users are clustered incrementally by cluster_new_user_service.
     """
-    # Clear existing clusters
-    db.clusters.delete_many({})
+    db = services.db
 
-    # Load graph rules from MongoDB
+    # Load graph rules and users from MongoDB
     graph_rules = list(db.graph_rules.find())
-
     users = list(db.users.find())
-    user_ids = [user['id_user'] for user in users]
 
-    # Initialize clusters - each user is initially in their own cluster
-    clusters = {user_id: {user_id} for user_id in user_ids}
-    cluster_id_counter = len(user_ids)
+    clusters = cluster_engine.rebuild(users, graph_rules)
 
-    # Apply rules to group users
-    for i in range(len(users)):
-        for j in range(i + 1, len(users)):
-            user1 = users[i]
-            user2 = users[j]
+    # Replace the stored clusters, keeping only groups with more than one member
+    final_clusters = [_cluster_document(members) for members in clusters.groups().values() if len(members) > 1]
+    db.clusters.delete_many({})
+    if final_clusters:
+        db.clusters.insert_many(final_clusters)
+    cluster_index.clear()
+    for cluster in final_clusters:
+        cluster_index.set_cluster(str(cluster['_id']), cluster['members'], cluster)
+    publish_cluster_reload()
 
-            user1_id = user1['id_user']
-            user2_id = user2['id_user']
+    return {"message": "Nodes clustered successfully"}
 
-            # Check if they are already in the same cluster
-            if any(user1_id in cluster and user2_id in cluster for cluster in clusters.values()):
-                continue
+async def cluster_new_user_service(user: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Clusters a newly inserted user without re-running the full pass.
+    The user is probed against the engine's blocking indexes, merged with the
+    matching clusters, and only the affected cluster documents are written.
+    Falls back to a full rebuild when the engine state is stale.
+    """
+    if cluster_index.method != RULES_METHOD:
+        # Community clusters are only rebuilt by the next detection job
+        return {"message": "Nodes clustered successfully"}
+    db = services.db
+    graph_rules = list(db.graph_rules.find())
+    if not cluster_engine.is_current(graph_rules):
+        return await cluster_nodes_service()
 
-            rule_triggered = False
-            for rule in graph_rules:
-                if apply_graph_rule(user1, user2, rule):
-                    # Merge clusters
-                    cluster1_id = None
-                    cluster2_id = None
-                    for c_id, members in clusters.items():
-                        if user1_id in members:
-                            cluster1_id = c_id
-                        if user2_id in members:
-                            cluster2_id = c_id
-                        if cluster1_id and cluster2_id:
-                            break
-
-                    if cluster1_id and cluster2_id and cluster1_id != cluster2_id:
-                        clusters[cluster1_id].update(clusters[cluster2_id])
-                        del clusters[cluster2_id]
-
-    # Save clusters to MongoDB
-    final_clusters = []
-    for members in clusters.values():
-        if len(members) > 1:
-            cluster_doc = {
-                "members": list(members)
-            }
-            final_clusters.append(cluster_doc)
+    members, merged = cluster_engine.add(user)
+    if not merged:
+        return {"message": "Nodes clustered successfully"}
 
-    db.clusters.insert_many(final_clusters)
+    # Stored clusters only exist for groups with more than one member
+    representatives = [group[0] for group in merged if len(group) > 1]
+    existing_ids = [cluster['_id'] for cluster in db.clusters.find({"members": {"$in": representatives}}, {"_id": 1})] if representatives else []
+    cluster_id = existing_ids[0] if existing_ids else ObjectId()
+    cluster = _cluster_document(members)
+    db.clusters.update_one({"_id": cluster_id}, {"$set": cluster}, upsert=True)
+    if len(existing_ids) > 1:
+        db.clusters.delete_many({"_id": {"$in": existing_ids[1:]}})
+    for merged_id in existing_ids[1:]:
+        cluster_index.remove_cluster(str(merged_id))
+    cluster_index.set_cluster(str(cluster_id), members, cluster)
+    _publish_clusters(str(stored_id) for stored_id in [cluster_id, *existing_ids])
 
     return {"message": "Nodes clustered successfully"}
 
+async def recluster_updated_user_service(user: Dict[str, Any]) -> None:
+    """
+    Re-clusters a user whose attributes changed, touching only its former set
+    and the sets it joins. Until the engine has been built (by the next full
+    pass or insert) there is nothing to update incrementally.
+    """
+    if cluster_index.method != RULES_METHOD or not cluster_engine.is_current(list(services.db.graph_rules.find())):
+        return
+    affected, groups = cluster_engine.update(user)
+    if affected:
+        _rewrite_clusters(affected, groups)
+
+async def recluster_removed_user_service(user_id: str) -> None:
+    """
+    Drops a deleted user from its cluster, which may split without it. Falls
+    back to only updating the cluster's stats when the engine is not current.
+    """
+    if cluster_index.method == RULES_METHOD and cluster_engine.is_current(list(services.db.graph_rules.find())):
+        affected, groups = cluster_engine.remove(user_id)
+        if affected:
+            _rewrite_clusters(affected, groups)
+            return
+    refresh_cluster_stats([user_id], removed_user_id=user_id)
+
+async def recluster_without_rule_service(deleted_rule: Dict[str, Any]) -> int:
+    """
+    Re-clusters only the clusters a deleted rule may have merged and returns
+    how many of them split. Removing a rule can only split clusters, so each
+    affected cluster is re-clustered on its own members with the remaining
+    rules; a cluster is affected if the rule matches any pair of its members.
+    """
+    if cluster_index.method != RULES_METHOD:
+        return 0
+    db = services.db
+    clustered = {member: cluster_id for cluster_id, members in cluster_index.members.items() for member in members}
+    if not clustered:
+        return 0
+    projection = {"_id": 0, "id_user": 1, deleted_rule['field1']: 1}
+    if deleted_rule.get('field2'):
+        projection[deleted_rule['field2']] = 1
+    rule = CompiledRule(deleted_rule)
+    cluster_users_by_id: Dict[str, List[Dict[str, Any]]] = {}
+    for user in db.users.find({"id_user": {"$in": list(clustered)}}, projection):
+        cluster_users_by_id.setdefault(clustered[user['id_user']], []).append(user)
+    affected = [
+        cluster_id for cluster_id, users in cluster_users_by_id.items()
+        if next(_matching_pairs(AttributeColumns(users), rule, GRAPH_BLOCKING_MAX_BUCKET_SIZE), None) is not None
+    ]
+    if not affected:
+        return 0
+
+    graph_rules = list(db.graph_rules.find())
+    affected_members = [member for cluster_id in affected for member in cluster_index.members[cluster_id]]
+    users_by_id = {user['id_user']: user for user in db.users.find({"id_user": {"$in": affected_members}})}
+    split = 0
+    written = []
+    for cluster_id in affected:
+        users = [users_by_id[member] for member in cluster_index.members[cluster_id] if member in users_by_id]
+        groups = sorted((members for members in cluster_users(users, graph_rules, GRAPH_BLOCKING_MAX_BUCKET_SIZE).groups().values() if len(members) > 1), key=len, reverse=True)
+        query = _cluster_query(cluster_id)
+        cluster_index.remove_cluster(cluster_id)
+        if not groups:
+            db.clusters.delete_one(query)
+        else:
+            # The largest part keeps the cluster's ID
+            cluster = _cluster_document(groups[0])
+            db.clusters.update_one(query, {"$set": cluster})
+            cluster_index.set_cluster(cluster_id, groups[0], cluster)
+            for members in groups[1:]:
+                cluster = _cluster_document(members)
+                db.clusters.insert_one(cluster)
+                cluster_index.set_cluster(str(cluster['_id']), members, cluster)
+                written.append(str(cluster['_id']))
+        if len(groups) != 1 or len(groups[0]) != len(users):
+            split += 1
+    _publish_clusters(affected + written)
+    logger.info(f"Rule {deleted_rule.get('name')}: re-clustered {len(affected)} clusters, {split} split")
+    return split
+
 async def get_all_clusters_service() -> List[Dict[str, Any]]:
     """
     Retrieve all clusters from MongoDB.
     """
-    clusters = list(db.clusters.find())
+    clusters = list(services.db.clusters.find())
     for cluster in clusters:
         cluster['_id'] = str(cluster['_id'])  # Convert ObjectId to string
+        cluster['cluster_id'] = cluster['_id']
     return clusters
 
+def find_cluster(cluster_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Finds a cluster by the string form of its ID (an ObjectId for clusters written by this service).
+    """
+    if ObjectId.is_valid(cluster_id):
+        cluster = services.db.clusters.find_one({"_id": ObjectId(cluster_id)})
+        if cluster is not None:
+            return cluster
+    return services.db.clusters.find_one({"_id": cluster_id})
+
 async def get_cluster_by_id_service(cluster_id: str) -> Dict[str, Any]:
     """
     Retrieve a specific cluster by ID from MongoDB.
     """
-    cluster = db.clusters.find_one({"_id": cluster_id})
+    cluster = find_cluster(cluster_id)
     if cluster is None:
         raise HTTPException(status_code=404, detail="Cluster not found")
     cluster['_id'] = str(cluster['_id'])  # Convert ObjectId to string
+    cluster['cluster_id'] = cluster['_id']
     return cluster
\ No newline at end of file
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from fastapi import HTTPException
+
+from common.config import GRAPH_COMMUNITY_WORKERS
+from .. import services
+from ..services import graph, fraud_user_ids, cluster_index
+from ..algorithms.communities import (
+    COMMUNITY_METHODS,
+    community_stats,
+    component_groups,
+    connected_components,
+    detect_communities,
+    filter_edges,
+    induced_subgraph,
+)
+from .cluster_service import publish_cluster_reload
+from .contact_service import snapshot_graph_arrays
+
+logger = logging.getLogger(__name__)
+
+# Links per process pool task; small components are packed together up to this size
+COMMUNITY_CHUNK_EDGES = 500_000
+CLUSTER_WRITE_BATCH_SIZE = 10_000
+# New clusters are written here and renamed over `clusters` in one step
+CLUSTER_STAGING_COLLECTION = "clusters_staging"
+MAX_FINISHED_JOBS = 20
+
+# Community detection jobs by ID, newest last
+community_jobs: Dict[str, Dict[str, Any]] = {}
+# Keeps running job tasks referenced until they finish
+_job_tasks: Set[asyncio.Task] = set()
+
+def _chunks(groups: List[np.ndarray], indptr: np.ndarray) -> List[List[np.ndarray]]:
+    """Packs components (largest first) into tasks of about COMMUNITY_CHUNK_EDGES links each."""
+    chunks, current, edges = [], [], 0
+    for group in groups:
+        group_edges = int((indptr[group + 1] - indptr[group]).sum())
+        if current and edges + group_edges > COMMUNITY_CHUNK_EDGES:
+            chunks.append(current)
+            current, edges = [], 0
+        current.append(group)
+        edges += group_edges
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _executor(workers: int) -> Executor:
+    if workers <= 1:
+        return ThreadPoolExecutor(max_workers=1)
+    # Forking a process with an event loop and driver threads is unsafe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _cluster_documents(method: str, ids: List[Any], labels: np.ndarray, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> List[Dict[str, Any]]:
+    """Cluster documents with precomputed stats for every community with more than one member."""
+    fraud = np.fromiter((node in fraud_user_ids for node in ids), dtype=bool, count=len(ids))
+    sizes, fraud_counts, link_weights = community_stats(labels, indptr, indices, weights, fraud)
+    order = np.argsort(labels, kind="stable")
+    order = order[labels[order] >= 0]
+    starts = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1]]) if len(order) else np.empty(0, dtype=np.int64)
+    documents = []
+    for members in np.split(order, starts[1:]) if len(order) else []:
+        label = labels[members[0]]
+        if sizes[label] < 2:
+            continue
+        documents.append({
+            "members": [ids[i] for i in members],
+            "method": method,
+            "size": int(sizes[label]),
+            "fraud_count": int(fraud_counts[label]),
+            "fraud_ratio": float(fraud_counts[label] / sizes[label]),
+            "total_link_weight": float(link_weights[label]),
+        })
+    return documents
+
+def _replace_clusters(db, documents: List[Dict[str, Any]]) -> None:
+    """Replaces the whole clusters collection; readers see either the old or the new clusters."""
+    staging = db[CLUSTER_STAGING_COLLECTION]
+    staging.drop()
+    if not documents:
+        db.clusters.delete_many({})
+        return
+    for start in range(0, len(documents), CLUSTER_WRITE_BATCH_SIZE):
+        staging.insert_many(documents[start:start + CLUSTER_WRITE_BATCH_SIZE], ordered=False)
+    staging.rename("clusters", dropTarget=True)
+
+async def _run_community_job(job: Dict[str, Any], workers: int) -> None:
+    started = time.perf_counter()
+    try:
+        # Only the cheap snapshot runs on the event loop; the graph is compacted in a thread
+        ids, indptr, indices, weights = await snapshot_graph_arrays(graph)
+        ids = list(ids)
+
+        job["stage"] = "finding components"
+        detection_arrays = filter_edges(indptr, indices, weights, job["min_weight"])
+        components = await asyncio.to_thread(connected_components, detection_arrays[0], detection_arrays[1])
+        groups = component_groups(components)
+        chunks = _chunks(groups, detection_arrays[0])
+        job["components_total"] = len(groups)
+
+        job["stage"] = "detecting communities"
+        labels = np.full(len(ids), -1, dtype=np.int64)
+        next_label = 0
+        loop = asyncio.get_running_loop()
+        with _executor(workers) as executor:
+            async def detect(chunk: List[np.ndarray]):
+                nodes = np.concatenate(chunk)
+                offsets = np.concatenate(([0], np.cumsum([len(group) for group in chunk]))).astype(np.int64)
+                chunk_labels = await loop.run_in_executor(executor, detect_communities, job["method"], *induced_subgraph(*detection_arrays, nodes), offsets)
+                return nodes, len(chunk), chunk_labels
+
+            for finished in asyncio.as_completed([detect(chunk) for chunk in chunks]):
+                nodes, count, chunk_labels = await finished
+                labels[nodes] = chunk_labels + next_label
+                next_label += int(chunk_labels.max()) + 1
+                job["components_done"] += count
+                job["progress"] = job["components_done"] / job["components_total"]
+
+        job["stage"] = "writing clusters"
+        # Stats cover every link between members, including those below min_weight
+        documents = await asyncio.to_thread(_cluster_documents, job["method"], ids, labels, indptr, indices, weights)
+        await asyncio.to_thread(_replace_clusters, services.db, documents)
+        cluster_index.clear(job["method"])
+        for cluster in documents:
+            cluster_index.set_cluster(str(cluster['_id']), cluster['members'], cluster)
+        # Other workers and the next snapshot reload the replaced clusters
+        publish_cluster_reload()
+
+        job.update(status="completed", stage="done", progress=1.0, clusters=len(documents), finished_at=time.time())
+        logger.info(f"Detected {len(documents)} {job['method']} communities in {len(groups)} components in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.exception(f"Community detection job {job['job_id']} failed")
+        job.update(status="failed", error=str(e), finished_at=time.time())
+
+def _prune_jobs() -> None:
+    finished = [job_id for job_id, job in community_jobs.items() if job["status"] != "running"]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del community_jobs[job_id]
+
+async def start_community_job_service(method: str, min_weight: float = 0.0, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Starts replacing the clusters with weighted communities of the link graph
+    in the background and returns the job. Connected components are split
+    across a process pool; each component is clustered by label propagation
+    (fast, scales to millions of nodes) or Louvain (networkx, slower).
+    Links lighter than `min_weight` are ignored. Until the clusters are
+    rebuilt by POST /cluster_nodes/, new users are not clustered incrementally.
+    """
+    if method not in COMMUNITY_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown community detection method: {method}")
+    if any(job["status"] == "running" for job in community_jobs.values()):
+        raise HTTPException(status_code=409, detail="A community detection job is already running")
+    _prune_jobs()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "method": method,
+        "min_weight": min_weight,
+        "status": "running",
+        "stage": "loading graph",
+        "progress": 0.0,
+        "components_done": 0,
+        "components_total": None,
+        "clusters": None,
+        "error": None,
+        "started_at": time.time(),
+        "finished_at": None,
+    }
+    community_jobs[job["job_id"]] = job
+    workers = workers or GRAPH_COMMUNITY_WORKERS or os.cpu_count() or 1
+    task = asyncio.create_task(_run_community_job(job, workers))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return dict(job)
+
+async def get_community_job_service(job_id: str) -> Dict[str, Any]:
+    job = community_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Community detection job not found")
+    return dict(job)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from ..algorithms.csr import CompactGraph
+from ..services import graph, fraud_user_ids, contact_probability
+
+logger = logging.getLogger(__name__)
+
+# Attempts at reading a networkx graph off the event loop before copying it on the loop
+GRAPH_ARRAYS_RETRIES = 3
+
+def graph_arrays(graph):
+    """Returns (ids, indptr, indices, weights) CSR arrays for either graph backend."""
+    if hasattr(graph, "to_arrays"):
+        return graph.to_arrays()
+    compact = CompactGraph()
+    compact.load_edges(graph.nodes, ((u, v, data.get('weight', 1.0)) for u, v, data in graph.edges(data=True)))
+    return compact.to_arrays()
+
+async def snapshot_graph_arrays(graph):
+    """
+    Returns graph_arrays(graph) without blocking the event loop on the copy.
+    A CompactGraph is copied on the loop (flat array copies) and compacted in
+    a worker thread. A networkx graph has no cheap copy, so it is read in a
+    worker thread; a request mutating it meanwhile makes the read fail, and
+    after GRAPH_ARRAYS_RETRIES such failures it is read on the loop instead.
+    """
+    if isinstance(graph, CompactGraph):
+        return await asyncio.to_thread(graph.copy().to_arrays)
+    for _ in range(GRAPH_ARRAYS_RETRIES):
+        try:
+            return await asyncio.to_thread(graph_arrays, graph)
+        except RuntimeError:
+            # "dictionary changed size during iteration"
+            continue
+    return graph_arrays(graph)
+
+async def refresh_contact_probability_service() -> Dict[str, Any]:
+    """
+    Recomputes every user's probability of contact with fraud in a worker
+    thread, warm-started from the previous scores.
+    """
+    observed_changes = contact_probability.pending_changes
+    started = time.perf_counter()
+    ids, indptr, indices, weights = await snapshot_graph_arrays(graph)
+    iterations = await asyncio.to_thread(contact_probability.compute, ids, indptr, indices, weights, set(fraud_user_ids))
+    # Changes made while computing stay pending for the next run
+    contact_probability.pending_changes -= observed_changes
+    logger.info(f"Computed fraud contact probability for {len(ids)} users in {iterations} iterations ({time.perf_counter() - started:.2f}s)")
+    return {"message": "Fraud contact probability computed successfully", "nodes": len(ids), "iterations": iterations}
+
+async def run_periodic_contact_refresh(interval: float) -> None:
+    """Recomputes the scores whenever seeds or links changed, checking every `interval` seconds."""
+    while True:
+        if contact_probability.pending_changes > 0:
+            try:
+                await refresh_contact_probability_service()
+            except Exception:
+                logger.exception("Failed to compute fraud contact probability")
+        await asyncio.sleep(interval)
@@ -0,0 +1,80 @@
+import logging
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from .. import services
+from ..algorithms.entity_graph import TRANSACTION_ENTITY_FIELDS, USER_ENTITY_FIELDS, extract_entities
+from ..services import graph, entity_graph, graph_changelog
+
+logger = logging.getLogger(__name__)
+
+# Entities shared by more users than this are listed but not expanded
+ENTITY_MAX_DEGREE = 1000
+ENTITY_MAX_USERS = 1000
+# Largest number of transactions accepted by one POST /transactions/entities request
+MAX_TRANSACTION_BATCH_SIZE = 10000
+DUPLICATE_KEY_ERROR = 11000
+
+def index_user_entities(user: Dict[str, Any]) -> None:
+    """(Re)connects a user to the phone, email domain and address entities of its document."""
+    keys = sorted(extract_entities(user, USER_ENTITY_FIELDS))
+    entity_graph.replace(user['id_user'], keys, USER_ENTITY_FIELDS)
+    graph_changelog.record(services.db, [{"op": "set_entities", "node": user['id_user'], "entities": keys, "kinds": list(USER_ENTITY_FIELDS)}])
+
+def record_transaction_entities(transactions: List[Dict[str, Any]]) -> int:
+    """
+    Connects users to the card, ship zip and device entities of their
+    transactions. Only pairs new to the graph are written to
+    `user_entities` and the graph changelog; returns how many there were.
+    """
+    new_pairs = []
+    changes = []
+    for transaction in transactions:
+        user_id = transaction.get('id_user')
+        if user_id and user_id in graph:
+            keys = entity_graph.add(user_id, extract_entities(transaction, TRANSACTION_ENTITY_FIELDS))
+            new_pairs.extend({"id_user": user_id, "entity": key} for key in keys)
+            if keys:
+                changes.append({"op": "add_entities", "node": user_id, "entities": keys})
+    graph_changelog.record(services.db, changes)
+    if new_pairs:
+        try:
+            services.db.user_entities.insert_many(new_pairs, ordered=False)
+        except BulkWriteError as e:
+            # Pairs another worker recorded first are rejected by the unique index
+            if any(error.get('code') != DUPLICATE_KEY_ERROR for error in e.details.get('writeErrors', [])):
+                raise
+    return len(new_pairs)
+
+def remove_user_entities(user_id: str) -> None:
+    # Other workers drop the user's entities when they replay its remove_node entry
+    entity_graph.remove_user(user_id)
+    services.db.user_entities.delete_many({"id_user": user_id})
+
+async def record_transaction_entities_service(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Records the card, ship zip and device entities of stored transactions.
+    This is the write path of the entity graph; analyzing a transaction only
+    reads it. Transactions of users not in the graph are ignored.
+    """
+    if len(transactions) > MAX_TRANSACTION_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds the maximum of {MAX_TRANSACTION_BATCH_SIZE}")
+    recorded = record_transaction_entities(transactions)
+    return {"message": "Transaction entities recorded successfully", "recorded": recorded}
+
+async def get_shared_entities_service(user_id: str, max_degree: int = ENTITY_MAX_DEGREE, limit: int = ENTITY_MAX_USERS) -> Dict[str, Any]:
+    """
+    Returns the entities a user is connected to and the users sharing any of
+    them, strongest first, with the user-to-user weight projected on the fly.
+    """
+    if user_id not in graph:
+        raise HTTPException(status_code=404, detail="User not found")
+    shared = entity_graph.shared_with(user_id, max_degree)
+    return {
+        "user_id": user_id,
+        "entities": shared["entities"],
+        "users": shared["users"][:limit],
+        "total_users": len(shared["users"]),
+    }
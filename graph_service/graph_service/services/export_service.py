@@ -0,0 +1,226 @@
+import heapq
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from ..algorithms.neighborhood import bounded_neighborhood
+from ..services import graph, fraud_user_ids
+from .cluster_service import find_cluster
+
+EXPORT_FORMATS = ("ndjson", "arrow")
+# Caps on the node set of one export, before sampling
+EXPORT_MAX_NODES = 200000
+EXPORT_MAX_EGO_DEPTH = 3
+# Rows per Arrow record batch
+ARROW_BATCH_ROWS = 10000
+
+def select_nodes(cluster_id: Optional[str] = None, center: Optional[str] = None, depth: int = 1, node_ids: Optional[List[str]] = None) -> Tuple[Set[str], Dict[str, int]]:
+    """
+    Resolves the export scope to a node set: a cluster's members, an
+    ego network (bounded BFS around `center`), or an explicit list of node IDs
+    (the dashboard's viewport). Returns (nodes, {node: hops}) where hops is
+    only known for ego networks.
+    """
+    if sum(scope is not None for scope in (cluster_id, center, node_ids)) != 1:
+        raise HTTPException(status_code=400, detail="Specify exactly one of cluster_id, center or node_ids")
+    if cluster_id is not None:
+        cluster = find_cluster(cluster_id)
+        if cluster is None:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        nodes = {member for member in cluster['members'] if member in graph}
+        hops = {}
+    elif center is not None:
+        if center not in graph:
+            raise HTTPException(status_code=404, detail="User not found")
+        hops = bounded_neighborhood(graph, center, min(depth, EXPORT_MAX_EGO_DEPTH), max_nodes=EXPORT_MAX_NODES)["distances"]
+        nodes = set(hops)
+    else:
+        nodes = {node_id for node_id in node_ids if node_id in graph}
+        hops = {}
+    if len(nodes) > EXPORT_MAX_NODES:
+        raise HTTPException(status_code=400, detail=f"Subgraph has more than {EXPORT_MAX_NODES} nodes")
+    return nodes, hops
+
+def _edge_weight(edge: Tuple[str, str, Dict[str, Any]]) -> float:
+    return edge[2].get('weight', 1.0)
+
+def _internal_edges(nodes: Set[str], min_weight: Optional[float] = None) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Yields every edge inside `nodes` once, in visiting order, skipping edges
+    lighter than `min_weight`. The response streams from a worker thread while
+    the graph keeps changing, so each neighbor list is copied before it is read.
+    """
+    for node in nodes:
+        if node not in graph:
+            continue
+        for neighbor in list(graph.neighbors(node)):
+            if neighbor in nodes and node < neighbor:
+                data = graph.get_edge_data(node, neighbor, default={})
+                if min_weight is None or data.get('weight', 1.0) >= min_weight:
+                    yield node, neighbor, data
+
+def sample_edges(nodes: Set[str], top_k: Optional[int] = None, max_degree: Optional[int] = None, min_weight: Optional[float] = None) -> Iterable[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Returns the edges inside `nodes` after server-side sampling:
+    - `min_weight` drops light edges;
+    - `max_degree` keeps only each node's heaviest `max_degree` edges, pruning hubs;
+    - `top_k` keeps the heaviest `top_k` edges overall.
+    Without sampling the edges are generated lazily in visiting order, so the
+    export starts streaming at once. `top_k` alone keeps a bounded heap;
+    only `max_degree` needs every edge sorted, heaviest first.
+    """
+    edges = _internal_edges(nodes, min_weight)
+    if max_degree is None:
+        return edges if top_k is None else heapq.nlargest(top_k, edges, key=_edge_weight)
+
+    kept_degree: Dict[str, int] = {}
+    pruned = []
+    # Heaviest first, so each node keeps its heaviest edges
+    for edge in sorted(edges, key=_edge_weight, reverse=True):
+        if kept_degree.get(edge[0], 0) < max_degree and kept_degree.get(edge[1], 0) < max_degree:
+            kept_degree[edge[0]] = kept_degree.get(edge[0], 0) + 1
+            kept_degree[edge[1]] = kept_degree.get(edge[1], 0) + 1
+            pruned.append(edge)
+            if top_k is not None and len(pruned) == top_k:
+                break
+    return pruned
+
+def _records(nodes: Set[str], hops: Dict[str, int], edges: Iterable[Tuple[str, str, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields node and edge records so that a node always precedes its first
+    edge: the sampled edges come first, then the nodes without one.
+    A prefix of the stream is therefore always a consistent subgraph.
+    """
+    sent: Set[str] = set()
+
+    def node_record(node_id):
+        sent.add(node_id)
+        record = {"type": "node", "id": node_id, "is_fraud": node_id in fraud_user_ids}
+        if node_id in hops:
+            record["hops"] = hops[node_id]
+        return record
+
+    for source, target, data in edges:
+        for node_id in (source, target):
+            if node_id not in sent:
+                yield node_record(node_id)
+        record = {"type": "edge", "source": source, "target": target, "weight": float(data.get('weight', 1.0))}
+        if data.get('type') is not None:
+            record["link_type"] = data['type']
+        if data.get('reasons'):
+            record["reasons"] = data['reasons']
+        yield record
+    for node_id in sorted(nodes - sent):
+        yield node_record(node_id)
+
+def stream_ndjson(records: Iterator[Dict[str, Any]], max_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Encodes records as NDJSON lines, stopping before the byte budget would be
+    exceeded. The last line is always a {"type": "summary"} record.
+    """
+    sent_bytes = 0
+    counts = {"node": 0, "edge": 0}
+    truncated = False
+    for record in records:
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        if max_bytes is not None and sent_bytes + len(line) > max_bytes:
+            truncated = True
+            break
+        sent_bytes += len(line)
+        counts[record["type"]] += 1
+        yield line
+    yield (json.dumps({"type": "summary", "nodes": counts["node"], "edges": counts["edge"], "bytes": sent_bytes, "truncated": truncated}) + "\n").encode("utf-8")
+
+def stream_arrow(records: Iterator[Dict[str, Any]], max_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Encodes records as an Arrow IPC stream of record batches with one row per
+    node or edge, stopping before the byte budget would be exceeded. The schema
+    goes out first and counts against the budget. The last batch has no rows;
+    its custom metadata is the summary the NDJSON stream ends with (nodes,
+    edges, bytes and truncated, as strings).
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow")
+
+    schema = pa.schema([
+        ("type", pa.string()),
+        ("id", pa.string()),
+        ("source", pa.string()),
+        ("target", pa.string()),
+        ("weight", pa.float32()),
+        ("is_fraud", pa.bool_()),
+        ("hops", pa.int32()),
+    ])
+
+    def batches():
+        rows = []
+        for record in records:
+            rows.append(record)
+            if len(rows) == ARROW_BATCH_ROWS:
+                yield pa.RecordBatch.from_pylist(rows, schema=schema), rows
+                rows = []
+        if rows:
+            yield pa.RecordBatch.from_pylist(rows, schema=schema), rows
+
+    def generate():
+        header = schema.serialize().to_pybytes()
+        yield header
+        sent_bytes = len(header)
+        counts = {"node": 0, "edge": 0}
+        truncated = False
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+        # The writer emits the same schema message with its first batch; it was already sent
+        skip = len(header)
+
+        def flush() -> bytes:
+            nonlocal skip
+            chunk = sink.getvalue()[skip:]
+            skip = 0
+            sink.seek(0)
+            sink.truncate()
+            return chunk
+
+        for batch, rows in batches():
+            writer.write_batch(batch)
+            chunk = flush()
+            if max_bytes is not None and sent_bytes + len(chunk) > max_bytes:
+                truncated = True
+                break
+            sent_bytes += len(chunk)
+            for row in rows:
+                counts[row["type"]] += 1
+            yield chunk
+        summary = {"nodes": counts["node"], "edges": counts["edge"], "bytes": sent_bytes, "truncated": truncated}
+        writer.write_batch(pa.RecordBatch.from_pylist([], schema=schema), custom_metadata={key: json.dumps(value) for key, value in summary.items()})
+        writer.close()
+        yield flush()
+
+    return generate()
+
+async def export_subgraph_service(
+    cluster_id: Optional[str] = None,
+    center: Optional[str] = None,
+    depth: int = 1,
+    node_ids: Optional[List[str]] = None,
+    output_format: str = "ndjson",
+    top_k: Optional[int] = None,
+    max_degree: Optional[int] = None,
+    min_weight: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[Iterator[bytes], str]:
+    """
+    Selects and samples a subgraph and returns (byte stream, media type).
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {output_format}; use one of {', '.join(EXPORT_FORMATS)}")
+    nodes, hops = select_nodes(cluster_id, center, depth, node_ids)
+    edges = sample_edges(nodes, top_k, max_degree, min_weight)
+    records = _records(nodes, hops, edges)
+    if output_format == "arrow":
+        return stream_arrow(records, max_bytes), "application/vnd.apache.arrow.stream"
+    return stream_ndjson(records, max_bytes), "application/x-ndjson"
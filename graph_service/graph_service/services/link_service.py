@@ -1,33 +1,181 @@
+import logging
 from fastapi import HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+from pymongo import UpdateOne
 
+from common.config import GRAPH_BLOCKING_MAX_BUCKET_SIZE, GRAPH_ENTITY_LINK_MAX_GROUP, GRAPH_LINK_ADDRESS_SIMILARITY, GRAPH_LINK_MAX_EXACT_GROUP, GRAPH_LINK_NAME_SIMILARITY
+from .. import services
 from ..models import Link
-from ..services import db, graph
+from ..services import graph, fraud_distance, fraud_user_ids, graph_changelog, contact_probability, cluster_index
+from ..algorithms.blocking import BlockingIndex
+from ..algorithms.minhash import LSHIndex, MinHasher, jaccard, shingles
+from ..algorithms.text import normalize_address, normalize_name
+from .cluster_service import find_cluster, refresh_cluster_stats
+
+logger = logging.getLogger(__name__)
+
+GENERATED_LINK_TYPE = "generated"
+# Evidence weight of an exact match on each attribute
+EXACT_MATCH_WEIGHTS = {"phone_number": 0.9, "address_zip": 0.3}
+# Exact-match fields that are also entity nodes of the user-entity graph
+ENTITY_LINK_FIELDS = {"phone_number"}
+# Evidence weight of a fully similar attribute; partial similarity scales it down
+FUZZY_MATCH_WEIGHTS = {"nama_lengkap": 0.5, "address": 0.7}
+RULE_MATCH_WEIGHT = 0.5
+# Normalizer and minimum Jaccard similarity of each fuzzily matched attribute
+FUZZY_MATCH_FIELDS = {
+    "nama_lengkap": (normalize_name, GRAPH_LINK_NAME_SIMILARITY),
+    "address": (normalize_address, GRAPH_LINK_ADDRESS_SIMILARITY),
+}
+LINK_BATCH_SIZE = 1000
+
+def link_key(source: str, target: str) -> Dict[str, str]:
+    """
+    Canonical key of the undirected link between two users: the smaller ID is
+    node_a. Links are unique on (node_a, node_b), whichever direction they were
+    created in.
+    """
+    node_a, node_b = sorted((source, target))
+    return {"node_a": node_a, "node_b": node_b}
+
+def _link_upsert(link: Dict[str, Any]) -> UpdateOne:
+    """Upsert of one link under its canonical key. An existing link keeps its original direction."""
+    update = {"type": link['type'], "weight": link['weight'], "reasons": link.get('reasons', []), "rule_ids": link.get('rule_ids', [])}
+    on_insert = {"source": link['source'], "target": link['target']}
+    return UpdateOne(link_key(link['source'], link['target']), {"$set": update, "$setOnInsert": on_insert}, upsert=True)
+
+def _generated_link_upserts(db, links: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """
+    Upserts of generated links. New and previously generated links are
+    replaced by the fresh evidence; links created by hand keep their type,
+    weight (unless the evidence is stronger) and reasons, and only gain the
+    generated reasons and rule IDs. `links` are updated to the merged values.
+    """
+    existing = {
+        (link['node_a'], link['node_b']): link
+        for link in db.links.find({"$or": [link_key(link['source'], link['target']) for link in links]}, {"_id": 0, "node_a": 1, "node_b": 1, "type": 1, "weight": 1, "reasons": 1, "rule_ids": 1})
+    } if links else {}
+    upserts = []
+    for link in links:
+        key = link_key(link['source'], link['target'])
+        current = existing.get((key['node_a'], key['node_b']))
+        if current is None or current.get('type') == GENERATED_LINK_TYPE:
+            upserts.append(_link_upsert(link))
+            continue
+        upserts.append(UpdateOne(key, {
+            "$max": {"weight": link['weight']},
+            "$addToSet": {"reasons": {"$each": link['reasons']}, "rule_ids": {"$each": link['rule_ids']}},
+        }))
+        link.update(
+            type=current.get('type'),
+            weight=max(current.get('weight', 0.0), link['weight']),
+            reasons=list(dict.fromkeys(current.get('reasons', []) + link['reasons'])),
+            rule_ids=list(dict.fromkeys(current.get('rule_ids', []) + link['rule_ids'])),
+        )
+    return upserts
+
+def canonical_links(links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drops self-links and keeps the last of several links between the same pair, in either direction."""
+    unique = {}
+    for link in links:
+        if link['source'] != link['target']:
+            key = link_key(link['source'], link['target'])
+            unique.pop((key['node_a'], key['node_b']), None)
+            unique[(key['node_a'], key['node_b'])] = link
+    return list(unique.values())
+
+def _add_links_to_graph(links: List[Dict[str, Any]]) -> None:
+    """Adds links to the in-memory graph and the indexes derived from it in one batch."""
+    graph.add_edges_from(
+        (link['source'], link['target'], {"weight": link['weight'], "type": link['type'], "reasons": link.get('reasons', []), "rule_ids": link.get('rule_ids', [])})
+        for link in links
+    )
+    for link in links:
+        fraud_distance.add_edge(graph, link['source'], link['target'])
+    contact_probability.mark_changed()
+    graph_changelog.record(services.db, [{"op": "add_edge", "source": link['source'], "target": link['target'], "weight": link['weight']} for link in links])
+    _refresh_link_clusters(links)
+
+def remove_links_from_graph(links: List[Dict[str, Any]]) -> int:
+    """
+    Removes deleted links from the in-memory graph and repairs the indexes
+    derived from it in one batch. Returns how many edges were removed.
+    """
+    removed = [(link['source'], link['target']) for link in links if graph.has_edge(link['source'], link['target'])]
+    for source, target in removed:
+        graph.remove_edge(source, target)
+    fraud_distance.remove_edges(graph, removed)
+    if removed:
+        contact_probability.mark_changed()
+    graph_changelog.record(services.db, [{"op": "remove_edge", "source": link['source'], "target": link['target']} for link in links])
+    _refresh_link_clusters(links)
+    return len(removed)
+
+def _refresh_link_clusters(links: List[Dict[str, Any]]) -> None:
+    """Updates the link weight totals of clusters that gained or lost internal links."""
+    refresh_cluster_stats(link['source'] for link in links if cluster_index.same_cluster(link['source'], link['target']))
 
 async def create_link_service(link: Link, db) -> Dict[str, Any]:
     """
     Creates a new link in the graph and MongoDB.
     """
-    link_data = link.model_dump(by_alias=True) # Use by_alias=True
-    # Ensure link doesn't already exist (simple check based on source and target)
-    if db.links.find_one({"source": link_data["source"], "target": link_data["target"]}) or db.links.find_one({"source": link_data["target"], "target": link_data["source"]}):
+    link_data = link.model_dump(by_alias=True, exclude={"id"}) # Let MongoDB assign _id
+    if link_data['source'] == link_data['target']:
+        raise HTTPException(status_code=400, detail="A link needs two different users")
+    link_data.update(link_key(link_data['source'], link_data['target']))
+    # A single upsert both detects an existing link (in either direction) and inserts the new one
+    result = db.links.update_one(link_key(link_data['source'], link_data['target']), {"$setOnInsert": link_data}, upsert=True)
+    if result.upserted_id is None:
          raise HTTPException(status_code=400, detail="Link between these users already exists")
+    new_link = dict(link_data, _id=result.upserted_id)
 
-    result = db.links.insert_one(link_data)
-    # Fetch the inserted document to get the ObjectId
-    new_link = db.links.find_one({"_id": result.inserted_id})
-
-    graph.add_edge(new_link['source'], new_link['target'], weight=new_link['weight'], type=new_link['type'], reasons=new_link.get('reasons', []), rule_ids=new_link.get('rule_ids', []))
+    _add_links_to_graph([new_link])
     # Convert ObjectId to string for response and rename _id to id
-    if new_link and '_id' in new_link:
-        new_link['id'] = str(new_link.pop('_id'))
+    new_link['id'] = str(new_link.pop('_id'))
     return new_link
 
+async def bulk_upsert_links_service(links: List[Link], db) -> Dict[str, Any]:
+    """
+    Upserts many links with unordered bulk writes keyed on the canonical pair,
+    then updates the in-memory graph in one batch.
+    """
+    link_data = canonical_links([link.model_dump(by_alias=True, exclude={"id"}) for link in links])
+    upserted = modified = 0
+    for start in range(0, len(link_data), LINK_BATCH_SIZE):
+        result = db.links.bulk_write([_link_upsert(link) for link in link_data[start:start + LINK_BATCH_SIZE]], ordered=False)
+        upserted += result.upserted_count
+        modified += result.modified_count
+
+    _add_links_to_graph(link_data)
+    return {"message": "Links upserted successfully", "received": len(links), "upserted": upserted, "modified": modified}
+
+async def get_all_links_service() -> List[Dict[str, Any]]:
+    """
+    Retrieves every link from MongoDB. Use the subgraph export for large graphs.
+    """
+    links = list(services.db.links.find())
+    for link in links:
+        link['_id'] = str(link['_id'])  # Convert ObjectId to string
+    return links
+
+async def get_links_by_cluster_service(cluster_id: str) -> List[Dict[str, Any]]:
+    """
+    Retrieves the links between members of a cluster.
+    """
+    cluster = find_cluster(cluster_id)
+    if cluster is None:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    members = cluster['members']
+    links = list(services.db.links.find({"source": {"$in": members}, "target": {"$in": members}}))
+    for link in links:
+        link['_id'] = str(link['_id'])  # Convert ObjectId to string
+    return links
+
 async def read_link_service(source_id: str, target_id: str, db) -> Dict[str, Any]:
     """
-    Reads a link by source and target ID from MongoDB.
+    Reads a link by source and target ID from MongoDB, in either direction.
     """
-    link_data = db.links.find_one({"source": source_id, "target": target_id})
+    link_data = db.links.find_one(link_key(source_id, target_id))
     if link_data is None:
         raise HTTPException(status_code=404, detail="Link not found")
     # Convert ObjectId to string for response and rename _id to id
@@ -37,12 +185,122 @@ async def read_link_service(source_id: str, target_id: str, db) -> Dict[str, Any
 
 async def delete_link_service(source_id: str, target_id: str, db) -> Dict[str, Any]:
     """
-    Deletes a link by source and target ID from MongoDB and the graph.
+    Deletes a link by source and target ID from MongoDB and the graph, in either direction.
     """
-    result = db.links.delete_one({"source": source_id, "target": target_id})
+    result = db.links.delete_one(link_key(source_id, target_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Link not found")
     # Remove the edge from the graph
-    if graph.has_edge(source_id, target_id):
-        graph.remove_edge(source_id, target_id)
-    return {"message": "Link deleted successfully"}
\ No newline at end of file
+    remove_links_from_graph([{"source": source_id, "target": target_id}])
+    return {"message": "Link deleted successfully"}
+
+def build_links(users: List[Dict[str, Any]], graph_rules: List[Dict[str, Any]], max_bucket_size: int = None, max_entity_group: int = None, max_exact_group: int = None) -> List[Dict[str, Any]]:
+    """
+    Builds weighted links between users that share or nearly share attributes:
+    - exact phone/zip matches and "equal" graph rules (field2 defaults to field1)
+      via blocking indexes;
+    - fuzzy name and address matches via MinHash/LSH over character shingles of
+      the normalized values, confirmed with the exact Jaccard similarity.
+    Each piece of evidence adds a reason; the link weight combines the evidence
+    weights as 1 - prod(1 - w), so it stays within [0, 1]. Rules comparing the
+    same pair of fields as a built-in match (or as each other) add their rule
+    IDs to one piece of evidence instead of counting it again.
+
+    Exact-match groups of more than `max_exact_group` users (e.g. a common zip
+    code) are not linked pairwise, since each would add n * (n - 1) / 2 weak
+    links, nor are groups of more than `max_entity_group` users sharing an
+    entity field (e.g. one phone); the user-entity graph connects those.
+    """
+    evidence: Dict[Tuple[int, int], List[Tuple[str, Tuple[str, ...], float]]] = {}
+
+    def add_evidence(i, j, reason, rule_ids, weight):
+        if i != j and users[i]['id_user'] != users[j]['id_user']:
+            evidence.setdefault((min(i, j), max(i, j)), []).append((reason, rule_ids, weight))
+
+    # Sorted (field1, field2) -> [reason, rule IDs, weight]; links are undirected, so field order does not matter
+    exact_fields: Dict[Tuple[str, str], list] = {(field, field): [f"same {field}", [], weight] for field, weight in EXACT_MATCH_WEIGHTS.items()}
+    for rule in graph_rules:
+        if rule.get('operator') == "equal" and rule.get('value') is None:
+            fields = tuple(sorted((rule['field1'], rule.get('field2') or rule['field1'])))
+            match = exact_fields.setdefault(fields, [rule.get('name') or f"same {rule['field1']}", [], RULE_MATCH_WEIGHT])
+            match[1].append(str(rule.get('_id')))
+
+    for (field1, field2), (reason, rule_ids, weight) in exact_fields.items():
+        caps = [cap for cap in (max_bucket_size, max_exact_group) if cap]
+        if max_entity_group and field1 == field2 and field1 in ENTITY_LINK_FIELDS:
+            # Shared entities are capped by the entity limit, not the exact-match one
+            caps = [cap for cap in (max_bucket_size, max_entity_group) if cap]
+        bucket_cap = min(caps) if caps else None
+        left_index = BlockingIndex(bucket_cap)
+        right_index = BlockingIndex(bucket_cap)
+        for i, user in enumerate(users):
+            left_index.add(i, user.get(field1))
+            right_index.add(i, user.get(field2))
+        pairs = set()
+        for key, left_members in left_index.buckets():
+            right_members = right_index.bucket(key)
+            for i in left_members:
+                for j in right_members:
+                    # Blocking keys are the normalized values, so a shared bucket is a match
+                    if i != j:
+                        pairs.add((min(i, j), max(i, j)))
+        for i, j in pairs:
+            add_evidence(i, j, reason, tuple(rule_ids), weight)
+
+    hasher = MinHasher()
+    for field, (normalize, threshold) in FUZZY_MATCH_FIELDS.items():
+        user_shingles = [shingles(normalize(user.get(field))) for user in users]
+        lsh = LSHIndex(max_bucket_size=max_bucket_size)
+        for i, items in enumerate(user_shingles):
+            lsh.add(i, hasher.signature(items))
+        for i, j in lsh.candidate_pairs():
+            similarity = jaccard(user_shingles[i], user_shingles[j])
+            if similarity >= threshold:
+                add_evidence(i, j, f"similar {field} ({similarity:.2f})", (), FUZZY_MATCH_WEIGHTS[field] * similarity)
+
+    links = []
+    for (i, j), reasons in evidence.items():
+        source, target = sorted((users[i]['id_user'], users[j]['id_user']))
+        remaining = 1.0
+        for _, _, weight in reasons:
+            remaining *= 1.0 - weight
+        links.append({
+            "source": source,
+            "target": target,
+            "type": GENERATED_LINK_TYPE,
+            "weight": round(1.0 - remaining, 4),
+            "reasons": [reason for reason, _, _ in reasons],
+            "rule_ids": sorted({rule_id for _, rule_ids, _ in reasons for rule_id in rule_ids}),
+        })
+    return links
+
+async def generate_links_service() -> Dict[str, Any]:
+    """
+    Generates links between users from shared and similar attributes, upserts
+    them into MongoDB in batches and adds them to the in-memory graph.
+    """
+    db = services.db
+    projection = {"_id": 0, "id_user": 1, "nama_lengkap": 1, "address": 1, "phone_number": 1, "address_zip": 1}
+    graph_rules = list(db.graph_rules.find())
+    for rule in graph_rules:
+        if rule.get('operator') == "equal" and rule.get('value') is None:
+            projection[rule['field1']] = 1
+            if rule.get('field2'):
+                projection[rule['field2']] = 1
+    users = list(db.users.find({}, projection))
+
+    links = build_links(users, graph_rules, GRAPH_BLOCKING_MAX_BUCKET_SIZE, GRAPH_ENTITY_LINK_MAX_GROUP, GRAPH_LINK_MAX_EXACT_GROUP)
+
+    for start in range(0, len(links), LINK_BATCH_SIZE):
+        db.links.bulk_write(_generated_link_upserts(db, links[start:start + LINK_BATCH_SIZE]), ordered=False)
+
+    for link in links:
+        graph.add_edge(link['source'], link['target'], weight=link['weight'], type=link['type'], reasons=link['reasons'], rule_ids=link['rule_ids'])
+    graph_changelog.record(db, [{"op": "add_edge", "source": link['source'], "target": link['target'], "weight": link['weight']} for link in links])
+    # One BFS is cheaper than repairing the distance index edge by edge
+    fraud_distance.rebuild(graph, fraud_user_ids)
+    contact_probability.mark_changed()
+    _refresh_link_clusters(links)
+
+    logger.info(f"Generated {len(links)} links for {len(users)} users")
+    return {"message": f"Links generated successfully: {len(links)} links"}
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from common.config import GRAPH_SNAPSHOT_DIR, GRAPH_SNAPSHOT_INTERVAL
+from .. import services
+from ..services import graph, fraud_distance, fraud_user_ids, graph_changelog, contact_probability, cluster_index, entity_graph
+from ..algorithms.cluster_index import CLUSTER_SNAPSHOT_ARRAYS
+from ..algorithms.entity_graph import ENTITY_SNAPSHOT_ARRAYS
+from ..snapshot import acquire_writer_lock, current_snapshot_seq, load_snapshot, load_snapshot_arrays, prune_snapshots, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Lock file held open while this process is the shared-graph writer
+_writer_lock = None
+
+async def write_graph_snapshot_service() -> Dict[str, Any]:
+    """
+    Writes a memory-mappable snapshot of the compact graph, the cluster
+    index and the entity graph. Changes logged by other workers are replayed first, so the
+    snapshot is complete up to its changelog seq; older snapshots and the
+    changelog entries no remaining snapshot needs are then dropped.
+    """
+    if not graph_changelog.enabled:
+        raise HTTPException(status_code=400, detail="Graph snapshots require GRAPH_BACKEND=compact and GRAPH_SNAPSHOT_DIR")
+    db = services.db
+    if graph_changelog.replay(db, graph, fraud_user_ids, fraud_distance, cluster_index, entity_graph):
+        contact_probability.mark_changed()
+
+    seq = graph_changelog.applied_seq
+    ids, indptr, indices, weights = graph.to_arrays()
+    position = {node: i for i, node in enumerate(ids)}
+    arrays = {**cluster_index.to_arrays(position), **entity_graph.to_arrays(position)}
+    path = await asyncio.to_thread(write_snapshot, GRAPH_SNAPSHOT_DIR, ids, indptr, indices, weights, seq, arrays)
+
+    graph_changelog.snapshot_seq = seq
+
+    oldest_seq = prune_snapshots(GRAPH_SNAPSHOT_DIR)
+    if oldest_seq is not None:
+        graph_changelog.truncate(db, oldest_seq)
+    logger.info(f"Wrote graph snapshot {path} ({len(ids)} nodes, seq {seq})")
+    return {"message": "Graph snapshot written successfully", "path": path, "seq": seq, "nodes": len(ids)}
+
+async def run_periodic_snapshots(interval: float) -> None:
+    """Writes a snapshot every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await write_graph_snapshot_service()
+        except Exception:
+            logger.exception("Failed to write graph snapshot")
+
+def resolve_worker_role(role: str) -> str:
+    """
+    Resolves GRAPH_WORKER_ROLE for this process to "standalone", "writer" or
+    "reader". Sharing needs snapshots, and only one process can hold the
+    writer lock on the snapshot directory; the others become readers.
+    """
+    global _writer_lock
+    if role not in ("writer", "reader", "auto"):
+        return "standalone"
+    if not graph_changelog.enabled:
+        logger.warning(f"GRAPH_WORKER_ROLE={role} requires GRAPH_BACKEND=compact and GRAPH_SNAPSHOT_DIR; running standalone")
+        return "standalone"
+    if role == "reader":
+        return role
+    _writer_lock = _writer_lock or acquire_writer_lock(GRAPH_SNAPSHOT_DIR)
+    if _writer_lock is None:
+        if role == "writer":
+            logger.warning("Another process holds the graph writer lock; running as a reader")
+        return "reader"
+    return "writer"
+
+def attach_snapshot(directory: str, graph, changelog, fraud_user_ids: set, db, fraud_distance=None, cluster_index=None, entity_graph=None) -> bool:
+    """
+    Maps the latest published snapshot in place of the graph if it is newer
+    than the one attached, then replays the changelog after it. Returns
+    whether the graph changed. `fraud_distance`, if given, is rebuilt when a
+    snapshot is mapped and updated change by change otherwise. A
+    `cluster_index` and an `entity_graph` are loaded from the snapshot (if
+    stored there) and follow the changelog's cluster and entity entries.
+    """
+    seq = current_snapshot_seq(directory)
+    if seq is not None and seq > changelog.snapshot_seq:
+        snapshot = load_snapshot(directory)
+        if snapshot is not None:
+            ids, indptr, indices, weights, seq = snapshot
+            graph.load_arrays(ids, indptr, indices, weights)
+            changelog.snapshot_seq = changelog.applied_seq = seq
+            # Fraud flags are not part of the snapshot
+            fraud_user_ids.clear()
+            fraud_user_ids.update(user['id_user'] for user in db.users.find({"is_fraud": True}, {"id_user": 1, "_id": 0}))
+            if cluster_index is not None:
+                arrays = load_snapshot_arrays(directory, seq, CLUSTER_SNAPSHOT_ARRAYS)
+                if arrays is not None:
+                    cluster_index.load_arrays(ids, arrays)
+            if entity_graph is not None:
+                arrays = load_snapshot_arrays(directory, seq, ENTITY_SNAPSHOT_ARRAYS)
+                if arrays is not None:
+                    entity_graph.load_arrays(ids, arrays)
+            changelog.replay(db, graph, fraud_user_ids, cluster_index=cluster_index, entity_graph=entity_graph)
+            if fraud_distance is not None:
+                fraud_distance.rebuild(graph, fraud_user_ids)
+            logger.info(f"Attached graph snapshot seq {seq} ({len(ids)} nodes)")
+            return True
+    return changelog.replay(db, graph, fraud_user_ids, fraud_distance, cluster_index, entity_graph) > 0
+
+def sync_graph_service() -> bool:
+    """Brings this worker's graph up to date with the published snapshot and the changelog."""
+    if attach_snapshot(GRAPH_SNAPSHOT_DIR, graph, graph_changelog, fraud_user_ids, services.db, fraud_distance, cluster_index, entity_graph):
+        contact_probability.mark_changed()
+        return True
+    return False
+
+def _publish_due(last_published: Optional[float]) -> bool:
+    published_seq = current_snapshot_seq(GRAPH_SNAPSHOT_DIR)
+    if published_seq is None:
+        return True
+    if last_published is not None and time.monotonic() - last_published < GRAPH_SNAPSHOT_INTERVAL:
+        return False
+    return graph_changelog.current_seq(services.db) > published_seq
+
+async def run_shared_graph(role: str, interval: float) -> None:
+    """
+    Keeps a shared-graph worker in sync every `interval` seconds until cancelled.
+    Every worker tails the changelog, so writes made through any of them show
+    up everywhere; the writer also publishes a new snapshot version every
+    GRAPH_SNAPSHOT_INTERVAL seconds while there are changes, and readers swap
+    to it, sharing its pages instead of growing their own overlay.
+    """
+    last_published = None
+    while True:
+        try:
+            if role == "writer" and _publish_due(last_published):
+                await write_graph_snapshot_service()
+                last_published = time.monotonic()
+            else:
+                sync_graph_service()
+        except Exception:
+            logger.exception("Failed to sync the shared graph")
+        await asyncio.sleep(interval)
@@ -1,76 +1,107 @@
 from fastapi import HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-from ..services import db, graph
-from .graph_rule_service import apply_graph_rule_single
-async def analyze_transaction_service(transaction_data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Analyzes the transaction data using graph theory.
-    """
-    user_id = transaction_data.get('id_user')
-
-    if not user_id:
-        raise HTTPException(status_code=400, detail="Missing 'id_user' in transaction data")
-
-    # Get the list of fraudulent user IDs from the database
-    fraud_users = list(db.users.find({"is_fraud": True}))
-    fraud_user_ids = [user['id_user'] for user in fraud_users]
-
-    if user_id not in graph:
-         raise HTTPException(status_code=404, detail=f"User ID {user_id} not found in the graph.")
-
-    # Calculate the shortest path to any fraudster
-    shortest_path_length = float('inf')
-    closest_fraudster = None
+from .. import services
+from ..services import graph, fraud_distance, fraud_user_ids, contact_probability, cluster_index
+from ..algorithms.compiled_rules import CompiledRule
 
-    for fraud_user_id in fraud_user_ids:
-        if fraud_user_id in graph:
-            try:
-                path_length = nx.shortest_path_length(graph, source=user_id, target=fraud_user_id)
-                if path_length < shortest_path_length:
-                    shortest_path_length = path_length
-                    closest_fraudster = fraud_user_id
-            except nx.NetworkXNoPath:
-                # No path to this fraudulent user
-                pass
+# Largest number of users accepted by one /analyze/batch request
+MAX_ANALYZE_BATCH_SIZE = 10000
 
-    # Calculate a proximity score based on the shortest path length
-    # A smaller path length means higher risk/proximity
-    proximity_score = 1.0 / (shortest_path_length + 1) if shortest_path_length != float('inf') else 0.0 # Add 1 to avoid division by zero
-
-    # You could also consider the number of linked nodes and their fraud status
-    linked_nodes = list(graph.neighbors(user_id))
-    linked_fraud_count = sum(1 for node_id in linked_nodes if node_id in fraud_user_ids)
-
-    # Apply graph rules to the transaction and user
+def _triggered_rules(transaction_data: Dict[str, Any], user_data: Optional[Dict[str, Any]], graph_rules: List[CompiledRule]) -> List[str]:
+    """
+    Applies graph rules to the transaction and user and returns the names of the satisfied ones.
+    """
     triggered_rules = []
-    graph_rules = list(db.graph_rules.find())
-    user_data = db.users.find_one({"id_user": user_id}) # Fetch user data for rule application
-
     if user_data:
         # Apply rules that check transaction data or user data
         for rule in graph_rules:
             # Simple rule application logic - needs refinement based on actual rule structure
             # Assuming rules can check fields in transaction_data or user_data
             rule_satisfied = False
-            if rule.get('field1') in transaction_data and rule.get('value') is not None:
-                 if apply_graph_rule_single(transaction_data, rule):
+            if rule.field1 in transaction_data and rule.value is not None:
+                 if rule.match_values(transaction_data[rule.field1], rule.value):
                      rule_satisfied = True
-            elif rule.get('field1') in user_data and rule.get('value') is not None:
-                 if apply_graph_rule_single(user_data, rule):
+            elif rule.field1 in user_data and rule.value is not None:
+                 if rule.match_values(user_data[rule.field1], rule.value):
                      rule_satisfied = True
             # Add logic for rules comparing two fields within transaction_data or user_data, or between them
 
             if rule_satisfied:
-                triggered_rules.append(rule['name'])
+                triggered_rules.append(rule.rule['name'])
+    return triggered_rules
+
+def _analyze_user(user_id: str, transaction_data: Dict[str, Any], user_data: Optional[Dict[str, Any]], graph_rules: List[CompiledRule]) -> Dict[str, Any]:
+    """
+    Scores one user already known to be in the graph against the precomputed indexes.
+    """
+    # Look up the shortest path to any fraudster in the precomputed index
+    path_length, closest_fraudster = fraud_distance.lookup(user_id)
+    shortest_path_length = path_length if path_length is not None else float('inf')
 
+    # Calculate a proximity score based on the shortest path length
+    # A smaller path length means higher risk/proximity
+    proximity_score = 1.0 / (shortest_path_length + 1) if shortest_path_length != float('inf') else 0.0 # Add 1 to avoid division by zero
+
+    # You could also consider the number of linked nodes and their fraud status
+    linked_nodes = list(graph.neighbors(user_id))
+    linked_fraud_count = sum(1 for node_id in linked_nodes if node_id in fraud_user_ids)
 
     return {
         "user_id": user_id,
         "proximity_score": proximity_score,
+        # Random-walk probability of reaching a fraudster; None until the background job has run
+        "probability_contact_with_fraud": contact_probability.lookup(user_id),
         "shortest_path_length_to_fraudster": shortest_path_length if shortest_path_length != float('inf') else "No path",
         "closest_fraudster": closest_fraudster,
         "linked_fraud_count": linked_fraud_count,
         "total_linked_nodes": len(linked_nodes),
-        "triggered_rules": triggered_rules # Add triggered rules to the response
-    }
\ No newline at end of file
+        # Precomputed size and fraud density of the user's cluster; None if it is in none
+        "cluster": cluster_index.lookup(user_id),
+        "triggered_rules": _triggered_rules(transaction_data, user_data, graph_rules) # Add triggered rules to the response
+    }
+
+async def analyze_transaction_service(transaction_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Analyzes the transaction data using graph theory.
+    """
+    user_id = transaction_data.get('id_user')
+
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing 'id_user' in transaction data")
+
+    if user_id not in graph:
+         raise HTTPException(status_code=404, detail=f"User ID {user_id} not found in the graph.")
+
+    graph_rules = [CompiledRule(rule) for rule in services.db.graph_rules.find()]
+    user_data = services.db.users.find_one({"id_user": user_id}) # Fetch user data for rule application
+    return _analyze_user(user_id, transaction_data, user_data, graph_rules)
+
+async def analyze_transactions_batch_service(transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Analyzes many transactions at once. The graph rules and the user documents
+    are read with one query each for the whole batch, and distances come from
+    the shared distance-to-fraud index. Results keep the request order; users
+    that are missing or unknown get an "error" entry instead of failing the batch.
+    """
+    if len(transactions) > MAX_ANALYZE_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds the maximum of {MAX_ANALYZE_BATCH_SIZE}")
+
+    user_ids = {transaction.get('id_user') for transaction in transactions if transaction.get('id_user') in graph}
+    graph_rules = list(services.db.graph_rules.find())
+    # Only rules with a fixed value are applied to user documents, so only fetch their fields
+    projection = {"_id": 0, "id_user": 1}
+    projection.update({rule['field1']: 1 for rule in graph_rules if rule.get('value') is not None and rule.get('field1')})
+    compiled_rules = [CompiledRule(rule) for rule in graph_rules]
+    users = {user['id_user']: user for user in services.db.users.find({"id_user": {"$in": list(user_ids)}}, projection)} if user_ids else {}
+
+    results = []
+    for transaction in transactions:
+        user_id = transaction.get('id_user')
+        if not user_id:
+            results.append({"user_id": None, "error": "Missing 'id_user' in transaction data"})
+        elif user_id not in graph:
+            results.append({"user_id": user_id, "error": f"User ID {user_id} not found in the graph."})
+        else:
+            results.append(_analyze_user(user_id, transaction, users.get(user_id), compiled_rules))
+    return {"results": results}
@@ -1,15 +1,24 @@
 from fastapi import HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from ..models import UserNode
 from bson.objectid import ObjectId
-from ..services import db, graph
-from .cluster_service import cluster_nodes_service
+from common.repository import update_one_and_fetch, delete_one_and_fetch
+from ..services import db, graph, fraud_distance, fraud_user_ids, graph_changelog, contact_probability
+from .cluster_service import cluster_new_user_service, recluster_removed_user_service, recluster_updated_user_service, refresh_cluster_stats
+from .entity_service import index_user_entities, remove_user_entities
+from ..algorithms.neighborhood import bounded_neighborhood
+
+# Limits for GET /users/{id}/neighborhood
+NEIGHBORHOOD_MAX_DEPTH = 4
+NEIGHBORHOOD_MAX_PER_LEVEL = 1000
+NEIGHBORHOOD_MAX_NODES = 5000
+NEIGHBORHOOD_MAX_DEGREE = 1000
 
 async def create_user_service(user: UserNode, db) -> Dict[str, Any]:
     """
     Creates a new user node in the graph and MongoDB.
     """
-    user_data = user.model_dump(by_alias=True)  # Use by_alias=True to get the dictionary with the alias name
+    user_data = user.model_dump(by_alias=True, exclude={"id"})  # Let MongoDB assign _id
     # Ensure id_user is unique
     if db.users.find_one({"id_user": user_data["id_user"]}):
         raise HTTPException(status_code=400, detail="User with this ID already exists")
@@ -20,9 +29,15 @@ async def create_user_service(user: UserNode, db) -> Dict[str, Any]:
         new_user['_id'] = str(new_user['_id'])
 
     node_id = new_user['id_user']
-    graph.add_node(node_id, **new_user)
-    # Trigger clustering after adding a new user
-    await cluster_nodes_service()
+    graph.add_node(node_id)
+    if new_user.get('is_fraud'):
+        fraud_user_ids.add(node_id)
+        fraud_distance.add_seed(graph, node_id)
+        contact_probability.mark_changed()
+    graph_changelog.record(db, [{"op": "add_node", "node": node_id}, {"op": "set_fraud", "node": node_id, "is_fraud": bool(new_user.get('is_fraud'))}])
+    index_user_entities(new_user)
+    # Cluster the new user incrementally; the full rebuild stays on POST /cluster_nodes/
+    await cluster_new_user_service(new_user)
     # Convert ObjectId to string for response and rename _id to id
     if new_user and '_id' in new_user:
         new_user['id'] = str(new_user.pop('_id'))
@@ -46,24 +61,28 @@ async def update_user_service(user_id: str, user: UserNode, db) -> Dict[str, Any
     """
     user_data = user.model_dump(by_alias=True, exclude_unset=True) # Use by_alias=True and exclude_unset=True
     user_data.pop("id", None) # Remove id from user_data to prevent updating _id
-    result = db.users.update_one({"id_user": user_id}, {"$set": user_data})
-    if result.modified_count == 0:
-        # Check if the user exists with the given ID but no changes were made
-        user_exists = db.users.find_one({"id_user": user_id})
-        if user_exists is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        # If user exists but no changes, return the existing user
-        updated_user = db.users.find_one({"id_user": user_id})
-    else:
-        updated_user = db.users.find_one({"id_user": user_id}) # Fetch the updated document
+    user_data.pop("_id", None)
+    was_fraud = user_id in fraud_user_ids
+    updated_user = update_one_and_fetch(db.users, {"id_user": user_id}, user_data)
+    if updated_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    # Update the node in the graph
-    if user_id in graph and updated_user:
-        # Ensure _id is not added to graph node attributes as ObjectId
-        updated_user_for_graph = updated_user.copy()
-        if '_id' in updated_user_for_graph:
-            del updated_user_for_graph['_id']
-        graph.nodes[user_id].update(updated_user_for_graph)
+    # Keep the fraud set and distance-to-fraud index in sync when a user is flagged or cleared
+    is_fraud = bool(updated_user.get('is_fraud'))
+    if is_fraud and not was_fraud:
+        fraud_user_ids.add(user_id)
+        fraud_distance.add_seed(graph, user_id)
+    elif was_fraud and not is_fraud:
+        fraud_user_ids.discard(user_id)
+        fraud_distance.remove_seed(graph, user_id)
+    if is_fraud != was_fraud:
+        contact_probability.mark_changed()
+        graph_changelog.record(db, [{"op": "set_fraud", "node": user_id, "is_fraud": is_fraud}])
+        refresh_cluster_stats([user_id])
+    index_user_entities(updated_user)
+
+    # Changed attributes can split or merge the user's cluster
+    await recluster_updated_user_service(updated_user)
 
     # Convert ObjectId to string for response and rename _id to id
     if updated_user and '_id' in updated_user:
@@ -74,16 +93,49 @@ async def delete_user_service(user_id: str, db) -> Dict[str, Any]:
     """
     Deletes a user node by ID from MongoDB and the graph.
     """
-    result = db.users.delete_one({"id_user": user_id})
-    if result.deleted_count == 0:
+    deleted_user = delete_one_and_fetch(db.users, {"id_user": user_id})
+    if deleted_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    # Remove the node from the graph
+    fraud_user_ids.discard(user_id)
+    # Remove the node (and its edges) from the graph
     if user_id in graph:
+        neighbors = list(graph.neighbors(user_id))
         graph.remove_node(user_id)
+        fraud_distance.remove_node(graph, user_id, neighbors)
+        contact_probability.mark_changed()
+    graph_changelog.record(db, [{"op": "remove_node", "node": user_id}])
     # Also remove any links associated with this user
     db.links.delete_many({"$or": [{"source": user_id}, {"target": user_id}]})
-    # Remove edges from the graph
-    edges_to_remove = list(graph.edges(user_id))
-    graph.remove_edges_from(edges_to_remove)
+    await recluster_removed_user_service(user_id)
+    remove_user_entities(user_id)
+
+    return {"message": "User deleted successfully"}
 
-    return {"message": "User deleted successfully"}
\ No newline at end of file
+async def get_user_neighborhood_service(user_id: str, depth: int, max_per_level: int = NEIGHBORHOOD_MAX_PER_LEVEL, max_nodes: int = NEIGHBORHOOD_MAX_NODES, max_degree: Optional[int] = NEIGHBORHOOD_MAX_DEGREE, stop_at_fraud: bool = False) -> Dict[str, Any]:
+    """
+    Returns the users within `depth` hops of a user with their hop distance,
+    using a bounded BFS that caps fan-out and skips supernodes.
+    """
+    if user_id not in graph:
+        raise HTTPException(status_code=404, detail="User not found")
+    neighborhood = bounded_neighborhood(
+        graph,
+        user_id,
+        depth,
+        max_per_level=max_per_level,
+        max_nodes=max_nodes,
+        max_degree=max_degree,
+        stop_at=fraud_user_ids if stop_at_fraud else None,
+    )
+    found = neighborhood["found"]
+    return {
+        "user_id": user_id,
+        "depth": depth,
+        "nodes": [
+            {"id_user": node_id, "hops": hops, "is_fraud": node_id in fraud_user_ids}
+            for node_id, hops in neighborhood["distances"].items() if node_id != user_id
+        ],
+        "nearest_fraudster": {"id_user": found[0], "hops": found[1]} if found else None,
+        "truncated": neighborhood["truncated"],
+        "skipped_supernodes": neighborhood["skipped_supernodes"],
+    }
@@ -0,0 +1,136 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import IO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+CURRENT_POINTER = "CURRENT"
+SNAPSHOT_PREFIX = "snapshot-"
+WRITER_LOCK = "WRITER.lock"
+
+
+def _snapshot_name(seq: int) -> str:
+    return f"{SNAPSHOT_PREFIX}{seq:020d}"
+
+
+def write_snapshot(directory: str, ids: List[str], indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, seq: int, arrays: Optional[Dict[str, np.ndarray]] = None) -> str:
+    """
+    Writes CSR arrays, the node ID map and the changelog high-water mark as
+    .npy files into a new snapshot directory, then atomically points CURRENT
+    at it. Returns the snapshot path. `arrays` are extra named arrays (e.g.
+    the derived indexes) stored as of the same seq; see load_snapshot_arrays.
+    """
+    os.makedirs(directory, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=directory)
+    try:
+        np.save(os.path.join(staging, "ids.npy"), np.array(ids, dtype=str) if ids else np.empty(0, dtype="<U1"))
+        np.save(os.path.join(staging, "indptr.npy"), np.ascontiguousarray(indptr, dtype=np.int64))
+        np.save(os.path.join(staging, "indices.npy"), np.ascontiguousarray(indices, dtype=np.int32))
+        np.save(os.path.join(staging, "weights.npy"), np.ascontiguousarray(weights, dtype=np.float32))
+        for name, array in (arrays or {}).items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+        with open(os.path.join(staging, "meta.json"), "w") as meta:
+            json.dump({"version": SNAPSHOT_FORMAT_VERSION, "seq": seq, "nodes": len(ids), "edges": len(indices) // 2, "created_at": time.time()}, meta)
+
+        name = _snapshot_name(seq)
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            shutil.rmtree(staging)
+        else:
+            os.rename(staging, path)
+
+        pointer = os.path.join(directory, f".{CURRENT_POINTER}.{os.getpid()}")
+        with open(pointer, "w") as current:
+            current.write(name)
+        os.replace(pointer, os.path.join(directory, CURRENT_POINTER))
+        return path
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def load_snapshot(directory: str) -> Optional[Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, int]]:
+    """
+    Memory-maps the current snapshot and returns (ids, indptr, indices, weights, seq),
+    or None if there is no usable snapshot. The edge arrays are mapped
+    copy-on-write, so every worker on the host shares the same page cache.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_POINTER)) as current:
+            path = os.path.join(directory, current.read().strip())
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != SNAPSHOT_FORMAT_VERSION:
+        logger.warning(f"Ignoring snapshot {path} with format version {meta.get('version')}")
+        return None
+
+    try:
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r").tolist()
+        indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="c")
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="c")
+        weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="c")
+    except OSError:
+        # Pruned by the writer between reading CURRENT and mapping it
+        return None
+    return ids, indptr, indices, weights, meta["seq"]
+
+
+def load_snapshot_arrays(directory: str, seq: int, names: Iterable[str]) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Loads extra arrays written with the snapshot of `seq`, or returns None if
+    any of them is missing (a snapshot written without them, or one pruned
+    in the meantime).
+    """
+    path = os.path.join(directory, _snapshot_name(seq))
+    try:
+        return {name: np.load(os.path.join(path, f"{name}.npy")) for name in names}
+    except OSError:
+        return None
+
+
+def current_snapshot_seq(directory: str) -> Optional[int]:
+    """Returns the seq of the snapshot CURRENT points at without mapping it, or None."""
+    try:
+        with open(os.path.join(directory, CURRENT_POINTER)) as current:
+            name = current.read().strip()
+    except OSError:
+        return None
+    return int(name[len(SNAPSHOT_PREFIX):]) if name.startswith(SNAPSHOT_PREFIX) else None
+
+
+def acquire_writer_lock(directory: str) -> Optional[IO]:
+    """
+    Takes the exclusive writer lock on a snapshot directory without blocking.
+    Returns the open lock file, which holds the lock until it is closed or the
+    process exits, or None if another process is the writer.
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock = open(os.path.join(directory, WRITER_LOCK), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return None
+    return lock
+
+
+def prune_snapshots(directory: str, keep: int = 2) -> Optional[int]:
+    """
+    Deletes all but the newest `keep` snapshots and returns the oldest kept
+    snapshot's seq (changelog entries up to it are no longer needed).
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith(SNAPSHOT_PREFIX))
+    for name in names[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    kept = names[-keep:]
+    return int(kept[0][len(SNAPSHOT_PREFIX):]) if kept else None
@@ -3,37 +3,66 @@ import mongomock
 from graph_service.models import UserNode, GraphRule, Link, Cluster
 from unittest.mock import patch
 import asyncio
+from graph_service import services
 from graph_service.services import initialize_graph_db
+from graph_service.services.link_service import link_key
 
 import os
 
-client = mongomock.MongoClient()
-db = client['fraud_detection']
+FRAUD_USER = {
+    "id_user": "fraud_user",
+    "nama_lengkap": "Fraud User",
+    "email": "fraud@example.com",
+    "domain_email": "example.com",
+    "address": "Fraud Address",
+    "address_zip": "12345",
+    "address_city": "Fraud City",
+    "address_province": "Fraud Province",
+    "address_kecamatan": "Fraud Kecamatan",
+    "phone_number": "081234567890",
+    "is_fraud": True
+}
 
 @pytest.fixture
-async def mock_db():
+def reset_services(monkeypatch):
+    """Restores the module-level graph state in graph_service.services after the test."""
+    changelog = services.graph_changelog
+    monkeypatch.setattr(services, "db", services.db)
+    for name in ("enabled", "applied_seq", "snapshot_seq", "_gap_after", "_gap_since"):
+        monkeypatch.setattr(changelog, name, getattr(changelog, name))
+    yield
+    # Reload from an empty database so the next test starts without nodes, clusters or entities
+    changelog.enabled = False
+    asyncio.run(initialize_graph_db(mongomock.MongoClient()['fraud_detection']))
+
+@pytest.fixture
+def mock_db(reset_services):
+    # A fresh database per test, so documents seeded by one test never leak into the next
+    db = mongomock.MongoClient()['fraud_detection']
     # Create collections
-    if 'users' not in db.list_collection_names():
-        db.create_collection('users')
-    if 'links' not in db.list_collection_names():
-        db.create_collection('links')
-    if 'clusters' not in db.list_collection_names():
-        db.create_collection('clusters')
+    for name in ('users', 'links', 'clusters'):
+        db.create_collection(name)
     # Seed the database with a fraud user
-    if db.users.count_documents({"id_user": "fraud_user"}) == 0:
-        db.users.insert_one({
-            "id_user": "fraud_user",
-            "nama_lengkap": "Fraud User",
-            "email": "fraud@example.com",
-            "domain_email": "example.com",
-            "address": "Fraud Address",
-            "address_zip": "12345",
-            "address_city": "Fraud City",
-            "address_province": "Fraud Province",
-            "address_kecamatan": "Fraud Kecamatan",
-            "phone_number": "081234567890",
-            "is_fraud": True
-        })
-    await initialize_graph_db(db)
+    db.users.insert_one(dict(FRAUD_USER))
+    asyncio.run(initialize_graph_db(db))
     os.environ["TESTING"] = "True"
-    return db
\ No newline at end of file
+    return db
+
+@pytest.fixture
+def seed_graph(mock_db):
+    """
+    Inserts a scenario into mock_db and reloads the graph services from it,
+    like a restart: seed_graph(users=[...], links=[...], clusters=[...], ...)
+    with one keyword per collection. Links get the canonical node_a/node_b
+    keys the link service writes. Called without documents it only reloads.
+    Returns mock_db.
+    """
+    def seed(**collections):
+        for name, documents in collections.items():
+            # Copies, so shared scenario constants never pick up an _id
+            documents = [{**link_key(document['source'], document['target']), **document} if name == "links" else dict(document) for document in documents]
+            if documents:
+                mock_db[name].insert_many(documents)
+        asyncio.run(initialize_graph_db(mock_db))
+        return mock_db
+    return seed
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from graph_service.main import app
+
+USERS = [
+    {"id_user": "fraudster", "is_fraud": True, "address_city": "Bandung"},
+    {"id_user": "friend", "is_fraud": False, "address_city": "Bandung"},
+    {"id_user": "stranger", "is_fraud": False, "address_city": "Jakarta"},
+]
+LINKS = [{"source": "fraudster", "target": "friend", "type": "test_link", "weight": 1.0}]
+GRAPH_RULES = [{"name": "bandung", "description": "d", "field1": "address_city", "operator": "equal", "value": "Bandung"}]
+
+
+def test_analyze_batch_matches_single_analysis(seed_graph):
+    seed_graph(users=USERS, links=LINKS, graph_rules=GRAPH_RULES)
+    client = TestClient(app)
+    transactions = [{"id_user": "friend"}, {"id_user": "stranger"}, {"id_user": "ghost"}, {"amount": 10}]
+
+    response = client.post("/analyze/batch", json=transactions)
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert results[0] == client.post("/analyze", json=transactions[0]).json()
+    assert results[0]["closest_fraudster"] == "fraudster"
+    assert results[0]["linked_fraud_count"] == 1
+    assert results[0]["triggered_rules"] == ["bandung"]
+    assert results[1] == client.post("/analyze", json=transactions[1]).json()
+    assert results[1]["shortest_path_length_to_fraudster"] == "No path"
+    assert results[2] == {"user_id": "ghost", "error": "User ID ghost not found in the graph."}
+    assert results[3]["error"] == "Missing 'id_user' in transaction data"
@@ -0,0 +1,136 @@
+import asyncio
+import networkx as nx
+from fastapi.testclient import TestClient
+from graph_service.algorithms.cluster_index import ClusterIndex, cluster_stats
+from graph_service.algorithms.csr import CompactGraph
+from graph_service.algorithms.entity_graph import EntityGraph
+from graph_service.main import app
+from graph_service.models import UserNode
+from graph_service import services
+from graph_service.services.user_service import delete_user_service, update_user_service
+from graph_service.snapshot import write_snapshot
+
+
+def user(user_id, zip_code, is_fraud=False):
+    return {
+        "id_user": user_id, "nama_lengkap": user_id, "email": f"{user_id}@x.id", "domain_email": "x.id",
+        "address": "Jl. Mawar", "address_zip": zip_code, "address_city": "Bandung", "address_province": "Jawa Barat",
+        "address_kecamatan": "Coblong", "phone_number": user_id, "is_fraud": is_fraud,
+    }
+
+
+USERS = [user("a", "1", is_fraud=True), user("b", "1"), user("c", "1"), user("d", "2")]
+LINKS = [
+    {"source": source, "target": target, "type": "t", "weight": weight}
+    for source, target, weight in [("a", "b", 0.5), ("b", "c", 0.25), ("c", "d", 1.0)]
+]
+GRAPH_RULES = [{"name": "same zip", "description": "", "field1": "address_zip", "operator": "equal", "field2": "address_zip"}]
+
+
+def test_cluster_stats_counts_fraud_and_internal_link_weight():
+    graph = nx.Graph()
+    graph.add_edge("a", "b", weight=0.5)
+    graph.add_edge("b", "c", weight=0.25)
+    graph.add_edge("c", "d", weight=1.0)
+    assert cluster_stats(graph, ["a", "b", "c"], {"a", "d"}) == {"size": 3, "fraud_count": 1, "fraud_ratio": 1 / 3, "total_link_weight": 0.75}
+
+    index = ClusterIndex()
+    index.set_cluster("k", ["a", "b"], {"members": ["a", "b"], "size": 2, "fraud_count": 0, "fraud_ratio": 0.0, "total_link_weight": 0.5})
+    assert index.lookup("a") == {"cluster_id": "k", "size": 2, "fraud_count": 0, "fraud_ratio": 0.0, "total_link_weight": 0.5}
+    assert index.same_cluster("a", "b") and not index.same_cluster("a", "c")
+    index.remove_cluster("k")
+    assert index.lookup("a") is None
+
+
+def test_clusters_carry_stats_and_analyze_reads_them(seed_graph):
+    db = seed_graph(users=USERS, links=LINKS, graph_rules=GRAPH_RULES)
+    client = TestClient(app)
+    assert client.post("/cluster_nodes/").status_code == 200
+
+    stored = db.clusters.find_one()
+    assert (stored["size"], stored["fraud_count"], stored["total_link_weight"]) == (3, 1, 0.75)
+    cluster = client.get(f"/clusters/{stored['_id']}").json()
+    assert cluster["cluster_id"] == str(stored["_id"]) and cluster["fraud_ratio"] == 1 / 3
+
+    result = client.post("/analyze", json={"id_user": "c"}).json()
+    assert result["cluster"] == {"cluster_id": str(stored["_id"]), "size": 3, "fraud_count": 1, "fraud_ratio": 1 / 3, "total_link_weight": 0.75}
+    assert client.post("/analyze", json={"id_user": "d"}).json()["cluster"] is None
+
+
+def test_stats_follow_fraud_flags_links_and_deletes(seed_graph):
+    db = seed_graph(users=USERS, links=LINKS, graph_rules=GRAPH_RULES)
+    client = TestClient(app)
+    client.post("/cluster_nodes/")
+
+    asyncio.run(update_user_service("b", UserNode(**user("b", "1", is_fraud=True)), db))
+    assert services.cluster_index.lookup("a")["fraud_count"] == 2
+    assert db.clusters.find_one()["fraud_count"] == 2
+
+    client.post("/links/", json={"source": "a", "target": "c", "type": "t", "weight": 1.0})
+    assert db.clusters.find_one()["total_link_weight"] == 1.75
+
+    asyncio.run(delete_user_service("a", db))
+    stored = db.clusters.find_one()
+    assert sorted(stored["members"]) == ["b", "c"]
+    assert (stored["size"], stored["fraud_count"], stored["total_link_weight"]) == (2, 1, 0.25)
+
+    # Clusters written before stats were precomputed are backfilled on startup
+    db.clusters.update_one({}, {"$unset": {"size": "", "fraud_count": "", "fraud_ratio": "", "total_link_weight": ""}})
+    seed_graph()
+    assert db.clusters.find_one()["size"] == 2
+    assert services.cluster_index.lookup("b")["fraud_ratio"] == 0.5
+
+
+def test_rule_delete_removes_links_and_splits_only_affected_clusters(seed_graph):
+    db = seed_graph(users=USERS, links=LINKS, graph_rules=GRAPH_RULES)
+    phone_rule_id = db.graph_rules.insert_one({"name": "same phone", "description": "", "field1": "phone_number", "operator": "equal", "field2": "phone_number"}).inserted_id
+    db.links.update_one({"source": "c", "target": "d"}, {"$set": {"rule_ids": [str(phone_rule_id)]}})
+    seed_graph(
+        users=[{**user("e", "3"), "phone_number": "shared"}, {**user("f", "4"), "phone_number": "shared"}],
+        links=[{"source": "e", "target": "f", "type": "t", "weight": 1.0, "rule_ids": [str(phone_rule_id)]}],
+    )
+    client = TestClient(app)
+    client.post("/cluster_nodes/")
+    untouched_id = services.cluster_index.lookup("a")["cluster_id"]
+    assert services.fraud_distance.lookup("d") == (3, "a")
+
+    response = client.delete(f"/graph_rules/{phone_rule_id}")
+    assert response.json() == {"message": "Graph rule deleted successfully", "links_removed": 2, "clusters_split": 1}
+    assert not services.graph.has_edge("c", "d") and not services.graph.has_edge("e", "f")
+    assert services.fraud_distance.lookup("d") == (None, None)
+    assert services.cluster_index.lookup("e") is None
+    assert services.cluster_index.lookup("a")["cluster_id"] == untouched_id
+    assert [sorted(cluster["members"]) for cluster in db.clusters.find()] == [["a", "b", "c"]]
+
+
+def test_mixed_cluster_methods_count_as_communities():
+    stats = {"size": 2, "fraud_count": 0, "fraud_ratio": 0.0, "total_link_weight": 1.0}
+    index = ClusterIndex()
+    index.load([
+        {"_id": "k1", "members": ["a", "b"], **stats},
+        {"_id": "k2", "members": ["c", "d"], **stats},
+        {"_id": "k3", "members": ["e", "f"], "method": "louvain", **stats},
+    ], nx.Graph(), set())
+    assert index.method == "louvain" and len(index.stats) == 3
+    index.load([{"_id": "k1", "members": ["a", "b"], **stats}], nx.Graph(), set())
+    assert index.method == "rules"
+
+
+def test_boot_from_snapshot_loads_indexes_without_scanning_collections(seed_graph, tmp_path, monkeypatch):
+    graph = CompactGraph()
+    graph.add_edge("a", "b", weight=1.0)
+    position = {node: i for i, node in enumerate(graph.to_arrays()[0])}
+    clusters, entities = ClusterIndex(), EntityGraph()
+    clusters.set_cluster("k", ["a", "b"], {"size": 2, "fraud_count": 1, "fraud_ratio": 0.5, "total_link_weight": 1.0})
+    entities.add("a", ["device:d"])
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=0, arrays={**clusters.to_arrays(position), **entities.to_arrays(position)})
+
+    # Neither the clusters nor the user entities are in MongoDB, so they can only come from the snapshot
+    monkeypatch.setattr(services, "graph", CompactGraph())
+    monkeypatch.setattr(services, "GRAPH_SNAPSHOT_DIR", str(tmp_path))
+    services.graph_changelog.enabled = True
+    seed_graph(users=[user("a", "1", is_fraud=True), user("b", "2")])
+
+    assert services.cluster_index.lookup("b") == {"cluster_id": "k", "size": 2, "fraud_count": 1, "fraud_ratio": 0.5, "total_link_weight": 1.0}
+    assert services.entity_graph.entities_of == {"a": {"device:d"}}
+    assert services.fraud_user_ids == {"a", "fraud_user"}
@@ -0,0 +1,222 @@
+import random
+from graph_service.algorithms.union_find import DisjointSet
+from graph_service.services.cluster_service import cluster_users
+from graph_service.services.graph_rule_service import apply_graph_rule
+
+
+def legacy_clusters(users, graph_rules):
+    """The original pairwise clustering loop, kept as the reference implementation."""
+    clusters = {user['id_user']: {user['id_user']} for user in users}
+    for i in range(len(users)):
+        for j in range(i + 1, len(users)):
+            user1_id = users[i]['id_user']
+            user2_id = users[j]['id_user']
+            if any(user1_id in cluster and user2_id in cluster for cluster in clusters.values()):
+                continue
+            for rule in graph_rules:
+                if apply_graph_rule(users[i], users[j], rule):
+                    cluster1_id = next(c for c, members in clusters.items() if user1_id in members)
+                    cluster2_id = next(c for c, members in clusters.items() if user2_id in members)
+                    if cluster1_id != cluster2_id:
+                        clusters[cluster1_id].update(clusters[cluster2_id])
+                        del clusters[cluster2_id]
+    return {frozenset(members) for members in clusters.values() if len(members) > 1}
+
+
+def random_users(count, seed):
+    rng = random.Random(seed)
+    return [{
+        "id_user": f"user_{i}",
+        "address_zip": str(rng.randint(10000, 10030)),
+        "phone_number": f"08{rng.randint(100, 160)}",
+        "domain_email": rng.choice(["example.com", "mail.com", "fraud.com"]),
+        "age": rng.randint(18, 70),
+    } for i in range(count)]
+
+
+GRAPH_RULES = [
+    {"name": "zip", "field1": "address_zip", "field2": "address_zip", "operator": "equal"},
+    {"name": "phone", "field1": "phone_number", "field2": "phone_number", "operator": "equal"},
+    {"name": "older", "field1": "age", "field2": "age", "operator": "greater_than"},
+    {"name": "domain", "field1": "domain_email", "operator": "equal", "value": "fraud.com"},
+    {"name": "no_operand", "field1": "domain_email", "operator": "equal"},
+]
+
+
+def test_disjoint_set_union_find():
+    sets = DisjointSet(["a", "b", "c", "d"])
+    assert not sets.connected("a", "b")
+    sets.union("a", "b")
+    sets.union("c", "d")
+    assert sets.connected("a", "b")
+    assert not sets.connected("b", "c")
+    sets.union("b", "d")
+    assert sets.connected("a", "c")
+    assert sorted(map(sorted, sets.groups().values())) == [["a", "b", "c", "d"]]
+
+
+def test_cluster_users_matches_legacy_pairwise_clustering():
+    for seed, rules in [(1, GRAPH_RULES[:2]), (2, GRAPH_RULES[2:3]), (3, GRAPH_RULES[3:]), (4, GRAPH_RULES)]:
+        users = random_users(80, seed)
+        clusters = cluster_users(users, rules)
+        result = {frozenset(members) for members in clusters.groups().values() if len(members) > 1}
+        assert result == legacy_clusters(users, rules)
+
+
+def test_blocking_index_normalizes_and_caps_buckets():
+    from graph_service.algorithms.blocking import BlockingIndex
+    index = BlockingIndex(max_bucket_size=2)
+    index.add("a", " Example.COM ")
+    index.add("b", "example.com")
+    index.add("c", "example.com")
+    index.add("d", "rare.com")
+    assert index.bucket("EXAMPLE.com") == []
+    assert index.oversized_keys() == {"example.com"}
+    assert dict(index.buckets()) == {"rare.com": ["d"]}
+
+
+def test_cluster_users_skips_oversized_buckets():
+    users = [{"id_user": f"user_{i}", "domain_email": "example.com", "address_zip": str(i // 2)} for i in range(6)]
+    rules = [
+        {"name": "domain", "field1": "domain_email", "field2": "domain_email", "operator": "equal"},
+        {"name": "zip", "field1": "address_zip", "field2": "address_zip", "operator": "equal"},
+    ]
+    clusters = cluster_users(users, rules, max_bucket_size=3)
+    groups = sorted(sorted(members) for members in clusters.groups().values() if len(members) > 1)
+    assert groups == [["user_0", "user_1"], ["user_2", "user_3"], ["user_4", "user_5"]]
+
+
+def test_cluster_engine_incremental_inserts_match_full_rebuild():
+    from graph_service.services.cluster_service import ClusterEngine
+    for seed, rules in [(5, GRAPH_RULES[:2]), (6, GRAPH_RULES[2:3]), (7, GRAPH_RULES[3:]), (8, GRAPH_RULES)]:
+        users = random_users(80, seed)
+        engine = ClusterEngine()
+        engine.rebuild(users[:20], rules)
+        for user in users[20:]:
+            members, _ = engine.add(user)
+            assert user["id_user"] in members
+        result = {frozenset(members) for members in engine.members.values() if len(members) > 1}
+        assert result == legacy_clusters(users, rules)
+
+
+def test_cluster_engine_updates_and_removals_match_full_rebuild():
+    from graph_service.services.cluster_service import ClusterEngine
+    referral = {"name": "referral", "field1": "phone_number", "field2": "referrer_phone", "operator": "equal"}
+    for seed, rules in [(10, GRAPH_RULES[:2]), (11, GRAPH_RULES[2:3]), (12, GRAPH_RULES[3:]), (13, GRAPH_RULES + [referral])]:
+        rng = random.Random(seed)
+        users = random_users(60, seed)
+        for user in users:
+            user["referrer_phone"] = f"08{rng.randint(100, 160)}"
+        engine = ClusterEngine()
+        engine.rebuild(users, rules)
+        for step in range(40):
+            position = rng.randrange(len(users))
+            if step % 5 == 4:
+                removed = users.pop(position)
+                affected, groups = engine.remove(removed["id_user"])
+                assert removed["id_user"] in affected and all(removed["id_user"] not in group for group in groups)
+            else:
+                fresh = random_users(1, seed * 100 + step)[0]
+                field = rng.choice(["address_zip", "phone_number", "age", "domain_email", "referrer_phone"])
+                updated = dict(users[position], **{field: fresh.get(field, f"08{rng.randint(100, 160)}")})
+                users[position] = updated
+                affected, groups = engine.update(updated)
+                assert set(affected) == {member for group in groups for member in group}
+            result = {frozenset(members) for members in engine.members.values() if len(members) > 1}
+            assert result == legacy_clusters(users, rules)
+
+
+def test_cluster_new_user_service_updates_only_changed_clusters():
+    import asyncio
+    import mongomock
+    from graph_service import services
+    from graph_service.services.cluster_service import cluster_engine, cluster_new_user_service, cluster_nodes_service
+    previous_db = services.db
+    services.db = mongomock.MongoClient()['clustering_test']
+    try:
+        services.db.graph_rules.insert_one(GRAPH_RULES[0])
+        services.db.users.insert_many([
+            {"id_user": "a", "address_zip": "1"},
+            {"id_user": "b", "address_zip": "1"},
+            {"id_user": "c", "address_zip": "2"},
+            {"id_user": "d", "address_zip": "2"},
+        ])
+        asyncio.run(cluster_nodes_service())
+        untouched = services.db.clusters.find_one({"members": "c"})
+
+        services.db.users.insert_one({"id_user": "e", "address_zip": "1"})
+        asyncio.run(cluster_new_user_service(services.db.users.find_one({"id_user": "e"})))
+
+        clusters = {frozenset(cluster["members"]): cluster["_id"] for cluster in services.db.clusters.find()}
+        assert set(clusters) == {frozenset({"a", "b", "e"}), frozenset({"c", "d"})}
+        assert clusters[frozenset({"c", "d"})] == untouched["_id"]
+    finally:
+        cluster_engine.invalidate()
+        services.db = previous_db
+
+
+def test_user_updates_and_deletes_rewrite_only_affected_clusters():
+    import asyncio
+    import mongomock
+    from graph_service import services
+    from graph_service.services.cluster_service import cluster_engine, cluster_nodes_service, recluster_removed_user_service, recluster_updated_user_service
+    previous_db = services.db
+    services.db = mongomock.MongoClient()['clustering_update_test']
+    try:
+        services.db.graph_rules.insert_one(GRAPH_RULES[0])
+        services.db.users.insert_many([{"id_user": user_id, "address_zip": zip_code} for user_id, zip_code in [("a", "1"), ("b", "1"), ("c", "2"), ("d", "2"), ("e", "3"), ("f", "3")]])
+        asyncio.run(cluster_nodes_service())
+        ids = {frozenset(cluster["members"]): cluster["_id"] for cluster in services.db.clusters.find()}
+
+        asyncio.run(recluster_updated_user_service({"id_user": "b", "address_zip": "2"}))
+        clusters = {frozenset(cluster["members"]): cluster["_id"] for cluster in services.db.clusters.find()}
+        assert set(clusters) == {frozenset("bcd"), frozenset("ef")}
+        assert clusters[frozenset("ef")] == ids[frozenset("ef")]
+        assert not cluster_engine.stale
+
+        asyncio.run(recluster_removed_user_service("e"))
+        assert {frozenset(cluster["members"]) for cluster in services.db.clusters.find()} == {frozenset("bcd")}
+    finally:
+        cluster_engine.invalidate()
+        services.db = previous_db
+
+
+def test_compiled_rules_agree_with_apply_graph_rule():
+    from graph_service.algorithms.compiled_rules import AttributeColumns, CompiledRule
+    rng = random.Random(9)
+    users = [{
+        "id_user": f"user_{i}",
+        "city": rng.choice(["Bandung", " bandung ", "BANDUNG", "Jakarta", "", None]),
+        "address": rng.choice(["Jl. Melati 3", "jl. melati 3 blok c", "Gg. Mawar", None]),
+        "age": rng.choice([17, "25", " 40 ", "n/a", None, 63.5]),
+    } for i in range(40)]
+    rules = [
+        {"name": "city", "field1": "city", "field2": "city", "operator": "equal"},
+        {"name": "in bandung", "field1": "city", "operator": "equal", "value": "bandung"},
+        {"name": "melati", "field1": "address", "operator": "contains", "value": "MELATI"},
+        {"name": "address", "field1": "address", "field2": "address", "operator": "contains"},
+        {"name": "minor", "field1": "age", "operator": "lower_than", "value": "18"},
+        {"name": "older", "field1": "age", "field2": "age", "operator": "greater_than"},
+    ]
+    columns = AttributeColumns(users[:3])
+    # Built columns grow with appends, the number buffer past its initial capacity
+    columns.text("city")
+    columns.number("age")
+    for user in users[3:]:
+        columns.append(user)
+    assert len(columns.number("age")) == len(users)
+    for rule in rules:
+        compiled = CompiledRule(rule)
+        expected = [[apply_graph_rule(users[i], users[j], rule) for j in range(len(users))] for i in range(len(users))]
+        assert [[compiled.match(columns, i, j) for j in range(len(users))] for i in range(len(users))] == expected
+        if compiled.pairwise:
+            for i in range(len(users)):
+                assert compiled.later_matches(columns, i).tolist() == [j for j in range(i + 1, len(users)) if expected[i][j]]
+                assert compiled.earlier_matches(columns, i).tolist() == [j for j in range(i) if expected[j][i]]
+        else:
+            assert compiled.value_mask(columns).tolist() == [row[0] for row in expected]
+
+    assert apply_graph_rule({"city": " Bandung"}, {"city": "bandung "}, rules[0])
+    assert not apply_graph_rule({"city": ""}, {"city": ""}, rules[0])
+    result = {frozenset(members) for members in cluster_users(users, rules).groups().values() if len(members) > 1}
+    assert result == legacy_clusters(users, rules)
@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+from graph_service.algorithms.cluster_index import ClusterIndex
+from graph_service.algorithms.csr import CompactGraph
+from graph_service.algorithms.communities import component_groups, connected_components, detect_communities, induced_subgraph, label_propagation
+from graph_service.services import cluster_index, graph_changelog
+from graph_service.services.changelog import GraphChangelog
+from graph_service.services import community_service
+from graph_service.services.community_service import get_community_job_service, start_community_job_service
+from graph_service.services.cluster_service import cluster_new_user_service
+
+# Two tight groups chained through one weak link, plus a separate pair
+EDGES = (
+    [(a, b, 1.0) for a in "abcd" for b in "abcd" if a < b]
+    + [(a, b, 1.0) for a in "efgh" for b in "efgh" if a < b]
+    + [("d", "e", 0.1), ("x", "y", 1.0)]
+)
+
+
+def test_weak_links_do_not_chain_communities():
+    graph = CompactGraph()
+    graph.load_edges(list("abcdefghxyz"), EDGES)
+    ids, indptr, indices, weights = graph.to_arrays()
+    components = connected_components(indptr, indices)
+    assert len(set(components[:8])) == 1 and components[8] == components[9] != components[0]
+
+    labels = label_propagation(indptr, indices, weights)
+    assert len(set(labels[:4])) == 1 and len(set(labels[4:8])) == 1 and labels[0] != labels[4]
+
+    groups = component_groups(components)
+    assert [len(group) for group in groups] == [8, 2]
+    nodes = np.concatenate(groups)
+    offsets = np.array([0, 8, 10])
+    louvain_labels = detect_communities("louvain", *induced_subgraph(indptr, indices, weights, nodes), offsets)
+    assert len(set(louvain_labels)) == 3
+
+
+USERS = [{"id_user": node, "is_fraud": node == "a"} for node in "abcdefghxyz"]
+LINKS = [{"source": u, "target": v, "type": "t", "weight": w} for u, v, w in EDGES]
+
+
+def run_job(method, workers):
+    async def run():
+        job = await start_community_job_service(method, workers=workers)
+        await asyncio.gather(*community_service._job_tasks)
+        return await get_community_job_service(job["job_id"])
+    return asyncio.run(run())
+
+
+def test_community_job_replaces_clusters_with_stats(seed_graph):
+    db = seed_graph(users=USERS, links=LINKS)
+    job = run_job("label_propagation", workers=2)
+    assert (job["status"], job["progress"], job["components_total"], job["clusters"]) == ("completed", 1.0, 2, 3)
+
+    clusters = {tuple(sorted(cluster["members"])): cluster for cluster in db.clusters.find()}
+    assert set(clusters) == {("a", "b", "c", "d"), ("e", "f", "g", "h"), ("x", "y")}
+    assert (clusters[("a", "b", "c", "d")]["fraud_count"], clusters[("a", "b", "c", "d")]["total_link_weight"]) == (1, 6.0)
+    assert cluster_index.method == "label_propagation" and cluster_index.same_cluster("x", "y")
+    assert db.clusters_staging.count_documents({}) == 0
+
+    # Incremental rule clustering leaves community clusters alone
+    asyncio.run(cluster_new_user_service({"id_user": "z"}))
+    assert db.clusters.count_documents({}) == 3
+
+    # The method survives a restart
+    seed_graph()
+    assert cluster_index.method == "label_propagation" and len(cluster_index.stats) == 3
+
+    assert run_job("louvain", workers=1)["clusters"] == 3
+
+
+def test_community_job_is_published_to_other_workers(seed_graph, monkeypatch):
+    db = seed_graph(users=USERS, links=LINKS)
+    monkeypatch.setattr(graph_changelog, "enabled", True)
+    assert run_job("label_propagation", workers=1)["status"] == "completed"
+
+    reader_index = ClusterIndex()
+    assert GraphChangelog().replay(db, CompactGraph(), set(), cluster_index=reader_index) == 1
+    assert reader_index.method == "label_propagation"
+    assert reader_index.members.keys() == cluster_index.members.keys() and reader_index.same_cluster("x", "y")
@@ -0,0 +1,61 @@
+import networkx as nx
+import numpy as np
+from graph_service.algorithms.contact_probability import FraudContactIndex
+from graph_service.algorithms.csr import CompactGraph
+
+
+def csr(edges, nodes=()):
+    graph = CompactGraph()
+    graph.load_edges(nodes, edges)
+    return graph.to_arrays()
+
+
+def exact_scores(graph, seeds, restart):
+    """Solves the random walk with restart equations directly."""
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    matrix = np.eye(len(nodes))
+    rhs = np.zeros(len(nodes))
+    for node in nodes:
+        i = index[node]
+        rhs[i] = restart if node in seeds else 0.0
+        degree = sum(data["weight"] for _, _, data in graph.edges(node, data=True))
+        for _, neighbor, data in graph.edges(node, data=True):
+            matrix[i, index[neighbor]] -= (1 - restart) * data["weight"] / degree
+    return dict(zip(nodes, np.linalg.solve(matrix, rhs)))
+
+
+def test_path_graph_scores():
+    index = FraudContactIndex(restart=0.15, tolerance=1e-10)
+    index.compute(*csr([("a", "b", 1.0), ("b", "c", 1.0)], nodes=["a", "b", "c", "lonely", "lonely_fraud"]), seeds={"a", "lonely_fraud"})
+    # h[a] = 0.15 + 0.85 h[b], h[b] = 0.85 (h[a] + h[c]) / 2, h[c] = 0.85 h[b]
+    b = 0.85 * 0.15 / 2 / (1 - 0.85 * 0.85 / 2 - 0.85 * 0.85 / 2)
+    assert abs(index.lookup("b") - b) < 1e-8
+    assert abs(index.lookup("c") - 0.85 * b) < 1e-8
+    assert abs(index.lookup("a") - (0.15 + 0.85 * b)) < 1e-8
+    assert index.lookup("a") > index.lookup("b") > index.lookup("c")
+    assert index.lookup("lonely") == 0.0
+    assert index.lookup("lonely_fraud") == 1.0
+    assert index.lookup("unknown") is None
+
+
+def test_weighted_scores_match_linear_solve_and_warm_start_converges_faster():
+    graph = nx.gnm_random_graph(150, 400, seed=11)
+    rng = np.random.default_rng(11)
+    for u, v in graph.edges:
+        graph.edges[u, v]["weight"] = float(rng.uniform(0.1, 1.0))
+    arrays = csr([(u, v, data["weight"]) for u, v, data in graph.edges(data=True)], nodes=graph.nodes)
+
+    index = FraudContactIndex(restart=0.2, tolerance=1e-9)
+    cold_iterations = index.compute(*arrays, seeds={0, 1, 2})
+    for node, score in exact_scores(graph, {0, 1, 2}, 0.2).items():
+        assert abs(index.lookup(node) - score) < 1e-6
+
+    # A single reweighted link barely moves the scores
+    u, v = next(iter(graph.edges))
+    graph.edges[u, v]["weight"] *= 1.5
+    arrays = csr([(u, v, data["weight"]) for u, v, data in graph.edges(data=True)], nodes=graph.nodes)
+    warm_iterations = index.compute(*arrays, seeds={0, 1, 2})
+    for node, score in exact_scores(graph, {0, 1, 2}, 0.2).items():
+        assert abs(index.lookup(node) - score) < 1e-6
+    assert warm_iterations < cold_iterations
@@ -0,0 +1,94 @@
+import random
+import networkx as nx
+import numpy as np
+from graph_service.algorithms.csr import CompactGraph
+from graph_service.algorithms.fraud_distance import FraudDistanceIndex
+
+
+def assert_same_graph(compact, reference):
+    assert set(compact.nodes) == set(reference.nodes)
+    assert compact.number_of_edges() == reference.number_of_edges()
+    for node in reference.nodes:
+        assert sorted(compact.neighbors(node)) == sorted(reference.neighbors(node))
+    for u, v, data in reference.edges(data=True):
+        assert compact.has_edge(u, v) and compact.has_edge(v, u)
+        assert abs(compact.get_edge_data(u, v)["weight"] - data["weight"]) < 1e-6
+
+
+def test_compact_graph_matches_networkx_under_mutation():
+    rng = random.Random(7)
+    compact = CompactGraph(min_overlay=8)
+    reference = nx.Graph()
+    nodes = [f"user_{i}" for i in range(60)]
+    for node in nodes:
+        compact.add_node(node, email="ignored@example.com")
+        reference.add_node(node)
+    for step in range(600):
+        u, v = rng.sample(nodes, 2)
+        action = rng.random()
+        if action < 0.6:
+            weight = round(rng.random(), 3)
+            compact.add_edge(u, v, weight=weight, reasons=["ignored"])
+            reference.add_edge(u, v, weight=weight)
+        elif action < 0.9 and reference.has_edge(u, v):
+            compact.remove_edge(u, v)
+            reference.remove_edge(u, v)
+        elif action >= 0.98 and u in reference:
+            compact.remove_node(u)
+            reference.remove_node(u)
+            nodes.remove(u)
+        if step % 100 == 0:
+            compact.compact()
+        assert_same_graph(compact, reference)
+
+    assert compact.nodes[nodes[0]] == {}
+    assert compact.nbytes() > 0
+
+
+def test_multi_source_bfs_runs_on_arrays():
+    reference = nx.gnm_random_graph(200, 400, seed=3)
+    compact = CompactGraph()
+    compact.add_nodes_from(reference.nodes)
+    compact.add_edges_from(reference.edges)
+    compact.compact()
+    # Leave some edges in the overlay too
+    compact.add_edge(0, 199)
+    reference.add_edge(0, 199)
+
+    sources = [0, 50, 100]
+    distance, nearest = compact.multi_source_bfs(sources)
+    assert distance == nx.multi_source_dijkstra_path_length(reference, sources, weight=lambda u, v, d: 1)
+    for node, source in nearest.items():
+        assert source in sources
+        assert nx.shortest_path_length(reference, node, source) == distance[node]
+
+    index = FraudDistanceIndex()
+    index.rebuild(compact, sources)
+    assert index.distance == distance
+
+
+def test_load_edges_builds_csr_in_one_pass():
+    compact = CompactGraph()
+    compact.load_edges(["a", "b", "c", "isolated"], [("a", "b", 0.5), ("b", "a", 0.7), ("b", "c", 0.2), ("c", "new", 1.0)])
+    assert sorted(compact.nodes) == ["a", "b", "c", "isolated", "new"]
+    assert compact.number_of_edges() == 3
+    # Duplicate links in either direction keep the last weight
+    assert compact.get_edge_data("a", "b") == compact.get_edge_data("b", "a") == {"weight": np.float32(0.7)}
+    assert sorted(compact.neighbors("b")) == ["a", "c"]
+    assert list(compact.neighbors("isolated")) == []
+
+
+def test_copy_is_independent_of_later_mutations():
+    compact = CompactGraph()
+    compact.load_edges(["a", "b", "c"], [("a", "b", 0.5), ("b", "c", 0.2)])
+    compact.add_edge("a", "c", weight=0.9)
+    copy = compact.copy()
+
+    compact.add_edge("a", "b", weight=0.1)
+    compact.remove_edge("b", "c")
+    compact.remove_edge("a", "c")
+    compact.add_node("d")
+    ids, indptr, indices, weights = copy.to_arrays()
+    assert ids == ["a", "b", "c"] and copy.number_of_edges() == 3
+    assert copy.get_edge_data("a", "b") == {"weight": np.float32(0.5)} and copy.has_edge("b", "c") and copy.has_edge("a", "c")
+    assert compact.number_of_edges() == 1 and not compact.has_edge("b", "c")
@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+from graph_service.algorithms import entity_graph as entity_graph_module
+from graph_service.algorithms.entity_graph import EntityGraph, USER_ENTITY_FIELDS, entity_key, extract_entities
+from graph_service.main import app
+from graph_service.services import entity_graph
+
+
+def user(user_id, phone, address="Jl. Mawar No. 1"):
+    return {"id_user": user_id, "phone_number": phone, "domain_email": "gmail.com", "address": address, "is_fraud": False}
+
+
+USERS = [user("a", "0812-111"), user("b", "0812111"), user("c", "0899", address="jl.  mawar no. 1"), user("d", "0877", address="Jl. Melati")]
+# Recorded from transactions, including a card number stored before they were hashed
+USER_ENTITIES = [{"id_user": "d", "entity": "device:dev-1"}, {"id_user": "d", "entity": "card:4111111111111111"}]
+
+
+def test_entities_are_normalized_and_projected_lazily(monkeypatch):
+    assert entity_key("phone", "+62 812-111") == "phone:62812111"
+    # Card numbers are only kept as a keyed hash of their digits
+    card = entity_key("card", "4111-1111-1111-1111")
+    assert card == entity_key("card", "4111111111111111") and "4111" not in card and len(card) == len("card:") + 20
+    monkeypatch.setattr(entity_graph_module, "GRAPH_CARD_HASH_KEY", "another secret")
+    assert entity_key("card", "4111111111111111") != card
+    monkeypatch.undo()
+    assert extract_entities({"payment": {"number": "4111 1111 1111 1111"}, "number": "9"}, {"card": ["payment.number", "number"]}) == {card}
+
+    entities = EntityGraph()
+    entities.add("a", ["phone:1", "shipzip:40132"])
+    entities.add("b", ["phone:1"])
+    entities.add("c", ["shipzip:40132"])
+    shared = entities.shared_with("a")
+    assert [other["id_user"] for other in shared["users"]] == ["b", "c"]
+    assert shared["users"][0]["weight"] > shared["users"][1]["weight"]
+    assert entities.shared_with("a", max_degree=1)["users"] == []
+
+    entities.replace("b", [], USER_ENTITY_FIELDS)
+    entities.remove_user("c")
+    assert entities.shared_with("a")["users"] == []
+    assert entities.degree("phone:1") == 1 and entities.degree("shipzip:40132") == 1
+
+
+def test_shared_entities_follow_users_and_transactions(seed_graph):
+    db = seed_graph(users=USERS, user_entities=USER_ENTITIES)
+    client = TestClient(app)
+
+    shared = client.get("/users/a/shared_entities").json()
+    assert [other["id_user"] for other in shared["users"]] == ["b", "c", "d"]
+    # The email domain every user shares is listed but not expanded once it exceeds max_degree
+    capped = client.get("/users/a/shared_entities", params={"max_degree": 3}).json()
+    assert [other["id_user"] for other in capped["users"]] == ["b", "c"]
+    assert {"entity": "email_domain:gmail.com", "type": "email_domain", "degree": 4, "expanded": False} in capped["entities"]
+    assert client.get("/users/zz/shared_entities").status_code == 404
+
+    # Card numbers stored before they were hashed are rewritten on startup
+    assert db.user_entities.find_one({"id_user": "d", "entity": {"$regex": "^card:"}})["entity"] == entity_key("card", "4111111111111111")
+
+    # Analyzing a transaction only reads the entity graph
+    assert client.post("/analyze/batch", json=[{"id_user": "a", "device_id": "DEV-1"}]).status_code == 200
+    assert db.user_entities.count_documents({"id_user": "a"}) == 0
+    # Recording transactions connects users through their device, persisted once per pair
+    response = client.post("/transactions/entities", json=[{"id_user": "a", "device_id": "DEV-1"}, {"id_user": "a", "device_id": "dev-1"}, {"id_user": "zz", "device_id": "dev-1"}])
+    assert response.json()["recorded"] == 1
+    assert db.user_entities.count_documents({"id_user": "a"}) == 1
+    assert "device:dev-1" in next(other for other in client.get("/users/d/shared_entities").json()["users"] if other["id_user"] == "a")["entities"]
+
+    assert client.delete("/users/a").status_code == 200
+    assert "a" not in entity_graph.entities_of and db.user_entities.count_documents({"id_user": "a"}) == 0
+
+
+def test_entity_graph_round_trips_through_snapshot_arrays_and_changes():
+    entities = EntityGraph()
+    entities.apply({"op": "set_entities", "node": "a", "entities": ["phone:1", "address:x"], "kinds": list(USER_ENTITY_FIELDS)})
+    entities.apply({"op": "add_entities", "node": "b", "entities": ["phone:1", "device:d"]})
+    entities.apply({"op": "add_entities", "node": "c", "entities": ["device:d"]})
+    entities.apply({"op": "set_entities", "node": "a", "entities": ["phone:1"], "kinds": list(USER_ENTITY_FIELDS)})
+    entities.apply({"op": "remove_node", "node": "c"})
+    assert entities.entities_of == {"a": {"phone:1"}, "b": {"phone:1", "device:d"}}
+
+    ids = ["b", "x", "a"]
+    restored = EntityGraph()
+    restored.load_arrays(ids, entities.to_arrays({node: i for i, node in enumerate(ids)}))
+    assert restored.entities_of == entities.entities_of and restored.users_of == entities.users_of
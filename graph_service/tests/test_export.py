@@ -0,0 +1,88 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from graph_service.main import app
+
+USERS = [{"id_user": user_id, "is_fraud": user_id == "f"} for user_id in ["a", "b", "c", "d", "f", "x"]]
+LINKS = [
+    {"source": source, "target": target, "type": "t", "weight": weight}
+    for source, target, weight in [("a", "b", 0.9), ("a", "c", 0.5), ("a", "d", 0.2), ("b", "f", 0.7), ("c", "x", 0.4)]
+]
+CLUSTERS = [{"members": ["a", "b", "c", "d"]}]
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_cluster_with_sampling(seed_graph):
+    cluster_id = str(seed_graph(users=USERS, links=LINKS, clusters=CLUSTERS).clusters.find_one()["_id"])
+    client = TestClient(app)
+
+    records = read_ndjson(client.get("/graph/export", params={"cluster_id": cluster_id}))
+    edges = [(r["source"], r["target"], r["weight"]) for r in records if r["type"] == "edge"]
+    # Unsampled edges stream in visiting order
+    assert sorted(edges) == [("a", "b", 0.9), ("a", "c", 0.5), ("a", "d", 0.2)]
+    assert records[-1] == {"type": "summary", "nodes": 4, "edges": 3, "bytes": records[-1]["bytes"], "truncated": False}
+
+    records = read_ndjson(client.get("/graph/export", params={"cluster_id": cluster_id, "top_k": 1}))
+    assert [r["id"] for r in records if r["type"] == "node"] == ["a", "b", "c", "d"]
+    assert [(r["source"], r["target"]) for r in records if r["type"] == "edge"] == [("a", "b")]
+
+    records = read_ndjson(client.get("/graph/export", params={"cluster_id": cluster_id, "max_degree": 2}))
+    assert [(r["source"], r["target"]) for r in records if r["type"] == "edge"] == [("a", "b"), ("a", "c")]
+
+    links = client.get(f"/clusters/{cluster_id}/links").json()
+    assert len(links) == 3
+
+
+def test_export_ego_network_respects_byte_budget(seed_graph):
+    seed_graph(users=USERS, links=LINKS, clusters=CLUSTERS)
+    client = TestClient(app)
+
+    records = read_ndjson(client.get("/graph/export", params={"center": "a", "depth": 2}))
+    nodes = {r["id"]: r for r in records if r["type"] == "node"}
+    assert set(nodes) == {"a", "b", "c", "d", "f", "x"}
+    assert nodes["f"]["hops"] == 2 and nodes["f"]["is_fraud"]
+
+    response = client.get("/graph/export", params={"center": "a", "depth": 2, "max_bytes": 200})
+    records = read_ndjson(response)
+    assert records[-1]["truncated"] and records[-1]["bytes"] <= 200
+    sent = {r["id"] for r in records if r["type"] == "node"}
+    # Every streamed edge's endpoints were streamed before it
+    assert all(r["source"] in sent and r["target"] in sent for r in records if r["type"] == "edge")
+
+
+def test_export_rejects_ambiguous_scope(seed_graph):
+    seed_graph(users=USERS, links=LINKS, clusters=CLUSTERS)
+    client = TestClient(app)
+    assert client.get("/graph/export").status_code == 400
+    assert client.get("/graph/export", params={"center": "a", "node_ids": "a,b"}).status_code == 400
+    assert client.get("/graph/export", params={"node_ids": "a,b", "format": "csv"}).status_code == 400
+    records = read_ndjson(client.get("/graph/export", params={"node_ids": "a,b,ghost"}))
+    assert [r["type"] for r in records] == ["node", "node", "edge", "summary"]
+
+
+def test_export_arrow_sends_schema_first_and_reports_truncation(seed_graph):
+    pa = pytest.importorskip("pyarrow")
+    seed_graph(users=USERS, links=LINKS, clusters=CLUSTERS)
+    client = TestClient(app)
+
+    def read_arrow(params):
+        reader = pa.ipc.open_stream(client.get("/graph/export", params={"format": "arrow", **params}).content)
+        batches = []
+        while True:
+            try:
+                batches.append(reader.read_next_batch_with_custom_metadata())
+            except StopIteration:
+                return reader.schema, batches
+
+    schema, batches = read_arrow({"center": "a", "depth": 2})
+    summary = {key.decode(): json.loads(value) for key, value in batches[-1].custom_metadata.items()}
+    assert schema.names[0] == "type" and batches[-1].batch.num_rows == 0
+    assert summary["nodes"] == 6 and summary["edges"] == 5 and not summary["truncated"]
+
+    # A budget below the first batch still yields a valid stream: the schema and the summary
+    schema, batches = read_arrow({"center": "a", "depth": 2, "max_bytes": 300})
+    summary = {key.decode(): json.loads(value) for key, value in batches[-1].custom_metadata.items()}
+    assert len(batches) == 1 and summary["truncated"] and summary["nodes"] == 0
@@ -0,0 +1,103 @@
+import random
+import networkx as nx
+from graph_service.algorithms.connectivity import bidirectional_split_check
+from graph_service.algorithms.fraud_distance import FraudDistanceIndex
+
+
+def reference_distances(graph, seeds):
+    seeds = [seed for seed in seeds if seed in graph]
+    if not seeds:
+        return {}
+    return nx.multi_source_dijkstra_path_length(graph, seeds, weight=lambda u, v, d: 1)
+
+
+def assert_consistent(index, graph):
+    expected = reference_distances(graph, index.seeds)
+    assert index.distance == expected
+    # The nearest fraudster must be a seed at exactly the recorded distance
+    for node, nearest in index.nearest.items():
+        assert nearest in index.seeds
+        assert nx.shortest_path_length(graph, node, nearest) == index.distance[node]
+
+
+def test_rebuild_matches_shortest_paths():
+    graph = nx.path_graph(["a", "b", "c", "d", "e"])
+    graph.add_node("isolated")
+    index = FraudDistanceIndex()
+    index.rebuild(graph, ["a", "e"])
+
+    assert index.lookup("a") == (0, "a")
+    assert index.lookup("b") == (1, "a")
+    assert index.lookup("c")[0] == 2
+    assert index.lookup("d") == (1, "e")
+    assert index.lookup("isolated") == (None, None)
+    assert_consistent(index, graph)
+
+
+def test_incremental_updates_match_rebuild():
+    rng = random.Random(7)
+    graph = nx.gnm_random_graph(60, 90, seed=7)
+    graph = nx.relabel_nodes(graph, {n: f"user_{n}" for n in graph.nodes})
+    nodes = list(graph.nodes)
+    index = FraudDistanceIndex()
+    index.rebuild(graph, rng.sample(nodes, 3))
+    assert_consistent(index, graph)
+
+    for step in range(300):
+        action = rng.random()
+        if action < 0.35:
+            source, target = rng.sample(nodes, 2)
+            if not graph.has_edge(source, target):
+                graph.add_edge(source, target)
+                index.add_edge(graph, source, target)
+        elif action < 0.7 and graph.number_of_edges():
+            source, target = rng.choice(list(graph.edges))
+            graph.remove_edge(source, target)
+            index.remove_edge(graph, source, target)
+        elif action < 0.85:
+            index.add_seed(graph, rng.choice(nodes))
+        elif index.seeds:
+            index.remove_seed(graph, rng.choice(sorted(index.seeds)))
+        assert_consistent(index, graph)
+
+
+def test_remove_node_repairs_distances():
+    graph = nx.Graph([("fraud", "a"), ("a", "b"), ("b", "c"), ("fraud2", "x"), ("x", "y"), ("y", "c")])
+    index = FraudDistanceIndex()
+    index.rebuild(graph, ["fraud", "fraud2"])
+    assert index.lookup("c")[0] == 3
+
+    neighbors = list(graph.neighbors("a"))
+    graph.remove_node("a")
+    index.remove_node(graph, "a", neighbors)
+    assert index.lookup("b") == (4, "fraud2")
+    assert_consistent(index, graph)
+
+
+def test_bidirectional_split_check():
+    graph = nx.path_graph(["a", "b", "c", "d"])
+    graph.add_edge("a", "d")
+    graph.remove_edge("b", "c")
+    assert bidirectional_split_check(graph, "b", "c")[0] is True
+
+    graph.remove_edge("a", "d")
+    connected, endpoint, component = bidirectional_split_check(graph, "b", "c")
+    assert connected is False
+    assert component == ({"a", "b"} if endpoint == "b" else {"c", "d"})
+
+    graph = nx.path_graph(range(100))
+    graph.remove_edge(49, 50)
+    assert bidirectional_split_check(graph, 49, 50, max_visits=10) == (None, None, set())
+
+
+def test_batch_edge_removal_matches_rebuild():
+    rng = random.Random(11)
+    for max_visits in (None, 5):
+        graph = nx.gnm_random_graph(80, 110, seed=max_visits or 0)
+        index = FraudDistanceIndex(split_check_max_visits=max_visits)
+        index.rebuild(graph, rng.sample(list(graph.nodes), 4))
+        while graph.number_of_edges():
+            removed = rng.sample(list(graph.edges), min(8, graph.number_of_edges()))
+            graph.remove_edges_from(removed)
+            index.remove_edges(graph, removed)
+            assert_consistent(index, graph)
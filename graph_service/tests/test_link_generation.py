@@ -0,0 +1,67 @@
+from graph_service.algorithms.minhash import LSHIndex, MinHasher, jaccard, shingles
+from graph_service.algorithms.text import normalize_address, normalize_name
+from graph_service.services.link_service import build_links
+
+
+def make_user(id_user, name, address, phone, zip_code="40111"):
+    return {"id_user": id_user, "nama_lengkap": name, "address": address, "phone_number": phone, "address_zip": zip_code}
+
+
+def test_normalize_indonesian_addresses_and_names():
+    assert normalize_address("Jl. Melati Gg.3 No.12") == "jalan melati gang 3 nomor 12"
+    assert normalize_address("JALAN Melati, Gang 3 nomor 12") == "jalan melati gang 3 nomor 12"
+    assert normalize_name("Bpk. H. Budi  Santoso") == "budi santoso"
+
+
+def test_lsh_finds_similar_signatures_only():
+    hasher = MinHasher()
+    texts = ["jalan melati gang 3 nomor 12", "jalan melati gang 3 nomor 21", "perumahan griya indah blok c"]
+    items = [shingles(text) for text in texts]
+    lsh = LSHIndex()
+    for i, item in enumerate(items):
+        lsh.add(i, hasher.signature(item))
+    pairs = set(lsh.candidate_pairs())
+    assert (0, 1) in pairs
+    assert (0, 2) not in pairs and (1, 2) not in pairs
+    assert jaccard(items[0], items[1]) > 0.6
+
+
+def test_build_links_combines_exact_and_fuzzy_evidence():
+    users = [
+        make_user("a", "Budi Santoso", "Jl. Melati Gg.3 No.12", "0811", "40111"),
+        make_user("b", "Bpk Budi Santoso", "Jalan Melati Gang 3 Nomor 12", "0822", "40222"),
+        make_user("c", "Siti Aminah", "Perum Griya Indah Blok C", "0811", "40333"),
+        make_user("d", "Andi Wijaya", "Komp. Bumi Asri", "0844", "40444"),
+    ]
+    rules = [{"_id": "r1", "name": "same_zip_rule", "field1": "address_zip", "operator": "equal"}]
+    links = {(link["source"], link["target"]): link for link in build_links(users, rules)}
+
+    assert set(links) == {("a", "b"), ("a", "c")}
+    assert links[("a", "c")]["reasons"] == ["same phone_number"]
+    assert links[("a", "c")]["weight"] == 0.9
+    assert any(reason.startswith("similar address") for reason in links[("a", "b")]["reasons"])
+    assert any(reason.startswith("similar nama_lengkap") for reason in links[("a", "b")]["reasons"])
+    assert 0 < links[("a", "b")]["weight"] <= 1
+    assert all(link["type"] == "generated" for link in links.values())
+    # A phone shared by a larger group is left to the user-entity graph
+    assert build_links(users, rules, max_entity_group=1) == [links[("a", "b")]]
+
+
+def test_build_links_counts_shared_evidence_once_and_skips_large_exact_groups():
+    users = [
+        make_user("a", "Budi Santoso", "Jl. Melati Gg.3 No.12", "0811"),
+        make_user("b", "Siti Aminah", "Perum Griya Indah Blok C", "0811"),
+        make_user("c", "Andi Wijaya", "Komp. Bumi Asri", "0833"),
+        make_user("d", "Dewi Lestari", "Jl. Kenanga Raya 7", "0844"),
+    ]
+    rules = [
+        {"_id": "r1", "name": "same phone rule", "field1": "phone_number", "operator": "equal", "field2": "phone_number"},
+        {"_id": "r2", "name": "same zip rule", "field1": "address_zip", "operator": "equal"},
+    ]
+    links = build_links(users, rules, max_exact_group=2)
+
+    # Four users share the zip code, which is too common to link pairwise
+    assert len(links) == 1
+    assert links[0]["reasons"] == ["same phone_number"]
+    assert links[0]["rule_ids"] == ["r1"]
+    assert links[0]["weight"] == 0.9
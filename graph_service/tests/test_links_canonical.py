@@ -0,0 +1,51 @@
+from fastapi.testclient import TestClient
+from graph_service.main import app
+from graph_service import services
+from graph_service.services.link_service import canonical_links, link_key
+
+USERS = [{"id_user": user_id, "is_fraud": False} for user_id in ["a", "b", "c"]]
+LINK = {"source": "b", "target": "a", "type": "t", "weight": 0.5}
+
+
+def test_link_key_is_direction_independent():
+    assert link_key("b", "a") == link_key("a", "b") == {"node_a": "a", "node_b": "b"}
+
+
+def test_canonical_links_keeps_last_link_per_pair():
+    links = [
+        {"source": "a", "target": "b", "weight": 0.1},
+        {"source": "c", "target": "c", "weight": 1.0},
+        {"source": "b", "target": "c", "weight": 0.3},
+        {"source": "b", "target": "a", "weight": 0.2},
+    ]
+    assert canonical_links(links) == [links[2], links[3]]
+
+
+def test_existing_links_are_backfilled_and_read_in_either_direction(mock_db, seed_graph):
+    # Stored as before links had canonical keys
+    mock_db.links.insert_one(dict(LINK))
+    db = seed_graph(users=USERS)
+    assert db.links.find_one({"source": "b"})["node_a"] == "a"
+    assert "link_pair_unique" in db.links.index_information()
+
+    client = TestClient(app)
+    response = client.get("/links/a/b")
+    assert response.status_code == 200
+    assert response.json()["source"] == "b"
+
+
+def test_reverse_duplicate_is_rejected_and_delete_is_undirected(seed_graph):
+    seed_graph(users=USERS, links=[LINK])
+    client = TestClient(app)
+
+    response = client.post("/links/", json={"source": "a", "target": "b", "type": "t"})
+    assert response.status_code == 400
+
+    response = client.post("/links/", json={"source": "c", "target": "a", "type": "t", "weight": 0.7})
+    assert response.status_code == 200
+    assert response.json()["node_a"] == "a"
+    assert services.graph.has_edge("a", "c")
+
+    assert client.delete("/links/a/c").status_code == 200
+    assert not services.graph.has_edge("a", "c")
+    assert services.db.links.count_documents({}) == 1
@@ -0,0 +1,53 @@
+import asyncio
+import mongomock
+import networkx as nx
+from fastapi.testclient import TestClient
+from graph_service.algorithms.neighborhood import bounded_neighborhood
+from graph_service.main import app
+from graph_service.services import initialize_graph_db
+
+
+def test_bounded_neighborhood_returns_every_node_within_depth():
+    graph = nx.path_graph(["a", "b", "c", "d"])
+    result = bounded_neighborhood(graph, "a", 2)
+    assert result["distances"] == {"a": 0, "b": 1, "c": 2}
+    assert result["found"] is None and not result["truncated"]
+
+
+def test_bounded_neighborhood_caps_and_skips_supernodes():
+    graph = nx.star_graph(50)  # hub 0 with 50 leaves
+    graph.add_edge("x", 1)
+    result = bounded_neighborhood(graph, "x", 3, max_degree=10)
+    assert result["distances"] == {"x": 0, 1: 1, 0: 2}
+    assert result["skipped_supernodes"] == [0]
+
+    result = bounded_neighborhood(graph, 0, 1, max_per_level=5)
+    assert len(result["distances"]) == 6 and result["truncated"]
+    result = bounded_neighborhood(graph, 0, 1, max_nodes=3)
+    assert len(result["distances"]) == 3 and result["truncated"]
+
+
+def test_bounded_neighborhood_stops_at_first_fraud_node():
+    graph = nx.path_graph(["a", "b", "c", "d", "e"])
+    result = bounded_neighborhood(graph, "a", 4, stop_at={"c", "e"})
+    assert result["found"] == ("c", 2)
+    assert "d" not in result["distances"]
+
+
+def test_neighborhood_endpoint():
+    db = mongomock.MongoClient()['neighborhood_test']
+    db.users.insert_many([{"id_user": "a"}, {"id_user": "b"}, {"id_user": "f", "is_fraud": True}])
+    db.links.insert_many([
+        {"source": "a", "target": "b", "type": "t", "weight": 1.0},
+        {"source": "b", "target": "f", "type": "t", "weight": 1.0},
+    ])
+    asyncio.run(initialize_graph_db(db))
+    client = TestClient(app)
+
+    response = client.get("/users/a/neighborhood", params={"depth": 2, "stop_at_fraud": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["nodes"] == [{"id_user": "b", "hops": 1, "is_fraud": False}, {"id_user": "f", "hops": 2, "is_fraud": True}]
+    assert body["nearest_fraudster"] == {"id_user": "f", "hops": 2}
+    assert client.get("/users/ghost/neighborhood").status_code == 404
+    assert client.get("/users/a/neighborhood", params={"depth": 99}).status_code == 422
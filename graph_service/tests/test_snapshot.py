@@ -0,0 +1,188 @@
+import mongomock
+import numpy as np
+from graph_service.algorithms.cluster_index import ClusterIndex
+from graph_service.algorithms.csr import CompactGraph
+from graph_service.algorithms.fraud_distance import FraudDistanceIndex
+from graph_service.services.changelog import GraphChangelog
+from graph_service.services.snapshot_service import attach_snapshot
+from graph_service.snapshot import acquire_writer_lock, current_snapshot_seq, load_snapshot, prune_snapshots, write_snapshot
+
+
+def build_graph():
+    graph = CompactGraph()
+    graph.add_edge("a", "b", weight=0.5)
+    graph.add_edge("b", "c", weight=0.25)
+    graph.add_node("d")
+    return graph
+
+
+def test_snapshot_round_trip_is_memory_mapped(tmp_path):
+    graph = build_graph()
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=7)
+
+    ids, indptr, indices, weights, seq = load_snapshot(str(tmp_path))
+    assert seq == 7
+    assert isinstance(indices, np.memmap) and isinstance(weights, np.memmap)
+
+    restored = CompactGraph()
+    restored.load_arrays(ids, indptr, indices, weights)
+    assert sorted(restored.nodes) == ["a", "b", "c", "d"]
+    assert restored.number_of_edges() == 2
+    assert restored.get_edge_data("c", "b") == {"weight": 0.25}
+    # Copy-on-write: changing the restored graph does not touch the file
+    restored.add_edge("a", "b", weight=0.9)
+    _, _, _, weights_on_disk, _ = load_snapshot(str(tmp_path))
+    assert 0.9 not in weights_on_disk.tolist()
+
+
+def test_load_snapshot_without_snapshot_returns_none(tmp_path):
+    assert load_snapshot(str(tmp_path)) is None
+
+
+def test_replay_changelog_on_top_of_snapshot(tmp_path):
+    db = mongomock.MongoClient()['snapshot_test']
+    changelog = GraphChangelog()
+    changelog.enabled = True
+    graph = build_graph()
+    changelog.record(db, [{"op": "add_node", "node": "a"}])
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=changelog.current_seq(db))
+
+    # Changes made after the snapshot was written
+    changelog.record(db, [
+        {"op": "add_edge", "source": "c", "target": "e", "weight": 1.0},
+        {"op": "remove_edge", "source": "a", "target": "b"},
+        {"op": "remove_node", "node": "d"},
+        {"op": "set_fraud", "node": "e", "is_fraud": True},
+    ])
+
+    ids, indptr, indices, weights, seq = load_snapshot(str(tmp_path))
+    restored = CompactGraph()
+    restored.load_arrays(ids, indptr, indices, weights)
+    fraud_user_ids = set()
+    reader = GraphChangelog()
+    reader.applied_seq = seq
+    assert reader.replay(db, restored, fraud_user_ids) == 4
+    assert reader.applied_seq == 5
+    assert sorted(restored.edges()) == [("b", "c"), ("c", "e")]
+    assert "d" not in restored
+    assert fraud_user_ids == {"e"}
+
+    write_snapshot(str(tmp_path), *restored.to_arrays(), seq=reader.applied_seq)
+    write_snapshot(str(tmp_path), *restored.to_arrays(), seq=reader.applied_seq + 1)
+    assert prune_snapshots(str(tmp_path)) == reader.applied_seq
+    changelog.truncate(db, reader.applied_seq)
+    assert db.graph_changelog.count_documents({}) == 0
+
+
+def test_reader_attaches_newer_snapshots_and_tails_the_changelog(tmp_path):
+    db = mongomock.MongoClient()['shared_graph_test']
+    db.users.insert_one({"id_user": "c", "is_fraud": True})
+    writer = GraphChangelog()
+    writer.enabled = True
+    graph = build_graph()
+    writer.record(db, [{"op": "add_node", "node": "a"}])
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=writer.current_seq(db))
+    assert current_snapshot_seq(str(tmp_path)) == 1
+
+    reader_graph, reader, fraud_user_ids = CompactGraph(), GraphChangelog(), set()
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db)
+    assert reader.snapshot_seq == 1 and reader_graph.number_of_edges() == 2
+    assert fraud_user_ids == {"c"}
+    assert not attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db)
+
+    # A write through another worker is picked up from the changelog...
+    writer.record(db, [{"op": "add_edge", "source": "d", "target": "a", "weight": 1.0}])
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db)
+    assert reader_graph.has_edge("a", "d") and reader.snapshot_seq == 1
+
+    # ...and the next published version replaces the reader's overlay
+    graph.add_edge("d", "a", weight=1.0)
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=writer.current_seq(db))
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db)
+    assert reader.snapshot_seq == reader.applied_seq == 2
+    assert isinstance(reader_graph._indices, np.memmap) and reader_graph.has_edge("a", "d")
+
+
+def test_replay_waits_for_reserved_seqs_before_skipping_them():
+    db = mongomock.MongoClient()['changelog_gap_test']
+    # Seq 2 was reserved by a writer that has not inserted it yet
+    db.graph_changelog.insert_many([
+        {"seq": 1, "op": "add_edge", "source": "a", "target": "b", "weight": 1.0},
+        {"seq": 3, "op": "add_edge", "source": "b", "target": "c", "weight": 1.0},
+    ])
+    graph, reader = CompactGraph(), GraphChangelog()
+    assert reader.replay(db, graph, set()) == 1
+    assert reader.replay(db, graph, set()) == 0
+    assert reader.applied_seq == 1 and not graph.has_edge("b", "c")
+
+    db.graph_changelog.insert_one({"seq": 2, "op": "add_node", "node": "d"})
+    assert reader.replay(db, graph, set()) == 2
+    assert reader.applied_seq == 3 and "d" in graph
+
+    # A gap that never fills is skipped once it has been open for gap_timeout
+    db.graph_changelog.insert_one({"seq": 5, "op": "add_node", "node": "e"})
+    reader.gap_timeout = 0
+    assert reader.replay(db, graph, set()) == 0
+    assert reader.replay(db, graph, set()) == 1
+    assert reader.applied_seq == 5 and "e" in graph
+
+
+def test_tailing_the_changelog_updates_fraud_distances_incrementally(tmp_path):
+    db = mongomock.MongoClient()['incremental_sync_test']
+    writer = GraphChangelog()
+    writer.enabled = True
+    writer.record(db, [{"op": "add_node", "node": "a"}])
+    write_snapshot(str(tmp_path), *build_graph().to_arrays(), seq=writer.current_seq(db))
+
+    reader_graph, reader, fraud_user_ids, distances = CompactGraph(), GraphChangelog(), set(), FraudDistanceIndex()
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db, distances)
+    writer.record(db, [
+        {"op": "set_fraud", "node": "a", "is_fraud": True},
+        {"op": "add_edge", "source": "c", "target": "d", "weight": 1.0},
+        {"op": "remove_edge", "source": "b", "target": "c"},
+        {"op": "add_edge", "source": "d", "target": "e", "weight": 1.0},
+        {"op": "add_edge", "source": "a", "target": "e", "weight": 1.0},
+        {"op": "remove_node", "node": "b"},
+    ])
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, fraud_user_ids, db, distances)
+
+    rebuilt = FraudDistanceIndex()
+    rebuilt.rebuild(reader_graph, fraud_user_ids)
+    assert distances.distance == rebuilt.distance == {"a": 0, "e": 1, "d": 2, "c": 3}
+
+
+def test_cluster_index_follows_the_changelog_and_snapshots(tmp_path):
+    db = mongomock.MongoClient()['cluster_sync_test']
+    writer, writer_index = GraphChangelog(), ClusterIndex()
+    writer.enabled = True
+    graph = build_graph()
+    stats = {"size": 2, "fraud_count": 1, "fraud_ratio": 0.5, "total_link_weight": 0.5}
+    writer_index.set_cluster("k1", ["a", "b"], stats)
+    writer.record(db, [writer_index.change("k1")])
+    position = {node: i for i, node in enumerate(graph.to_arrays()[0])}
+    write_snapshot(str(tmp_path), *graph.to_arrays(), seq=writer.current_seq(db), arrays=writer_index.to_arrays(position))
+
+    reader_graph, reader, reader_index = CompactGraph(), GraphChangelog(), ClusterIndex()
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, set(), db, cluster_index=reader_index)
+    assert reader_index.lookup("b") == dict(stats, cluster_id="k1")
+
+    writer_index.set_cluster("k2", ["c", "d"], dict(stats, fraud_count=0, fraud_ratio=0.0))
+    writer_index.remove_cluster("k1")
+    writer.record(db, [writer_index.change("k2"), writer_index.change("k1")])
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, set(), db, cluster_index=reader_index)
+    assert reader_index.members == {"k2": ["c", "d"]} and reader_index.lookup("a") is None
+
+    # Full rebuilds are reloaded from MongoDB
+    cluster_id = db.clusters.insert_one({"members": ["a", "c"], "method": "louvain", **stats}).inserted_id
+    writer.record(db, [{"op": "load_clusters"}])
+    assert attach_snapshot(str(tmp_path), reader_graph, reader, set(), db, cluster_index=reader_index)
+    assert reader_index.method == "louvain" and reader_index.same_cluster("a", "c")
+    assert reader_index.lookup("c")["cluster_id"] == str(cluster_id)
+
+
+def test_only_one_process_holds_the_writer_lock(tmp_path):
+    lock = acquire_writer_lock(str(tmp_path))
+    assert lock is not None
+    assert acquire_writer_lock(str(tmp_path)) is None
+    lock.close()
+    assert acquire_writer_lock(str(tmp_path)) is not None
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, Response
+from fastapi.responses import JSONResponse
 from typing import Dict, Any
 import httpx
 from common.config import MONGODB_URI, MONGODB_DB_NAME
@@ -83,10 +84,17 @@ async def fraud_check(transaction_id: str):
 
 # --- API Endpoints for Policy Management ---
 @app.get("/policies/")
-async def list_policies():
-    async with httpx.AsyncClient() as client:
-        response = await client.get("http://rules_policy_engine:8003/policies/")
-        return response.json()
+async def list_policies(request: Request):
+    # Forward pagination parameters and the ETag validator so unchanged pages are not re-sent
+    headers = {}
+    if "if-none-match" in request.headers:
+        headers["If-None-Match"] = request.headers["if-none-match"]
+    async with httpx.AsyncClient() as client:
+        response = await client.get("http://rules_policy_engine:8003/policies/", params=dict(request.query_params), headers=headers)
+        etag_headers = {"ETag": response.headers["etag"]} if "etag" in response.headers else {}
+        if response.status_code == 304:
+            return Response(status_code=304, headers=etag_headers)
+        return JSONResponse(response.json(), status_code=response.status_code, headers=etag_headers)
 
 @app.get("/policies/{policy_id}")
 async def read_policy(policy_id: str):
@@ -121,6 +129,9 @@ async def process_transaction(transaction_data: Dict[str, Any]):
     async with httpx.AsyncClient() as client:
         response = await client.post("http://rules_policy_engine:8003/transactions", json=transaction_data)
         response.raise_for_status() # Raise an exception for bad status codes
+        # Connect the user to the transaction's card, ship zip and device in the entity graph
+        entities_response = await client.post("http://graph_service:8002/transactions/entities", json=[transaction_data])
+        entities_response.raise_for_status()
         return response.json()
 
 # --- API Endpoints for Rule Management ---
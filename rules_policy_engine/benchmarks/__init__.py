@@ -0,0 +1,7 @@
+"""
+Throughput benchmarks for the rules policy engine.
+
+Run from the rules_policy_engine directory (with the common package importable):
+
+    python -m benchmarks --sizes 10 100 1000 --output bench_results.json
+"""
@@ -0,0 +1,31 @@
+import argparse
+import json
+
+from .runner import DEFAULT_ITERATIONS, DEFAULT_SIZES, run_sync
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rules policy engine throughput benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Number of standard rules in each synthetic policy set")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+                        help="Transactions scored per benchmark (scaled down for large policy sets)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic data")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_sync(sizes=args.sizes, iterations=args.iterations, seed=args.seed)
+
+    for result in report["results"]:
+        print(f"{result['benchmark']:<24} rules={result['rule_count']:<6} "
+              f"ops/s={result['ops_per_sec']:>12.1f} p50={result['p50_ms']:.3f}ms p99={result['p99_ms']:.3f}ms")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
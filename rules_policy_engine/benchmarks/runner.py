@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import platform
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+import mongomock
+
+from rules_policy_engine.api import process_transaction
+from rules_policy_engine.models import StandardRule, Transaction
+from rules_policy_engine.services import evaluate_policy, evaluate_standard_rule
+
+from .synthetic import generate_policies, generate_transactions, seed_database
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_ITERATIONS = 200
+# Upper bound on rule evaluations per benchmark, so the 10,000-rule runs stay short
+RULE_EVALUATION_BUDGET = 2_000_000
+# Transactions stored as history for the velocity rule aggregations
+HISTORY_SIZE = 500
+
+
+def velocity_rule_count(standard_rule_count: int) -> int:
+    """Velocity rules hit the database, so they are kept at roughly 1% of the policy set."""
+    return max(1, min(10, standard_rule_count // 100))
+
+
+def summarize(name: str, rule_count: int, durations_ns: List[int]) -> Dict[str, Any]:
+    """Turns per-operation durations into ops/sec and latency percentiles."""
+    durations = sorted(durations_ns)
+    total_seconds = sum(durations) / 1e9
+
+    def percentile(p: float) -> float:
+        index = min(len(durations) - 1, int(round(p * (len(durations) - 1))))
+        return durations[index] / 1e6
+
+    return {
+        "benchmark": name,
+        "rule_count": rule_count,
+        "iterations": len(durations),
+        "ops_per_sec": len(durations) / total_seconds if total_seconds else None,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "max_ms": durations[-1] / 1e6,
+    }
+
+
+def time_sync(operation: Callable[[], Any], iterations: int) -> List[int]:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        operation()
+        durations.append(time.perf_counter_ns() - start)
+    return durations
+
+
+async def time_async(operation: Callable[[], Awaitable[Any]], iterations: int) -> List[int]:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        await operation()
+        durations.append(time.perf_counter_ns() - start)
+    return durations
+
+
+async def run_size(rule_count: int, iterations: int, seed: int) -> List[Dict[str, Any]]:
+    """Runs every benchmark against a policy set with `rule_count` standard rules."""
+    policies = generate_policies(rule_count, velocity_rule_count(rule_count), seed=seed)
+    transactions = list(generate_transactions(max(iterations, 100), seed=seed))
+    history = list(generate_transactions(HISTORY_SIZE, seed=seed + 1))
+
+    db = mongomock.MongoClient()["benchmark"]
+    seed_database(db, policies, history)
+
+    results = []
+
+    # evaluate_standard_rule: one rule against one transaction per operation
+    standard_rules = [rule.model_dump() for policy in policies for rule in policy.rules if isinstance(rule, StandardRule)]
+    pairs = itertools.cycle(zip(itertools.cycle(transactions), standard_rules))
+    calls = min(RULE_EVALUATION_BUDGET, max(iterations, len(standard_rules)))
+    durations = time_sync(lambda: evaluate_standard_rule(*next(pairs)), calls)
+    results.append(summarize("evaluate_standard_rule", rule_count, durations))
+
+    # Per-transaction iteration count scaled so large policy sets stay within budget
+    scaled_iterations = max(10, min(iterations, RULE_EVALUATION_BUDGET // max(rule_count, 1) // 10))
+
+    # evaluate_policy: one transaction against the whole policy set per operation
+    transaction_cycle = itertools.cycle(transactions)
+
+    async def evaluate_all_policies():
+        transaction = next(transaction_cycle)
+        for policy in policies:
+            await evaluate_policy(transaction, policy, db=db)
+
+    durations = await time_async(evaluate_all_policies, scaled_iterations)
+    results.append(summarize("evaluate_policy", rule_count, durations))
+
+    # process_transaction: end-to-end, including loading the policies from the database
+    models = itertools.cycle([Transaction(**{key: t[key] for key in Transaction.model_fields}) for t in transactions])
+    durations = await time_async(lambda: process_transaction(next(models), mock_db=db), scaled_iterations)
+    results.append(summarize("process_transaction", rule_count, durations))
+
+    return results
+
+
+async def run(sizes: List[int] = None, iterations: int = DEFAULT_ITERATIONS, seed: int = 0) -> Dict[str, Any]:
+    """Runs the benchmark suite and returns a JSON-serializable report."""
+    sizes = sizes or DEFAULT_SIZES
+    results = []
+    # The engine prints per-transaction diagnostics; keep them out of the measurements' output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for rule_count in sizes:
+            results.extend(await run_size(rule_count, iterations, seed))
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongomock",
+            "sizes": sizes,
+            "iterations": iterations,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def run_sync(**kwargs) -> Dict[str, Any]:
+    return asyncio.run(run(**kwargs))
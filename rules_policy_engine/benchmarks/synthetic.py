@@ -0,0 +1,120 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+from rules_policy_engine.models import Policy, StandardRule, VelocityRule
+
+TRANSACTION_TYPES = ["deposit", "withdrawal", "transfer"]
+PAYMENT_TYPES = ["wallet gopay", "wallet ovo", "credit card", "debit card", "bank transfer"]
+OPERATORS = ["equal", "not_equal", "greater_than", "greater_than_equal", "lower_than", "lower_than_equal", "in", "not_in"]
+
+# Maximum number of rules stored in a single synthetic policy
+RULES_PER_POLICY = 100
+
+
+def generate_transaction(rng: random.Random, user_ids: List[str]) -> Dict[str, Any]:
+    """Generates one transaction shaped like the records in sample_data.json."""
+    user_id = rng.choice(user_ids)
+    transaction_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    amount = round(rng.lognormvariate(13, 1.5), 2)
+    payment_type = rng.choice(PAYMENT_TYPES)
+    return {
+        # Fields required by the rules engine Transaction model
+        "user_id": user_id,
+        "transaction_id": transaction_id,
+        "amount": amount,
+        "transaction_type": rng.choice(TRANSACTION_TYPES),
+        # Fields mirroring sample_data.json
+        "id_user": user_id,
+        "id_transaction": transaction_id,
+        "shipzip": f"{rng.randint(0, 99999):05d}",
+        "payment_type": payment_type,
+        "payment": {
+            "payment_type": payment_type,
+            "number": rng.randint(10**9, 10**10 - 1),
+            "bank_name": None,
+            "amount": amount,
+            "status": "success",
+        },
+        "list_of_items": [
+            {"item_name": f"item_{rng.randint(0, 999)}", "price": round(amount / 2, 2), "quantity": rng.randint(1, 3)}
+        ],
+    }
+
+
+def generate_transactions(count: int, user_count: int = 1000, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Generates a deterministic stream of synthetic transactions."""
+    rng = random.Random(seed)
+    user_ids = [f"user_{i}" for i in range(user_count)]
+    for _ in range(count):
+        yield generate_transaction(rng, user_ids)
+
+
+def generate_standard_rule(rng: random.Random, index: int) -> StandardRule:
+    """Generates one standard rule over a field present in the synthetic transactions."""
+    operator = rng.choice(OPERATORS)
+    if operator in ("in", "not_in"):
+        field = rng.choice(["transaction_type", "payment_type"])
+        pool = TRANSACTION_TYPES if field == "transaction_type" else PAYMENT_TYPES
+        value = rng.sample(pool, 2)
+    elif operator in ("equal", "not_equal"):
+        field = rng.choice(["transaction_type", "shipzip"])
+        value = rng.choice(TRANSACTION_TYPES) if field == "transaction_type" else f"{rng.randint(0, 99999):05d}"
+    else:
+        field = "amount"
+        value = round(rng.lognormvariate(13, 1.5), 2)
+    return StandardRule(
+        description=f"Synthetic standard rule {index}",
+        risk_point=rng.randint(1, 30),
+        field=field,
+        operator=operator,
+        value=value,
+    )
+
+
+def generate_velocity_rule(rng: random.Random, index: int) -> VelocityRule:
+    """Generates one velocity rule over the user's transaction history."""
+    aggregation_function = rng.choice(["count", "sum", "average"])
+    return VelocityRule(
+        description=f"Synthetic velocity rule {index}",
+        risk_point=rng.randint(10, 40),
+        field="user_id" if aggregation_function == "count" else "amount",
+        time_range=rng.choice(["1 hour", "1 day", "1 week"]),
+        aggregation_function=aggregation_function,
+        threshold=5 if aggregation_function == "count" else round(rng.lognormvariate(14, 1), 2),
+    )
+
+
+def generate_policies(standard_rule_count: int, velocity_rule_count: int, seed: int = 0) -> List[Policy]:
+    """Generates a policy set holding the requested number of rules, RULES_PER_POLICY rules per policy."""
+    rng = random.Random(seed)
+    rules = [generate_standard_rule(rng, i) for i in range(standard_rule_count)]
+    rules += [generate_velocity_rule(rng, i) for i in range(velocity_rule_count)]
+    rng.shuffle(rules)
+
+    policies = []
+    for start in range(0, len(rules), RULES_PER_POLICY):
+        policies.append(Policy(
+            name=f"Synthetic Policy {start // RULES_PER_POLICY}",
+            description="Generated for benchmarking",
+            rules=rules[start:start + RULES_PER_POLICY],
+        ))
+    return policies
+
+
+def seed_database(db: Any, policies: List[Policy], history: List[Dict[str, Any]]) -> None:
+    """Stores the policies (with embedded rules) and a timestamped transaction history."""
+    db.policies.delete_many({})
+    db.transactions.delete_many({})
+    if policies:
+        db.policies.insert_many([policy.model_dump() for policy in policies])
+
+    now = datetime.utcnow()
+    documents = []
+    for i, transaction in enumerate(history):
+        document = dict(transaction)
+        document["timestamp"] = now - timedelta(minutes=i % (60 * 24 * 7))
+        documents.append(document)
+    if documents:
+        db.transactions.insert_many(documents)
@@ -1,10 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+import hashlib
+import json
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Dict, Any, AsyncIterator, Optional
 from common.config import MONGODB_URI, MONGODB_DB_NAME
 from common.mongodb_utils import get_mongodb_client, get_mongodb_database
+from common.repository import update_one_and_fetch
 # Import RuleType
 from .models import Policy, StandardRule, VelocityRule, Transaction, RuleType
-from .services import evaluate_policy, determine_risk_level
+from .services import (
+    load_policies,
+    score_transaction,
+    score_transaction_stream,
+    get_policy_set_version,
+    bump_policy_set_version,
+    list_documents,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
+from .decision_writer import decision_writer
 from bson.errors import InvalidId
 
 policy_router = APIRouter()
@@ -54,6 +69,7 @@ async def create_policy(policy: Policy, db: Any = Depends(get_mongodb_database))
             {"$set": {"rules": inserted_rule_ids}}
         )
         print(f"Policy {policy_id} updated with rule ids: {inserted_rule_ids}")
+        bump_policy_set_version(db)
 
         # Retrieve the updated policy document
         updated_policy = db.policies.find_one({"_id": policy_id})
@@ -75,6 +91,45 @@ async def create_policy(policy: Policy, db: Any = Depends(get_mongodb_database))
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _list_collection(request: Request, response: Response, db: Any, collection_name: str,
+                     after: Optional[str], limit: int, fields: Optional[str]):
+    """
+    Shared implementation of the paginated listing endpoints.
+    The ETag is derived from the policy-set version and the page parameters,
+    so a matching If-None-Match short-circuits with 304 before querying the collection.
+    """
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    page_key = json.dumps([collection_name, after, limit, field_list])
+    version = get_policy_set_version(db)
+    etag = f'W/"{version}-{hashlib.sha1(page_key.encode()).hexdigest()[:16]}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        page = list_documents(db[collection_name], after=after, limit=limit, fields=field_list)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response.headers["ETag"] = etag
+    return page
+
+
+@policy_router.get("/policies/", response_model=Dict[str, Any])
+async def list_policies(request: Request, response: Response,
+                        after: Optional[str] = None,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        fields: Optional[str] = None,
+                        db: Any = Depends(get_mongodb_database)):
+    """Lists policies ordered by _id, using `after` as the keyset cursor."""
+    try:
+        return _list_collection(request, response, db, "policies", after, limit, fields)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @policy_router.get("/policies/{policy_id}", response_model=Dict[str, Any])
 async def read_policy(policy_id: str, db: Any = Depends(get_mongodb_database)):
     """Reads a fraud detection policy by ID."""
@@ -100,20 +155,14 @@ async def update_policy(policy_id: str, policy: Policy, db: Any = Depends(get_mo
         from bson import ObjectId
         # Use model_dump() instead of dict()
         policy_data = policy.model_dump(exclude_unset=True) # Use exclude_unset to only update provided fields
-        result = db.policies.update_one({"_id": ObjectId(policy_id)}, {"$set": policy_data})
-        if result.modified_count == 0:
-            # Check if the policy exists but no changes were made
-            existing_policy = db.policies.find_one({"_id": ObjectId(policy_id)})
-            if existing_policy:
-                 # If exists but no changes, return the existing policy
-                 existing_policy["_id"] = str(existing_policy["_id"])
-                 return existing_policy
-            else:
-                 raise HTTPException(status_code=404, detail="Policy not found")
-
-        updated_policy = db.policies.find_one({"_id": ObjectId(policy_id)})
+        updated_policy = update_one_and_fetch(db.policies, {"_id": ObjectId(policy_id)}, policy_data)
+        if updated_policy is None:
+            raise HTTPException(status_code=404, detail="Policy not found")
+        bump_policy_set_version(db)
         updated_policy["_id"] = str(updated_policy["_id"])
         return updated_policy
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         if isinstance(e, InvalidId) or "invalid id" in str(e).lower():
              raise HTTPException(status_code=404, detail="Policy not found")
@@ -128,6 +177,7 @@ async def delete_policy(policy_id: str, db: Any = Depends(get_mongodb_database))
         result = db.policies.delete_one({"_id": ObjectId(policy_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Policy not found")
+        bump_policy_set_version(db)
         return {"message": "Policy deleted successfully"}
     except Exception as e:
         if isinstance(e, InvalidId) or "invalid id" in str(e).lower():
@@ -157,20 +207,10 @@ async def process_transaction(transaction: Transaction, mock_db=None) -> Dict[st
         # Use model_dump() instead of dict()
         transaction_data = transaction.model_dump()
 
-        policies = []
-        total_risk_points = 0
-        cursor = db.policies.find()
-        for policy_data in cursor:
-            # Convert rule dictionaries back to Pydantic models
-            policy_data["rules"] = [
-                StandardRule(**rule) if rule.get("rule_type") == "standard" else VelocityRule(**rule)
-                for rule in policy_data.get("rules", [])
-            ]
-            policy = Policy(**policy_data)
-            total_risk_points += await evaluate_policy(transaction_data, policy, db=db)
-    
-            # Determine risk level
-        risk_level = determine_risk_level(total_risk_points)
+        policies = load_policies(db)
+        decision = await score_transaction(transaction_data, policies, db=db)
+        total_risk_points = decision["risk_points"]
+        risk_level = decision["risk_level"]
 
         # Update user's average score (placeholder)
         # In a real implementation, you would retrieve the user's existing
@@ -178,16 +218,83 @@ async def process_transaction(transaction: Transaction, mock_db=None) -> Dict[st
         # save it back to the database.
         print(f"Transaction {transaction.transaction_id} for user {transaction.user_id} has risk level: {risk_level} (points: {total_risk_points})")
 
+        # Persist the decision to fraud_data asynchronously (write-behind)
+        if decision_writer.running:
+            await decision_writer.submit(decision)
+
         return {
             "transaction_id": transaction.transaction_id,
             "user_id": transaction.user_id,
             "risk_points": total_risk_points,
-            "risk_level": risk_level
+            "risk_level": risk_level,
+            "policy_list": decision["policy_list"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that does not listen for client disconnects.
+    The default listener consumes receive() messages, which would steal the
+    request body chunks still being read by the streaming endpoint.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _read_ndjson_transactions(request: Request) -> AsyncIterator[Any]:
+    """
+    Parses a chunked NDJSON request body into Transaction models.
+    Lines that fail to parse or validate are yielded as error records instead.
+    """
+    buffer = b""
+    line_number = 0
+
+    def _parse(line: bytes):
+        try:
+            return Transaction(**json.loads(line))
+        except (ValueError, TypeError, ValidationError) as e:
+            return {"line": line_number, "error": str(e)}
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _parse(line)
+
+    if buffer.strip():
+        line_number += 1
+        yield _parse(buffer)
+
+
+@policy_router.post("/transactions/stream")
+async def process_transaction_stream(request: Request, db: Any = Depends(get_mongodb_database)):
+    """
+    Scores a chunked NDJSON stream of transactions and streams the decisions
+    back as NDJSON, one line per input transaction, in input order.
+    """
+    if db is None:
+        raise HTTPException(status_code=500, detail="Internal server error: Database connection failed")
+
+    try:
+        policies = load_policies(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def _decisions():
+        async for decision in score_transaction_stream(_read_ndjson_transactions(request), policies, db=db):
+            if decision_writer.running and "error" not in decision:
+                await decision_writer.submit(decision)
+            yield json.dumps(decision) + "\n"
+
+    return _DuplexStreamingResponse(_decisions(), media_type="application/x-ndjson")
+
+
 @rule_router.get("/rule_statistics/", response_model=Dict[str, Any])
 async def get_rule_statistics():
     """
@@ -240,12 +347,28 @@ async def create_standard_rule(rule: StandardRule, db: Any = Depends(get_mongodb
         # Use model_dump()
         rule_data = rule.model_dump()
         result = db["standard_rule"].insert_one(rule_data)
+        bump_policy_set_version(db)
         rule_data["_id"] = str(result.inserted_id)
         return rule_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@rule_router.get("/standard_rules/", response_model=Dict[str, Any])
+async def list_standard_rules(request: Request, response: Response,
+                              after: Optional[str] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                              fields: Optional[str] = None,
+                              db: Any = Depends(get_mongodb_database)):
+    """Lists standard rules ordered by _id, using `after` as the keyset cursor."""
+    try:
+        return _list_collection(request, response, db, "standard_rule", after, limit, fields)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @rule_router.get("/standard_rules/{rule_id}", response_model=Dict[str, Any])
 async def read_standard_rule(rule_id: str, db: Any = Depends(get_mongodb_database)):
     """Reads a standard rule by ID."""
@@ -269,23 +392,14 @@ async def update_standard_rule(rule_id: str, rule: StandardRule, db: Any = Depen
         from bson import ObjectId
         # Use model_dump()
         rule_data = rule.model_dump(exclude_unset=True)
-        result = db["standard_rule"].update_one({"_id": ObjectId(rule_id)}, {"$set": rule_data})
-        if result.modified_count == 0:
-            existing_rule = db["standard_rule"].find_one({"_id": ObjectId(rule_id)})
-            if existing_rule:
-                 existing_rule["_id"] = str(existing_rule["_id"])
-                 return existing_rule
-            else:
-                 raise HTTPException(status_code=404, detail="Rule not found")
-
-        updated_rule_doc = db["standard_rule"].find_one({"_id": ObjectId(rule_id)})
-        if updated_rule_doc:
-            updated_rule_doc["_id"] = str(updated_rule_doc["_id"])
-            # Return the fetched dictionary directly
-            return updated_rule_doc
-        else:
-            # This case should ideally not be reached if modified_count > 0, but as a safeguard
-            raise HTTPException(status_code=404, detail="Rule not found after update")
+        updated_rule_doc = update_one_and_fetch(db["standard_rule"], {"_id": ObjectId(rule_id)}, rule_data)
+        if updated_rule_doc is None:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        bump_policy_set_version(db)
+        updated_rule_doc["_id"] = str(updated_rule_doc["_id"])
+        return updated_rule_doc
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         if isinstance(e, InvalidId) or "invalid id" in str(e).lower():
              raise HTTPException(status_code=404, detail="Rule not found")
@@ -300,6 +414,7 @@ async def delete_standard_rule(rule_id: str, db: Any = Depends(get_mongodb_datab
         result = db["standard_rule"].delete_one({"_id": ObjectId(rule_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Rule not found")
+        bump_policy_set_version(db)
         return {"message": "Rule deleted successfully"}
     except InvalidId:
          raise HTTPException(status_code=404, detail="Rule not found")
@@ -315,12 +430,28 @@ async def create_velocity_rule(rule: VelocityRule, db: Any = Depends(get_mongodb
         # Use model_dump()
         rule_data = rule.model_dump()
         result = db["velocity_rule"].insert_one(rule_data)
+        bump_policy_set_version(db)
         rule_data["_id"] = str(result.inserted_id)
         return rule_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@rule_router.get("/velocity_rules/", response_model=Dict[str, Any])
+async def list_velocity_rules(request: Request, response: Response,
+                              after: Optional[str] = None,
+                              limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                              fields: Optional[str] = None,
+                              db: Any = Depends(get_mongodb_database)):
+    """Lists velocity rules ordered by _id, using `after` as the keyset cursor."""
+    try:
+        return _list_collection(request, response, db, "velocity_rule", after, limit, fields)
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @rule_router.get("/velocity_rules/{rule_id}", response_model=Dict[str, Any])
 async def read_velocity_rule(rule_id: str, db: Any = Depends(get_mongodb_database)):
     """Reads a velocity rule by ID."""
@@ -344,23 +475,14 @@ async def update_velocity_rule(rule_id: str, rule: VelocityRule, db: Any = Depen
         from bson import ObjectId
         # Use model_dump()
         rule_data = rule.model_dump(exclude_unset=True)
-        result = db["velocity_rule"].update_one({"_id": ObjectId(rule_id)}, {"$set": rule_data})
-        if result.modified_count == 0:
-            existing_rule = db["velocity_rule"].find_one({"_id": ObjectId(rule_id)})
-            if existing_rule:
-                 existing_rule["_id"] = str(existing_rule["_id"])
-                 return existing_rule
-            else:
-                 raise HTTPException(status_code=404, detail="Rule not found")
-
-        updated_rule_doc = db["velocity_rule"].find_one({"_id": ObjectId(rule_id)})
-        if updated_rule_doc:
-            updated_rule_doc["_id"] = str(updated_rule_doc["_id"])
-            # Return the fetched dictionary directly
-            return updated_rule_doc
-        else:
-            # This case should ideally not be reached if modified_count > 0, but as a safeguard
-            raise HTTPException(status_code=404, detail="Rule not found after update")
+        updated_rule_doc = update_one_and_fetch(db["velocity_rule"], {"_id": ObjectId(rule_id)}, rule_data)
+        if updated_rule_doc is None:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        bump_policy_set_version(db)
+        updated_rule_doc["_id"] = str(updated_rule_doc["_id"])
+        return updated_rule_doc
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
         if isinstance(e, InvalidId) or "invalid id" in str(e).lower():
              raise HTTPException(status_code=404, detail="Rule not found")
@@ -375,6 +497,7 @@ async def delete_velocity_rule(rule_id: str, db: Any = Depends(get_mongodb_datab
         result = db["velocity_rule"].delete_one({"_id": ObjectId(rule_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Rule not found")
+        bump_policy_set_version(db)
         return {"message": "Rule deleted successfully"}
     except InvalidId:
          raise HTTPException(status_code=404, detail="Rule not found")
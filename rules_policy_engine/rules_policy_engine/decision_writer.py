@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many decisions are buffered...
+DECISION_BATCH_SIZE = 500
+# ...or when the oldest buffered decision is this many seconds old
+DECISION_FLUSH_INTERVAL = 1.0
+# Submitters wait (backpressure) once this many decisions are queued
+DECISION_QUEUE_SIZE = 10000
+# Attempts at writing a batch, waiting DECISION_RETRY_BACKOFF seconds after the
+# first failure and twice as long after each following one
+DECISION_WRITE_ATTEMPTS = 5
+DECISION_RETRY_BACKOFF = 0.5
+# insert_many error code of a document that is already stored (written by an earlier attempt)
+DUPLICATE_KEY_ERROR = 11000
+
+
+def build_fraud_record(decision: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts a scoring decision into a fraud_data document (see common.models.FraudData)."""
+    return {
+        "fraud_id": decision["transaction_id"],
+        "id_user": decision["user_id"],
+        "id_transactions": [decision["transaction_id"]],
+        "status": decision["risk_level"],
+        "risk_points": decision["risk_points"],
+        "policy_list": decision.get("policy_list", []),
+        "created_at": datetime.utcnow(),
+    }
+
+
+class DecisionWriter:
+    """
+    Write-behind buffer for scoring decisions.
+    Decisions are queued in memory and written to the fraud_data collection
+    with insert_many when the batch is full or the flush interval elapses,
+    so scoring requests never wait on a synchronous write. Failed writes are
+    retried with exponential backoff; decisions still unwritten after
+    `write_attempts` attempts are logged and counted in `dropped`.
+    """
+
+    def __init__(self, batch_size: int = DECISION_BATCH_SIZE, flush_interval: float = DECISION_FLUSH_INTERVAL,
+                 max_queue_size: int = DECISION_QUEUE_SIZE, write_attempts: int = DECISION_WRITE_ATTEMPTS,
+                 retry_backoff: float = DECISION_RETRY_BACKOFF):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.write_attempts = write_attempts
+        self.retry_backoff = retry_backoff
+        # Decisions given up on after every write attempt failed
+        self.dropped = 0
+        self.collection = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Batch the flush loop was still filling when it was cancelled
+        self._unflushed: List[Dict[str, Any]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, collection: Any) -> None:
+        """Starts the background flush loop writing into `collection`."""
+        if self.running:
+            return
+        self.collection = collection
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, decision: Dict[str, Any]) -> None:
+        """Queues a decision for persistence, waiting if the queue is full."""
+        await self._queue.put(build_fraud_record(decision))
+
+    async def stop(self) -> None:
+        """Stops the flush loop after writing every queued decision."""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        # Drain the loop's partial batch and whatever was queued after it
+        remaining, self._unflushed = self._unflushed, []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: List[Dict[str, Any]] = []
+        try:
+            while True:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # A cancelled flush still finishes its insert in the worker
+                # thread, so the batch must not be handed back to stop()
+                flushing, batch = batch, []
+                await self._flush(flushing)
+        except asyncio.CancelledError:
+            # Hand the partially filled batch back to stop() for the final flush
+            self._unflushed.extend(batch)
+            raise
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Writes `batch`, retrying what failed. insert_many sets each document's
+        _id before sending it, so a retry cannot store a decision twice: a
+        document written by an earlier attempt fails as a duplicate key and is
+        treated as written.
+        """
+        pending = batch
+        for attempt in range(1, self.write_attempts + 1):
+            if not pending:
+                return
+            try:
+                await asyncio.to_thread(self.collection.insert_many, pending, ordered=False)
+                return
+            except BulkWriteError as e:
+                failed = {error['index'] for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY_ERROR}
+                pending = [record for i, record in enumerate(pending) if i in failed]
+                error = e
+            except Exception as e:
+                error = e
+            if pending and attempt < self.write_attempts:
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                logger.warning(f"Failed to persist {len(pending)} scoring decisions (attempt {attempt}/{self.write_attempts}), retrying in {delay:.1f}s: {error}")
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    # stop() writes them with the rest of the queue
+                    self._unflushed.extend(pending)
+                    raise
+        if pending:
+            self.dropped += len(pending)
+            logger.error(
+                f"Dropped {len(pending)} scoring decisions after {self.write_attempts} failed attempts ({self.dropped} dropped in total): {error}; "
+                f"fraud_ids: {[record['fraud_id'] for record in pending]}"
+            )
+
+decision_writer = DecisionWriter()
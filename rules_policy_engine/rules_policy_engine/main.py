@@ -4,6 +4,7 @@ from fastapi import FastAPI
 from common.config import MONGODB_URI, MONGODB_DB_NAME
 from common.mongodb_utils import get_mongodb_client, get_mongodb_database
 from .api import policy_router, rule_router
+from .decision_writer import decision_writer
 
 app = FastAPI()
 
@@ -22,8 +23,14 @@ async def startup_event():
             return
 
     db = get_mongodb_database(client, MONGODB_DB_NAME)
-    if not db:
+    if db is None:
         print("Failed to get MongoDB database")
         return
 
-    print("Connected to MongoDB")
\ No newline at end of file
+    print("Connected to MongoDB")
+    decision_writer.start(db.fraud_data)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush buffered scoring decisions before the process exits
+    await decision_writer.stop()
\ No newline at end of file
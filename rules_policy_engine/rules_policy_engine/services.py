@@ -1,5 +1,8 @@
-from typing import Any
-from .models import StandardRule, VelocityRule, Policy, RuleType
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List
+from bson import ObjectId
+from .models import StandardRule, VelocityRule, Policy, RuleType, Transaction
 from datetime import datetime, timedelta
 from pymongo import MongoClient
 from common.config import MONGODB_URI, MONGODB_DB_NAME
@@ -7,6 +10,15 @@ from common.config import MONGODB_URI, MONGODB_DB_NAME
 RISK_FRAUD_THRESHOLD = 100
 RISK_SUSPECT_THRESHOLD = 70
 
+# Maximum number of transactions scored concurrently by the streaming endpoint
+STREAM_WINDOW_SIZE = 32
+
+# Page size limits for the policy and rule listing endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+POLICY_SET_VERSION_ID = "policy_set_version"
+
 def evaluate_standard_rule(transaction: dict, rule_data: dict) -> bool:
     """Evaluates a standard rule dictionary against a transaction dictionary."""
     field = rule_data.get("field")
@@ -156,12 +168,11 @@ async def evaluate_velocity_rule(transaction: dict, rule_data: dict, db: Any = N
         ]
         # print(f"Velocity rule pipeline: {pipeline}") # Debugging
 
-        # Execute aggregation (ensure collection.aggregate is awaited if using async driver like motor)
-        # Note: MongoClient from pymongo is synchronous. If async is needed, use Motor.
-        # For now, assuming pymongo and synchronous execution within the async function.
-        # If Motor is used elsewhere, this needs adjustment.
-        result_cursor = collection.aggregate(pipeline)
-        result = list(result_cursor) # Evaluate the cursor
+        # Note: MongoClient from pymongo is synchronous, so the blocking call
+        # is pushed off the event loop.
+        # Run the aggregation in a worker thread so concurrent evaluations
+        # (e.g. the streaming endpoint) can overlap their velocity lookups.
+        result = await asyncio.to_thread(lambda: list(collection.aggregate(pipeline)))
 
         # print(f"Velocity rule result: {result}") # Debugging
 
@@ -207,6 +218,124 @@ async def evaluate_policy(transaction, policy: Policy, db: Any = None) -> int:
                 total_points += rule.risk_point
     return total_points
 
+def load_policies(db: Any) -> List[Policy]:
+    """
+    Loads all policies from the database as Policy models.
+    Rule references stored by create_policy ({"type", "id"}) are resolved
+    against their rule collections with one query per rule type.
+    """
+    policy_docs = list(db.policies.find())
+
+    referenced_ids = {RuleType.STANDARD.value: set(), RuleType.VELOCITY.value: set()}
+    for policy_data in policy_docs:
+        for rule in policy_data.get("rules", []):
+            if "rule_type" not in rule and rule.get("type") in referenced_ids:
+                referenced_ids[rule["type"]].add(rule["id"])
+
+    resolved_rules = {}
+    for rule_type, rule_ids in referenced_ids.items():
+        if not rule_ids:
+            continue
+        collection = db.standard_rule if rule_type == RuleType.STANDARD.value else db.velocity_rule
+        for rule_doc in collection.find({"_id": {"$in": [ObjectId(rule_id) for rule_id in rule_ids]}}):
+            resolved_rules[str(rule_doc["_id"])] = rule_doc
+
+    policies = []
+    for policy_data in policy_docs:
+        rules = []
+        for rule in policy_data.get("rules", []):
+            if "rule_type" not in rule and rule.get("type") in referenced_ids:
+                rule = resolved_rules.get(str(rule["id"]))
+                if rule is None:
+                    continue # Referenced rule was deleted
+            rules.append(StandardRule(**rule) if rule.get("rule_type") == "standard" else VelocityRule(**rule))
+        policy_data["rules"] = rules
+        policies.append(Policy(**policy_data))
+    return policies
+
+async def score_transaction(transaction_data: dict, policies: List[Policy], db: Any = None) -> Dict[str, Any]:
+    """Evaluates a transaction dictionary against every policy and returns its decision."""
+    total_risk_points = 0
+    policy_list = []
+    for policy in policies:
+        policy_points = await evaluate_policy(transaction_data, policy, db=db)
+        if policy_points > 0:
+            policy_list.append(policy.name)
+        total_risk_points += policy_points
+
+    return {
+        "transaction_id": transaction_data.get("transaction_id"),
+        "user_id": transaction_data.get("user_id"),
+        "risk_points": total_risk_points,
+        "risk_level": determine_risk_level(total_risk_points),
+        "policy_list": policy_list,
+    }
+
+async def score_transaction_stream(transactions: AsyncIterator[Any], policies: List[Policy], db: Any = None, window: int = STREAM_WINDOW_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Scores an async stream of Transaction models, yielding decisions in input order.
+    At most `window` transactions are in flight at once, so memory stays bounded
+    while the velocity lookups of neighbouring transactions overlap.
+    Items that are not Transaction models (e.g. parse error records) are passed through unchanged.
+    A transaction that fails to score (e.g. its velocity lookup raises) yields a
+    {"transaction_id": ..., "error": ...} record instead of ending the stream.
+    """
+    in_flight = deque()
+
+    async def _resolve(item):
+        if not isinstance(item, Transaction):
+            return item
+        try:
+            return await score_transaction(item.model_dump(), policies, db=db)
+        except Exception as e:
+            return {"transaction_id": item.transaction_id, "error": str(e)}
+
+    async for item in transactions:
+        in_flight.append(asyncio.ensure_future(_resolve(item)))
+        if len(in_flight) >= window:
+            yield await in_flight.popleft()
+
+    while in_flight:
+        yield await in_flight.popleft()
+
+def get_policy_set_version(db: Any) -> int:
+    """Returns the current policy-set version (bumped on every policy or rule write)."""
+    version_doc = db.metadata.find_one({"_id": POLICY_SET_VERSION_ID})
+    return version_doc["version"] if version_doc else 0
+
+def bump_policy_set_version(db: Any) -> None:
+    """Increments the policy-set version, invalidating cached listings."""
+    db.metadata.update_one({"_id": POLICY_SET_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+def stringify_object_ids(value: Any) -> Any:
+    """Recursively converts ObjectIds to strings so documents are JSON serializable."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: stringify_object_ids(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [stringify_object_ids(item) for item in value]
+    return value
+
+def list_documents(collection: Any, after: str = None, limit: int = DEFAULT_PAGE_SIZE, fields: List[str] = None) -> Dict[str, Any]:
+    """
+    Returns one keyset-paginated page of a collection, ordered by _id.
+    `after` is the _id of the last document of the previous page and
+    `fields` optionally restricts the returned fields (_id is always included).
+    Raises InvalidId if `after` is not a valid ObjectId.
+    """
+    query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+    projection = {field: 1 for field in fields} if fields else None
+    # Fetch one extra document to know whether another page exists
+    documents = list(collection.find(query, projection).sort("_id", 1).limit(limit + 1))
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = str(documents[-1]["_id"])
+
+    return {"items": [stringify_object_ids(document) for document in documents], "next_cursor": next_cursor}
+
 def determine_risk_level(total_risk_points: int) -> str:
     """Determines the risk level based on the total risk points."""
     if total_risk_points >= RISK_FRAUD_THRESHOLD:
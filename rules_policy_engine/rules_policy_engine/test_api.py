@@ -638,4 +638,77 @@ async def test_delete_velocity_rule(mock_db):
     assert response.status_code == 404
 
     # Clear overrides after the test
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+@pytest.mark.asyncio
+async def test_list_standard_rules_pagination(mock_db):
+    # Override dependencies for the test
+    app.dependency_overrides[get_mongodb_database] = lambda: mock_db
+
+    for i in range(5):
+        mock_db.standard_rule.insert_one({
+            "rule_type": "standard",
+            "description": f"Paged Rule {i}",
+            "risk_point": i,
+            "field": "amount",
+            "operator": "greater_than",
+            "value": i,
+        })
+    total = mock_db.standard_rule.count_documents({})
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "description"}
+        if cursor:
+            params["after"] = cursor
+        response = client.get("/standard_rules/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        for item in page["items"]:
+            assert set(item.keys()) == {"_id", "description"}
+        seen.extend(item["_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == total
+    assert seen == sorted(seen)
+
+    # Invalid cursor
+    response = client.get("/standard_rules/", params={"after": "not_an_id"})
+    assert response.status_code == 400
+
+    # Clear overrides after the test
+    app.dependency_overrides.clear()
+
+@pytest.mark.asyncio
+async def test_list_policies_etag(mock_db):
+    # Override dependencies for the test
+    app.dependency_overrides[get_mongodb_database] = lambda: mock_db
+
+    response = client.get("/policies/")
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == mock_db.policies.count_documents({})
+    etag = response.headers["ETag"]
+
+    # Unchanged policy set returns 304
+    response = client.get("/policies/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Any rule write bumps the policy-set version and invalidates the ETag
+    rule_data = {
+        "rule_type": "velocity",
+        "description": "Rule bumping the version",
+        "risk_point": 10,
+        "field": "user_id",
+        "time_range": "1 hour",
+        "aggregation_function": "count",
+        "threshold": 3
+    }
+    assert client.post("/velocity_rules/", json=rule_data).status_code == 200
+    response = client.get("/policies/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # Clear overrides after the test
+    app.dependency_overrides.clear()
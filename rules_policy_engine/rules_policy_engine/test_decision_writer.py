@@ -0,0 +1,128 @@
+import asyncio
+import time
+import pytest
+import mongomock
+from .decision_writer import DecisionWriter
+
+
+def make_decision(i, risk_level="normal"):
+    return {
+        "transaction_id": f"txn_{i}",
+        "user_id": "user_writer",
+        "risk_points": 20,
+        "risk_level": risk_level,
+        "policy_list": ["High Risk Policy"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_flushes_on_batch_size():
+    collection = mongomock.MongoClient()["test_db"]["fraud_data"]
+    writer = DecisionWriter(batch_size=3, flush_interval=60)
+    writer.start(collection)
+
+    for i in range(3):
+        await writer.submit(make_decision(i))
+    # Give the flush loop a chance to write the full batch
+    for _ in range(50):
+        if collection.count_documents({}) == 3:
+            break
+        await asyncio.sleep(0.01)
+
+    assert collection.count_documents({}) == 3
+    record = collection.find_one({"fraud_id": "txn_0"})
+    assert record["id_user"] == "user_writer"
+    assert record["id_transactions"] == ["txn_0"]
+    assert record["status"] == "normal"
+    assert record["policy_list"] == ["High Risk Policy"]
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_flushes_on_stop():
+    collection = mongomock.MongoClient()["test_db"]["fraud_data"]
+    writer = DecisionWriter(batch_size=100, flush_interval=60)
+    writer.start(collection)
+
+    for i in range(5):
+        await writer.submit(make_decision(i, risk_level="suspect"))
+    assert collection.count_documents({}) == 0
+
+    await writer.stop()
+    assert not writer.running
+    assert collection.count_documents({"status": "suspect"}) == 5
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_backpressure():
+    collection = mongomock.MongoClient()["test_db"]["fraud_data"]
+    writer = DecisionWriter(batch_size=100, flush_interval=60, max_queue_size=2)
+    writer.start(collection)
+    # Stall the flush loop so the queue fills up
+    writer._task.cancel()
+    await asyncio.sleep(0)
+
+    await writer.submit(make_decision(0))
+    await writer.submit(make_decision(1))
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(writer.submit(make_decision(2)), 0.05)
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_stop_during_flush_writes_once():
+    writer = DecisionWriter(batch_size=2, flush_interval=60)
+    inserted = []
+    started = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    class SlowCollection:
+        def insert_many(self, batch, ordered=False):
+            loop.call_soon_threadsafe(started.set)
+            time.sleep(0.05)
+            inserted.extend(record["fraud_id"] for record in batch)
+
+    writer.start(SlowCollection())
+    await writer.submit(make_decision(0))
+    await writer.submit(make_decision(1))
+    await writer.submit(make_decision(2))
+    # Cancel the loop while its insert_many is still running in the worker thread
+    await started.wait()
+    await writer.stop()
+    await asyncio.sleep(0.1)
+    assert sorted(inserted) == ["txn_0", "txn_1", "txn_2"]
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_retries_failed_writes():
+    collection = mongomock.MongoClient()["test_db"]["fraud_data"]
+    calls = []
+
+    class FlakyCollection:
+        def insert_many(self, batch, ordered=False):
+            calls.append(len(batch))
+            if len(calls) < 3:
+                raise ConnectionError("primary stepped down")
+            return collection.insert_many(batch, ordered=ordered)
+
+    writer = DecisionWriter(batch_size=100, flush_interval=60, retry_backoff=0)
+    writer.start(FlakyCollection())
+    for i in range(4):
+        await writer.submit(make_decision(i))
+    await writer.stop()
+    assert calls == [4, 4, 4]
+    assert collection.count_documents({}) == 4 and writer.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_decision_writer_counts_dropped_decisions(caplog):
+    class DownCollection:
+        def insert_many(self, batch, ordered=False):
+            raise ConnectionError("no primary")
+
+    writer = DecisionWriter(batch_size=100, flush_interval=60, write_attempts=2, retry_backoff=0)
+    writer.start(DownCollection())
+    for i in range(3):
+        await writer.submit(make_decision(i))
+    await writer.stop()
+    assert writer.dropped == 3
+    assert "txn_0" in caplog.records[-1].getMessage() and caplog.records[-1].levelname == "ERROR"
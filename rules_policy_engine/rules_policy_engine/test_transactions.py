@@ -161,4 +161,60 @@ async def test_process_transaction_invalid_input_api(mock_db):
     # No need to override dependencies here as TestClient uses the app's configured dependencies
     response = client.post("/transactions", json=transaction_data)
     assert response.status_code == 422  # Unprocessable Entity due to validation error
-    assert "detail" in response.json() # Check for error detail
\ No newline at end of file
+    assert "detail" in response.json() # Check for error detail
+
+def test_process_transaction_stream(mock_db):
+    """
+    Test the /transactions/stream endpoint with an NDJSON body.
+    Decisions must come back as NDJSON in input order, and invalid lines
+    must produce an error record without aborting the stream.
+    """
+    from common.mongodb_utils import get_mongodb_database
+    app.dependency_overrides[get_mongodb_database] = lambda: mock_db
+
+    lines = [
+        {"transaction_id": "txn_stream_1", "user_id": "user_stream", "amount": 100, "transaction_type": "deposit"},
+        {"transaction_id": "txn_stream_2", "user_id": "user_stream", "amount": 700, "transaction_type": "transfer"},
+        {"transaction_id": "txn_stream_3", "user_id": "user_stream", "amount": "invalid", "transaction_type": "deposit"},
+        {"transaction_id": "txn_stream_4", "user_id": "user_stream", "amount": 600, "transaction_type": "withdrawal"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+
+    response = client.post("/transactions/stream", content=body, headers={"Content-Type": "application/x-ndjson"})
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    decisions = [json.loads(line) for line in response.text.splitlines()]
+    assert len(decisions) == 4
+    assert decisions[0]["transaction_id"] == "txn_stream_1"
+    assert decisions[0]["risk_points"] == 0
+    assert decisions[1]["transaction_id"] == "txn_stream_2"
+    assert decisions[1]["risk_points"] == 50
+    assert decisions[2]["line"] == 3
+    assert "error" in decisions[2]
+    assert decisions[3]["transaction_id"] == "txn_stream_4"
+    assert decisions[3]["risk_points"] == 20
+    assert decisions[3]["risk_level"] == determine_risk_level(20)
+
+def test_process_transaction_stream_reports_scoring_errors(mock_db):
+    """A transaction whose scoring fails yields an error record and the stream goes on."""
+    from common.mongodb_utils import get_mongodb_database
+    app.dependency_overrides[get_mongodb_database] = lambda: mock_db
+
+    async def flaky_velocity_rule(transaction, rule_data, db=None):
+        if transaction["transaction_id"] == "txn_stream_down":
+            raise ConnectionError("velocity lookup failed")
+        return False
+
+    lines = [
+        {"transaction_id": "txn_stream_down", "user_id": "user_stream", "amount": 100, "transaction_type": "deposit"},
+        {"transaction_id": "txn_stream_up", "user_id": "user_stream", "amount": 700, "transaction_type": "deposit"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+    with patch('rules_policy_engine.services.evaluate_velocity_rule', side_effect=flaky_velocity_rule):
+        response = client.post("/transactions/stream", content=body, headers={"Content-Type": "application/x-ndjson"})
+    app.dependency_overrides.clear()
+
+    decisions = [json.loads(line) for line in response.text.splitlines()]
+    assert decisions[0] == {"transaction_id": "txn_stream_down", "error": "velocity lookup failed"}
+    assert decisions[1]["transaction_id"] == "txn_stream_up" and decisions[1]["risk_points"] == 20